@@ -1,13 +1,60 @@
-from fastapi import APIRouter, HTTPException
-from app.websocket.binance_client import BinanceWebsocketClient
-from app.services.discord_notifier import DiscordNotifier
-from binance.client import Client
+from fastapi import APIRouter, Body, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from app.core import metrics
 from app.core.config import settings
+from app.core.profiler import Profiler
+from app.websocket.binance_client import BinanceWebsocketClient, UserStream
+from app.websocket.fanout import LiveClient, LiveFeed, parse_topics
+from app.websocket.leader import Leadership
+from app.websocket.market_streams import MarketStreams
+from app.services.alerts import Alert, AlertEngine
+from app.services.trade_journal import TradeJournal
+from app.services.technical_analysis import TechnicalAnalyzer
+from app.services.tick_stats import WINDOWS, TickStats
+from app.services.binance_rest import BinanceAPIError, BinanceRestClient
+from app.services.symbols import ExchangeSymbols, normalize
+from app.services import batch_indicators
+from app.services.indicators import INTERVAL_MS
 from datetime import datetime, timezone
+from typing import List, Optional, Set
+import asyncio
+import json
 import time
 
 router = APIRouter()
 
+# GET endpoints a follower worker answers from the leader's shared state (without ?refresh);
+# everything else under /api is forwarded to the leader
+SHARED_ROUTES = {
+    "/health", "/ready", "/status", "/trades/balance", "/trades/account", "/positions", "/symbols",
+    "/live/sse", "/live/clients",
+}
+
+def _user_stream(account: Optional[str]) -> UserStream:
+    stream = BinanceWebsocketClient.user_stream(account)
+    if stream is None:
+        raise HTTPException(status_code=404, detail=f"Unknown account {account}")
+    return stream
+
+async def _listed_symbols(symbols: List[str]) -> List[str]:
+    """Validated, de-duplicated symbols; 400 if any is malformed or not listed"""
+    try:
+        selected = await ExchangeSymbols.validate(symbols, settings.SYMBOLS_PER_REQUEST)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except BinanceAPIError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    if not selected:
+        raise HTTPException(status_code=400, detail="No symbols given")
+    return selected
+
+def _shared(section: str):
+    """A section of the stream leader's latest publish; 503 until there is one"""
+    data = Leadership.shared(section)
+    if data is None:
+        raise HTTPException(status_code=503, detail="Waiting for the stream leader")
+    return data
+
 @router.get(
     "/status",
     summary="Get the current status of the WebSocket connection and services",
@@ -18,12 +65,89 @@ async def get_status():
     """
     Get the current status of the WebSocket connection and services
     """
-    return {
-        "status": "running",
-        "websocket_connected": BinanceWebsocketClient._ws is not None,
-        "listen_key": BinanceWebsocketClient._listen_key is not None,
-        "is_running": BinanceWebsocketClient._running
-    }
+    status = _shared("status") if Leadership.is_follower() else BinanceWebsocketClient.status()
+    return {**status, "live": LiveFeed.status(), "worker": Leadership.status()}
+
+@router.get(
+    "/health",
+    summary="Liveness: the process and its event loop respond",
+    tags=["BINANCE INFO"],
+    response_model=dict,
+)
+async def get_health():
+    """
+    Always succeeds while the server is up; does not depend on Binance
+    """
+    return {"status": "ok"}
+
+@router.get(
+    "/ready",
+    summary="Readiness: every stream is connected and account state is loaded",
+    tags=["BINANCE INFO"],
+    response_model=dict,
+)
+async def get_ready(response: Response):
+    """
+    503 until the market streams and every account's user stream are connected
+    and its snapshot and positions are loaded, or while any of them is down.
+    On a follower worker, also while the stream leader is not publishing
+    """
+    if Leadership.is_follower():
+        shared = Leadership.shared("ready") or {"checks": {}, "startup": None}
+        checks = {"leader": Leadership.leader_alive(), **shared["checks"]}
+        startup = shared["startup"]
+    else:
+        checks = BinanceWebsocketClient.readiness()
+        startup = BinanceWebsocketClient.startup_stats()
+    ready = all(checks.values())
+    if not ready:
+        response.status_code = 503
+    return {"ready": ready, "checks": checks, "startup": startup}
+
+@router.get(
+    "/metrics",
+    summary="Prometheus metrics",
+    tags=["BINANCE INFO"],
+    response_class=Response,
+)
+async def get_metrics():
+    """
+    Counters and histograms in the Prometheus text exposition format
+    """
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@router.get(
+    "/admin/profile",
+    summary="Sample the stacks of all threads and asyncio tasks",
+    tags=["ADMIN"],
+    response_class=Response,
+)
+async def get_profile(
+    seconds: float = Query(10.0, gt=0, description="How long to sample"),
+    hz: float = Query(100.0, gt=0, description="Samples per second (capped by PROFILER_MAX_HZ)"),
+    tasks: bool = Query(True, description="Include the await chain of every asyncio task"),
+    lines: bool = Query(False, description="Keep line numbers in frame names"),
+):
+    """
+    Collapsed stacks (``frame;frame;frame count``), ready for flamegraph.pl or speedscope
+    """
+    if not settings.PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiler is disabled")
+    sampler = await Profiler.profile(
+        min(seconds, settings.PROFILER_MAX_SECONDS),
+        min(hz, settings.PROFILER_MAX_HZ),
+        settings.PROFILER_MAX_OVERHEAD,
+        tasks=tasks,
+        lines=lines,
+    )
+    if sampler is None:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    summary = sampler.summary()
+    return Response(sampler.collapsed(), media_type="text/plain; charset=utf-8", headers={
+        "X-Profile-Samples": str(summary['samples']),
+        "X-Profile-Seconds": str(summary['seconds']),
+        "X-Profile-Overhead": str(summary['overhead']),
+    })
 
 @router.get(
     "/trades/balance",
@@ -31,12 +155,24 @@ async def get_status():
     tags=["BINANCE INFO"],
     response_model=dict,
 )
-async def get_balance():
+async def get_balance(
+    refresh: bool = Query(False, description="Reload the snapshot from Binance first"),
+    account: Optional[str] = Query(None, description="Account name (defaults to the main account)"),
+):
     """
-    Get the current balance of the account
+    Get the current balance of the account from the live account snapshot
     """
-    client = Client(settings.BINANCE_API_KEY, settings.BINANCE_API_SECRET)
-    return client.futures_account().get('totalWalletBalance')
+    stream = _user_stream(account)
+    if Leadership.is_follower():
+        snapshot = _shared(f"account:{stream.account.name}")
+        status = _shared(f"snapshot:{stream.account.name}")
+    else:
+        snapshot = await stream.account.snapshot.get(force_refresh=refresh)
+        status = stream.snapshot_status()
+    return {
+        "totalWalletBalance": snapshot.get('totalWalletBalance'),
+        "snapshot": status,
+    }
 
 @router.get(
         "/trades/account",
@@ -44,22 +180,427 @@ async def get_balance():
         tags=["BINANCE INFO"],
         response_model=dict,
 )
-async def get_account():
+async def get_account(
+    refresh: bool = Query(False, description="Reload the snapshot from Binance first"),
+    account: Optional[str] = Query(None, description="Account name (defaults to the main account)"),
+):
     """
-    Get the current account information
+    Get the current account information from the live account snapshot
     """
-    client = Client(settings.BINANCE_API_KEY, settings.BINANCE_API_SECRET)
-    return client.futures_account()
+    stream = _user_stream(account)
+    if Leadership.is_follower():
+        snapshot = _shared(f"account:{stream.account.name}")
+        status = _shared(f"snapshot:{stream.account.name}")
+    else:
+        snapshot = await stream.account.snapshot.get(force_refresh=refresh)
+        status = stream.snapshot_status()
+    return {**snapshot, "snapshot": status}
+
+@router.get(
+    "/positions",
+    summary="Get open positions valued at the latest mark price",
+    tags=["BINANCE INFO"],
+    response_model=dict,
+)
+async def get_positions(account: Optional[str] = Query(None, description="Account name (defaults to the main account)")):
+    """
+    Open positions from the in-memory position book, with unrealized PnL and
+    distance to liquidation from the mark price stream; no Binance request is made
+    """
+    stream = _user_stream(account)
+    if Leadership.is_follower():
+        return _shared(f"positions:{stream.account.name}")
+    return stream.live_positions()
 
 @router.get(
     "/trades/latest",
-    summary="Get today's trades and position information directly from Binance",
+    summary="Get today's trades from the trade journal and open positions from the account snapshot",
     tags=["BINANCE INFO"],
     response_model=dict,
 )
-async def get_latest_trades():
+async def get_latest_trades(
+    account: Optional[str] = Query(None, description="Account name (defaults to the main account)"),
+    symbol: Optional[str] = Query(None, description="Filter by symbol, e.g. ETHUSDT"),
+    order_id: Optional[int] = Query(None, description="Filter by order id"),
+    start_time: Optional[int] = Query(None, description="Trade time lower bound in ms (defaults to today 00:00 UTC)"),
+    end_time: Optional[int] = Query(None, description="Trade time upper bound in ms (exclusive)"),
+    fills_only: bool = Query(True, description="Only return executions, not order lifecycle events"),
+    before_id: Optional[int] = Query(None, description="Return entries older than this journal id"),
+    limit: int = Query(50, ge=1, le=1000),
+):
+    """
+    Get today's trades from the local trade journal and open positions from the account snapshot
+    """
+    stream = _user_stream(account)
+    if start_time is None and order_id is None:
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        start_time = int(today.timestamp() * 1000)
+    trades = await TradeJournal.query(
+        account=stream.account.name, symbol=symbol, order_id=order_id, start_time=start_time, end_time=end_time,
+        fills_only=fills_only, before_id=before_id, limit=limit,
+    )
+    snapshot = stream.account.snapshot.account or {}
+    positions = [p for p in snapshot.get('positions', []) if float(p.get('positionAmt', 0)) != 0]
+    return {
+        "trades": trades,
+        "next_before_id": trades[-1]["id"] if len(trades) == limit else None,
+        "positions": positions,
+    }
+
+@router.get(
+    "/symbols",
+    summary="Get the tracked symbol universe with latest prices",
+    tags=["MARKET DATA"],
+    response_model=dict,
+)
+async def get_symbols():
+    """
+    Get the tracked symbol universe with latest prices
+    """
+    if Leadership.is_follower():
+        return {
+            "symbols": {symbol: price for symbol, price, _ in Leadership.shared_prices()},
+            **_shared("market"),
+        }
+    return {
+        "symbols": {symbol: price for symbol, price, _ in MarketStreams.universe.items()},
+        **MarketStreams.status(),
+    }
+
+@router.post(
+    "/symbols",
+    summary="Start tracking symbols",
+    tags=["MARKET DATA"],
+    response_model=dict,
+)
+async def add_symbols(symbols: List[str] = Body(..., embed=True)):
+    """
+    Subscribe to market streams for the given listed symbols, opening new connections as needed
+    """
+    return {"added": await MarketStreams.add_symbols(await _listed_symbols(symbols))}
+
+@router.delete(
+    "/symbols/{symbol}",
+    summary="Stop tracking a symbol",
+    tags=["MARKET DATA"],
+    response_model=dict,
+)
+async def remove_symbol(symbol: str):
+    """
+    Unsubscribe from a symbol's market streams; 409 while armed alerts or an open position still need them
+    """
+    try:
+        symbol = normalize(symbol)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    needed_by = []
+    if symbol in AlertEngine.symbols():
+        needed_by.append("armed alerts")
+    holders = [
+        stream.account.name for stream in BinanceWebsocketClient.user_streams()
+        if stream.account.positions.get(symbol) is not None
+    ]
+    if holders:
+        needed_by.append(f"open positions ({', '.join(holders)})")
+    if needed_by:
+        raise HTTPException(status_code=409, detail=f"{symbol} is still needed by {' and '.join(needed_by)}")
+    removed = await MarketStreams.remove_symbols([symbol])
+    if not removed:
+        raise HTTPException(status_code=404, detail=f"{symbol} is not tracked")
+    TickStats.remove(symbol)
+    return {"removed": removed}
+
+@router.get(
+    "/market/stats",
+    summary="Get rolling-window trade statistics for every tracked symbol",
+    tags=["MARKET DATA"],
+    response_model=dict,
+)
+async def get_market_stats():
+    """
+    Open, high, low, last, change, VWAP, trade count and volume per symbol over each rolling window
+    """
+    now_ms = int(time.time() * 1000)
+    return {
+        "windows": list(WINDOWS),
+        "symbols": {symbol: TickStats.get(symbol, now_ms) for symbol, _, _ in MarketStreams.universe.items()},
+    }
+
+@router.get(
+    "/market/stats/{symbol}",
+    summary="Get rolling-window trade statistics for a symbol",
+    tags=["MARKET DATA"],
+    response_model=dict,
+)
+async def get_symbol_market_stats(symbol: str):
+    """
+    Open, high, low, last, change, VWAP, trade count and volume over each rolling window
+    """
+    stats = TickStats.get(symbol)
+    if stats is None:
+        raise HTTPException(status_code=404, detail=f"No trades seen for {symbol.upper()}")
+    return {"symbol": symbol.upper(), "windows": stats}
+
+@router.get(
+    "/indicators/{symbol}",
+    summary="Get indicators for every timeframe of a symbol",
+    tags=["MARKET DATA"],
+    response_model=dict,
+)
+async def get_symbol_indicators(
+    symbol: str,
+    timeframes: Optional[str] = Query(None, description="Comma-separated timeframes, e.g. 5m,1h (defaults to all)"),
+):
+    """
+    Get indicators per timeframe, all maintained from the symbol's 1m kline stream
+    """
+    symbol = (await _listed_symbols([symbol]))[0]
+    selected = [tf.strip() for tf in timeframes.split(',') if tf.strip()] if timeframes else list(TechnicalAnalyzer.TIMEFRAMES)
+    unknown = [tf for tf in selected if tf not in TechnicalAnalyzer.TIMEFRAMES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unsupported timeframes: {', '.join(unknown)}")
+    try:
+        await TechnicalAnalyzer.ensure_indicators(symbol, selected)
+    except BinanceAPIError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    # Keep the symbol's indicators live from here on instead of rebuilding them per request
+    await BinanceWebsocketClient.ensure_kline_stream(symbol)
+    return {"symbol": symbol, "timeframes": TechnicalAnalyzer.get_timeframes(symbol, selected)}
+
+@router.get(
+    "/indicators",
+    summary="Get indicators for many symbols in one vectorized pass",
+    tags=["MARKET DATA"],
+    response_model=dict,
+)
+async def get_indicators(
+    symbols: str = Query(..., description="Comma-separated symbols, e.g. ETHUSDT,BTCUSDT"),
+    interval: str = Query(TechnicalAnalyzer.INTERVAL, description="Kline interval"),
+    bars: Optional[int] = Query(None, ge=1, description="Bars of history to use (defaults to the whole buffer)"),
+):
+    """
+    Get RSI, EMA, MACD and VWAP for every requested symbol, computed together from the kline buffers
+    """
+    if interval not in INTERVAL_MS:
+        raise HTTPException(status_code=400, detail=f"Unsupported interval: {interval}")
+    selected = await _listed_symbols(symbols.split(','))
+    await batch_indicators.refresh(BinanceRestClient.default(), selected, interval, int(time.time() * 1000))
+    return {"interval": interval, "symbols": batch_indicators.indicators_for(selected, interval, bars)}
+
+async def _track_alert(alert: Alert):
+    """Subscribe to the alert's trades, and keep its RSI timeframe live"""
+    await BinanceWebsocketClient.track_symbol(alert.symbol, klines=alert.kind == 'rsi')
+    if alert.kind == 'rsi':
+        try:
+            await TechnicalAnalyzer.ensure_indicators(alert.symbol, [alert.interval])
+        except BinanceAPIError as e:
+            raise HTTPException(status_code=502, detail=str(e))
+
+@router.get(
+    "/alerts",
+    summary="List alerts",
+    tags=["ALERTS"],
+    response_model=dict,
+)
+async def list_alerts(
+    symbol: Optional[str] = Query(None, description="Filter by symbol, e.g. ETHUSDT"),
+    triggered: Optional[bool] = Query(None, description="Only triggered (true) or only armed (false) alerts"),
+):
+    """
+    List alerts with their definitions and when they last triggered
+    """
+    return {
+        "alerts": [alert.as_dict() for alert in AlertEngine.query(symbol, triggered)],
+        **AlertEngine.status(),
+    }
+
+@router.post(
+    "/alerts",
+    summary="Create an alert",
+    tags=["ALERTS"],
+    response_model=dict,
+)
+async def create_alert(
+    symbol: str = Body(...),
+    kind: str = Body(..., description="price, move or rsi"),
+    direction: str = Body(..., description="above or below; for move alerts, an up or down move"),
+    threshold: float = Body(..., description="Price level, percent move or RSI value"),
+    window: Optional[int] = Body(None, description="Seconds the move is measured over (move alerts)"),
+    interval: Optional[str] = Body(None, description="RSI timeframe (rsi alerts, defaults to 1h)"),
+    note: Optional[str] = Body(None),
+):
+    """
+    Create an alert that is evaluated on every trade and delivered to Discord once it triggers
+    """
+    symbol = (await _listed_symbols([symbol]))[0]
+    try:
+        alert = AlertEngine.create(symbol, kind, direction, threshold, window, interval, note)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await _track_alert(alert)
+    return alert.as_dict()
+
+@router.get(
+    "/alerts/{alert_id}",
+    summary="Get an alert",
+    tags=["ALERTS"],
+    response_model=dict,
+)
+async def get_alert(alert_id: int):
+    alert = AlertEngine.get(alert_id)
+    if alert is None:
+        raise HTTPException(status_code=404, detail=f"Alert {alert_id} not found")
+    return alert.as_dict()
+
+@router.put(
+    "/alerts/{alert_id}",
+    summary="Update and re-arm an alert",
+    tags=["ALERTS"],
+    response_model=dict,
+)
+async def update_alert(
+    alert_id: int,
+    symbol: Optional[str] = Body(None),
+    kind: Optional[str] = Body(None),
+    direction: Optional[str] = Body(None),
+    threshold: Optional[float] = Body(None),
+    window: Optional[int] = Body(None),
+    interval: Optional[str] = Body(None),
+    note: Optional[str] = Body(None),
+):
+    """
+    Change any fields of an alert; a triggered alert is armed again
+    """
+    if symbol is not None:
+        symbol = (await _listed_symbols([symbol]))[0]
+    try:
+        alert = AlertEngine.update(
+            alert_id, symbol=symbol, kind=kind, direction=direction, threshold=threshold,
+            window=window, interval=interval, note=note,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if alert is None:
+        raise HTTPException(status_code=404, detail=f"Alert {alert_id} not found")
+    await _track_alert(alert)
+    return alert.as_dict()
+
+@router.delete(
+    "/alerts/{alert_id}",
+    summary="Delete an alert",
+    tags=["ALERTS"],
+    response_model=dict,
+)
+async def delete_alert(alert_id: int):
+    if not AlertEngine.delete(alert_id):
+        raise HTTPException(status_code=404, detail=f"Alert {alert_id} not found")
+    return {"deleted": alert_id}
+
+def _live_topics(topics) -> Set[str]:
+    """Parse subscriptions, rejecting accounts that are not configured"""
+    parsed = parse_topics(topics.split(',') if isinstance(topics, str) else topics)
+    for topic in parsed:
+        name, _, key = topic.partition(':')
+        if key and name != 'prices' and BinanceWebsocketClient.user_stream(key) is None:
+            raise ValueError(f"Unknown account {key}")
+    return parsed
+
+async def _send_live(websocket: WebSocket, client: LiveClient):
+    """Writer for one client; only it waits on the client's socket"""
+    while True:
+        _, frame = await client.queue.get()
+        await websocket.send_text(frame)
+
+@router.websocket("/live")
+async def live_websocket(
+    websocket: WebSocket,
+    topics: str = Query("", description="Comma-separated topics: prices, fills, account, positions, optionally as topic:key"),
+):
+    """
+    Live prices, fills, account and position updates. Send
+    ``{"subscribe": [...]}`` or ``{"unsubscribe": [...]}`` to change topics.
+    """
+    await websocket.accept()
+    try:
+        subscriptions = _live_topics(topics)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    client = LiveFeed.connect('websocket', subscriptions)
+    if client is None:
+        await websocket.close(code=1013, reason="Too many live clients")
+        return
+    LiveFeed.reply(client, {"topic": "subscriptions", "data": sorted(client.topics)})
+    sender = asyncio.create_task(_send_live(websocket, client))
+    try:
+        while True:
+            message = await websocket.receive_text()
+            try:
+                request = json.loads(message)
+                if not isinstance(request, dict):
+                    raise ValueError("Expected a JSON object")
+                if request.get("subscribe"):
+                    LiveFeed.subscribe(client, _live_topics(request["subscribe"]))
+                if request.get("unsubscribe"):
+                    LiveFeed.unsubscribe(client, _live_topics(request["unsubscribe"]))
+            except (TypeError, ValueError) as e:
+                LiveFeed.reply(client, {"topic": "error", "data": str(e)})
+                continue
+            LiveFeed.reply(client, {"topic": "subscriptions", "data": sorted(client.topics)})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        LiveFeed.disconnect(client)
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
+
+async def _live_events(request: Request, client: LiveClient):
+    try:
+        while True:
+            try:
+                topic, frame = await asyncio.wait_for(client.queue.get(), timeout=settings.LIVE_HEARTBEAT)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: {topic}\ndata: {frame}\n\n"
+    finally:
+        LiveFeed.disconnect(client)
+
+@router.get(
+    "/live/sse",
+    summary="Stream live prices, fills, account and position updates as server-sent events",
+    tags=["LIVE"],
+)
+async def live_sse(
+    request: Request,
+    topics: str = Query(..., description="Comma-separated topics: prices, fills, account, positions, optionally as topic:key"),
+):
+    """
+    Each event is named after its topic and carries ``{"topic", "key", "data"}``;
+    subscribed prices, positions and account balances start with their current value
+    """
+    try:
+        subscriptions = _live_topics(topics)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    client = LiveFeed.connect('sse', subscriptions)
+    if client is None:
+        raise HTTPException(status_code=503, detail="Too many live clients")
+    return StreamingResponse(
+        _live_events(request, client), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get(
+    "/live/clients",
+    summary="List connected live feed clients",
+    tags=["LIVE"],
+    response_model=dict,
+)
+async def list_live_clients():
     """
-    Get today's trades and position information directly from Binance
+    Subscriptions and buffer counters of every connected WebSocket and SSE client
     """
-    # TODO: Implement this
-    return {"message": "Not implemented"}
\ No newline at end of file
+    return {"clients": [client.status() for client in LiveFeed.clients()], **LiveFeed.status()}
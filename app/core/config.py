@@ -1,28 +1,120 @@
 from pydantic_settings import BaseSettings
 from typing import Optional
 import os
-import dotenv
 
 class Settings(BaseSettings):
-    dotenv.load_dotenv()
     # Binance API settings
     BINANCE_API_KEY: str
     BINANCE_API_SECRET: str
+    # Extra accounts served by this process alongside the one above, as a JSON list of
+    # {"name", "api_key", "api_secret", "discord_webhook_url"}; market data is shared by all
+    ACCOUNTS: str = ""
     
     # OpenAI settings
     OPENAI_API_KEY: str
+    OPENAI_MODEL: str = "gpt-4-turbo-preview"
+    
+    # Post-fill trade analysis settings
+    ANALYSIS_ENABLED: bool = True
+    ANALYSIS_QUEUE_SIZE: int = 100
+    ANALYSIS_CONCURRENCY: int = 2
+    ANALYSIS_TIMEOUT: float = 30.0
+    ANALYSIS_CACHE_TTL: int = 900
+    # Fills within this % of each other (same side, similar indicators) share an analysis
+    ANALYSIS_PRICE_BUCKET_PCT: float = 0.5
+    # Seconds to collect fills into one multi-trade completion (0 analyzes each fill separately)
+    ANALYSIS_BATCH_WINDOW: float = 0.0
+    ANALYSIS_BATCH_MAX: int = 10
     
     # Discord Webhook settings
     DISCORD_WEBHOOK_URL: str
     
+    DISCORD_QUEUE_SIZE: int = 1000
+    # Seconds to merge partial fills of one order, and to gather a burst into one webhook call
+    DISCORD_COALESCE_WINDOW: float = 1.0
+    DISCORD_BATCH_WAIT: float = 0.25
+    
     # Server settings
     SERVER_HOST: str = "0.0.0.0"
     SERVER_PORT: int = 8000
+    # Worker processes (run.sh passes it to uvicorn). With more than one, a worker elected through
+    # DATA_DIR/leader.lock owns the Binance connections and shares its state with the others.
+    WORKERS: int = 1
+    LEADER_PUBLISH_INTERVAL: float = 0.1
+    LEADER_RETRY_INTERVAL: float = 1.0
+    # Followers report not ready once the leader has not published for this long (seconds)
+    LEADER_STALE_AFTER: float = 5.0
+    LEADER_FORWARD_TIMEOUT: float = 30.0
+    # Shared-memory segment (SHARED_STATE_PATH defaults to a /dev/shm file per DATA_DIR, or a file in DATA_DIR)
+    SHARED_STATE_PATH: str = ""
+    SHARED_STATE_BYTES: int = 16 * 1024 * 1024
+    
+    # Market data settings
+    BINANCE_WS_BASE_URL: str = "wss://fstream.binance.com"
+    # Comma-separated symbols tracked at startup; more can be added through the API
+    MARKET_SYMBOLS: str = "ETHUSDT,XTZUSDT"
+    # Binance allows 200 streams per USD-M futures connection
+    MARKET_STREAMS_PER_CONNECTION: int = 200
+    # Most symbols one API request may name (indicators, tracking)
+    SYMBOLS_PER_REQUEST: int = 100
+    # Trailing windows of per-symbol trade statistics; the first one drives the periodic price embed
+    TICK_STATS_WINDOWS: str = "3m,15m,1h"
+    
+    # Reconnect the user data stream with a fresh listen key before Binance's 24h cutoff (seconds)
+    USER_STREAM_MAX_AGE: int = 23 * 60 * 60
+    
+    # Websocket pipeline settings: user data is never dropped, market data is conflated per symbol
+    USER_STREAM_QUEUE_SIZE: int = 10000
+    MARKET_STREAM_QUEUE_SIZE: int = 5000
+    
+    # Binance REST settings
+    BINANCE_REST_BASE_URL: str = "https://fapi.binance.com"
+    BINANCE_REST_POOL_SIZE: int = 20
+    BINANCE_REST_TIMEOUT: float = 10.0
+    
+    # Account snapshot settings (seconds)
+    ACCOUNT_RESYNC_INTERVAL: int = 300
+    ACCOUNT_STALE_AFTER: int = 900
+    
+    # On-demand stack sampler (/api/admin/profile); nothing runs between requests.
+    # Off by default: the endpoint has no auth and exposes code paths and task names.
+    # Set PROFILER_ENABLED=true in .env only where the API is not reachable by others.
+    PROFILER_ENABLED: bool = False
+    PROFILER_MAX_SECONDS: float = 60.0
+    PROFILER_MAX_HZ: float = 250.0
+    # Largest share of wall time the sampler thread may spend taking samples
+    PROFILER_MAX_OVERHEAD: float = 0.02
+    
+    # User-defined price, move and RSI alerts (persisted to DATA_DIR/alerts.json)
+    ALERT_LIMIT: int = 10000
+    
+    # Live WebSocket/SSE feed (/api/live): buffered messages per client before the oldest is dropped
+    LIVE_CLIENT_BUFFER: int = 1000
+    LIVE_MAX_CLIENTS: int = 200
+    # Idle seconds between SSE keepalive comments
+    LIVE_HEARTBEAT: float = 15.0
     
     # Logging settings
     LOG_LEVEL: str = "INFO"
     
+    # Local storage settings
+    DATA_DIR: str = "data"
+    KLINE_BUFFER_CAPACITY: int = 500
+    # Indicator timeframes; only 1m klines are streamed and the rest are aggregated from them
+    # (the 1m buffer must hold the longest one, e.g. 240 bars for 4h)
+    INDICATOR_TIMEFRAMES: str = "1m,5m,15m,1h,4h"
+    
+    # Raw websocket frame capture for offline replay (CAPTURE_DIR defaults to DATA_DIR/capture)
+    CAPTURE_ENABLED: bool = False
+    CAPTURE_DIR: str = ""
+    CAPTURE_CHUNK_BYTES: int = 256 * 1024
+    CAPTURE_FLUSH_INTERVAL: float = 5.0
+    CAPTURE_MAX_FILE_BYTES: int = 256 * 1024 * 1024
+    CAPTURE_ROTATE_SECONDS: int = 60 * 60
+    
     class Config:
+        # Read by pydantic-settings itself; environment variables take precedence
         env_file = ".env"
+        env_file_encoding = "utf-8"
 
 settings = Settings()
\ No newline at end of file
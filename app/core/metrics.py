@@ -0,0 +1,168 @@
+"""
+Minimal in-process Prometheus metrics.
+
+Counters and histograms are plain dicts keyed by label values, updated inline
+on the event loop with no locking, and only formatted when ``/api/metrics`` is
+scraped. State that is already tracked elsewhere (queue depths, request
+weight, reconnects) is exposed through callbacks read at scrape time.
+"""
+import asyncio
+import bisect
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+Labels = Tuple[str, ...]
+
+# Seconds; covers sub-millisecond handlers up to slow HTTP calls
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+_registry: List['Metric'] = []
+
+
+def _format_labels(names: Sequence[str], values: Labels, extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(ABC):
+    type = 'untyped'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        _registry.append(self)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """Exposition lines of every labelled series"""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}" for k, v in self._values.items()]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._values: Dict[Labels, list] = {}
+
+    def observe(self, value: float, *labels: str):
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def time(self, *labels: str) -> '_Timer':
+        return _Timer(self, labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {count}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram: Histogram, labels: Labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class CallbackMetric(Metric):
+    """Gauge or counter whose value is read from existing state when scraped"""
+
+    def __init__(self, name: str, help: str, type: str,
+                 read: Callable[[], Union[float, Dict[Labels, float]]], labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self.type = type
+        self.read = read
+
+    def samples(self) -> List[str]:
+        values = self.read()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [
+            f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}"
+            for k, v in values.items() if v is not None
+        ]
+
+
+def render() -> str:
+    """All registered metrics in the Prometheus text exposition format"""
+    blocks = []
+    for metric in _registry:
+        try:
+            blocks.append(metric.render())
+        except Exception as e:
+            blocks.append(f"# {metric.name} unavailable: {e}")
+    return '\n'.join(blocks) + '\n'
+
+
+STREAM_MESSAGES = Counter('b2d_stream_messages_total', 'Websocket messages handled', ['stream'])
+STREAM_DECODE_SECONDS = Histogram('b2d_stream_decode_seconds', 'JSON decode time per message', ['stream'])
+STREAM_HANDLER_SECONDS = Histogram('b2d_stream_handler_seconds', 'Handler time per message', ['stream'])
+DISCORD_REQUEST_SECONDS = Histogram('b2d_discord_request_seconds', 'Discord webhook request latency')
+DISCORD_ERRORS = Counter('b2d_discord_errors_total', 'Failed or rate limited Discord webhook requests', ['reason'])
+REST_REQUEST_SECONDS = Histogram('b2d_binance_rest_request_seconds', 'Binance REST request latency', ['path'])
+REST_ERRORS = Counter('b2d_binance_rest_errors_total', 'Binance REST error responses', ['status'])
+OPENAI_REQUEST_SECONDS = Histogram('b2d_openai_request_seconds', 'OpenAI completion latency', ['mode'])
+OPENAI_TOKENS = Counter('b2d_openai_tokens_total', 'OpenAI tokens used', ['mode'])
+EVENT_LOOP_LAG_SECONDS = Histogram('b2d_event_loop_lag_seconds', 'Event loop scheduling delay')
+
+
+async def monitor_event_loop(interval: float = 0.5, lag: Optional[Histogram] = None):
+    """Record how late a sleep of ``interval`` wakes up, which is time the loop spent blocked"""
+    lag = lag or EVENT_LOOP_LAG_SECONDS
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag.observe(max(0.0, loop.time() - started - interval))
@@ -0,0 +1,138 @@
+"""
+On-demand wall-clock stack sampler.
+
+A sampler thread exists only while a profile is being taken. It reads the
+current frame of every thread (``sys._current_frames``) and the await chain
+of every asyncio task, and counts identical stacks in the collapsed format
+flamegraph tools read (``root;caller;callee count``). The sampling rate is
+capped, and the sampler backs off further whenever taking samples would cost
+more than PROFILER_MAX_OVERHEAD of wall time.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import Any, Dict, List, Optional
+
+
+def _frame_label(frame: FrameType, lines: bool) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get('__name__') or os.path.basename(code.co_filename)
+    label = f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+    return f"{label}:{frame.f_lineno}" if lines else label
+
+
+class StackSampler:
+    """Samples all threads, and optionally all tasks of ``loop``, until ``run`` returns"""
+    MAX_DEPTH = 128
+
+    def __init__(self, seconds: float, hz: float, max_overhead: float,
+                 loop: Optional[asyncio.AbstractEventLoop] = None, lines: bool = False):
+        self.seconds = seconds
+        self.interval = 1.0 / hz
+        self.max_overhead = max_overhead
+        self.loop = loop
+        self.lines = lines
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.sampling_time = 0.0
+        self.elapsed = 0.0
+
+    def _thread_stacks(self, names: Dict[int, str], own_ident: int):
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            frames: List[str] = []
+            while frame is not None and len(frames) < self.MAX_DEPTH:
+                frames.append(_frame_label(frame, self.lines))
+                frame = frame.f_back
+            frames.append(f"thread:{names.get(ident, ident)}")
+            self.stacks[';'.join(reversed(frames))] += 1
+
+    def _task_stacks(self):
+        # The task set can change under us while the loop runs; skip this round if so
+        try:
+            tasks = list(asyncio.all_tasks(self.loop))
+        except RuntimeError:
+            return
+        for task in tasks:
+            coro = task.get_coro()
+            frames = [f"task:{getattr(coro, '__qualname__', type(coro).__name__)}"]
+            while coro is not None and len(frames) < self.MAX_DEPTH:
+                frame = getattr(coro, 'cr_frame', None) or getattr(coro, 'gi_frame', None)
+                if frame is None:
+                    # Waiting on a future or other awaitable with no frame of its own
+                    frames.append(f"<{type(coro).__name__}>")
+                    break
+                frames.append(_frame_label(frame, self.lines))
+                coro = getattr(coro, 'cr_await', None) or getattr(coro, 'gi_yieldfrom', None)
+            self.stacks[';'.join(frames)] += 1
+
+    def run(self) -> 'StackSampler':
+        own_ident = threading.get_ident()
+        started = time.perf_counter()
+        deadline = started + self.seconds
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            names = {t.ident: t.name for t in threading.enumerate()}
+            self._thread_stacks(names, own_ident)
+            if self.loop is not None:
+                self._task_stacks()
+            cost = time.perf_counter() - now
+            self.sampling_time += cost
+            self.samples += 1
+            # Sleeping cost / max_overhead keeps the sampler's share of wall time bounded
+            time.sleep(max(self.interval - cost, cost / self.max_overhead - cost, 0))
+        self.elapsed = time.perf_counter() - started
+        return self
+
+    def collapsed(self) -> str:
+        return '\n'.join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + '\n'
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'samples': self.samples,
+            'seconds': round(self.elapsed, 3),
+            'overhead': round(self.sampling_time / self.elapsed, 4) if self.elapsed else 0.0,
+        }
+
+
+class Profiler:
+    """Runs one sampler at a time on a dedicated thread"""
+    _lock = threading.Lock()
+
+    @classmethod
+    def busy(cls) -> bool:
+        return cls._lock.locked()
+
+    @classmethod
+    async def profile(cls, seconds: float, hz: float, max_overhead: float,
+                      tasks: bool = True, lines: bool = False) -> Optional[StackSampler]:
+        """Sample for ``seconds``; returns None if another profile is already running"""
+        if not cls._lock.acquire(blocking=False):
+            return None
+        loop = asyncio.get_running_loop()
+        sampler = StackSampler(seconds, hz, max_overhead, loop if tasks else None, lines)
+        done = loop.create_future()
+
+        def run():
+            # The lock is held until sampling stops, even if the request goes away first
+            try:
+                sampler.run()
+            finally:
+                cls._lock.release()
+                if not loop.is_closed():
+                    loop.call_soon_threadsafe(lambda: done.done() or done.set_result(None))
+
+        try:
+            threading.Thread(target=run, name='stack-sampler', daemon=True).start()
+        except Exception:
+            cls._lock.release()
+            raise
+        await done
+        return sampler
@@ -1,21 +1,29 @@
+import asyncio
+import aiohttp
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 from loguru import logger
+from app.core import metrics
 from app.core.config import settings
-from app.api.routes import router as api_router
-from app.websocket.binance_client import BinanceWebsocketClient
+from app.api.routes import SHARED_ROUTES, router as api_router
+from app.websocket.leader import Leadership
+from app.services.binance_rest import BinanceRestClient
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting up the application...")
-    await BinanceWebsocketClient.initialize()
+    loop_monitor = asyncio.create_task(metrics.monitor_event_loop())
+    await Leadership.start(app)
     
     yield
     
     # Shutdown
     logger.info("Shutting down the application...")
-    await BinanceWebsocketClient.cleanup()
+    await Leadership.stop()
+    await BinanceRestClient.close()
+    loop_monitor.cancel()
 
 app = FastAPI(
     title="B2D Trading Assistant",
@@ -23,5 +31,25 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+def _served_by_followers(request: Request) -> bool:
+    path = request.url.path
+    if not path.startswith("/api/"):
+        return True
+    refresh = request.query_params.get("refresh", "").lower() in ("1", "true", "yes", "on")
+    return request.method == "GET" and path[len("/api"):] in SHARED_ROUTES and not refresh
+
+@app.middleware("http")
+async def forward_to_leader(request: Request, call_next):
+    """With several workers, only the stream leader acts on Binance; followers forward such requests to it"""
+    if not Leadership.is_follower() or _served_by_followers(request):
+        return await call_next(request)
+    path = request.url.path + (f"?{request.url.query}" if request.url.query else "")
+    try:
+        status, headers, body = await Leadership.forward(request.method, path, request.headers.items(), await request.body())
+    except (aiohttp.ClientError, OSError, asyncio.TimeoutError) as e:
+        logger.warning(f"Could not forward {request.method} {request.url.path} to the stream leader: {e}")
+        return JSONResponse({"detail": "Stream leader unavailable"}, status_code=503)
+    return Response(body, status_code=status, headers=dict(headers))
+
 # Include API routes
 app.include_router(api_router, prefix="/api") 
\ No newline at end of file
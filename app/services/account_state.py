@@ -0,0 +1,140 @@
+import asyncio
+import time
+from loguru import logger
+from app.core.config import settings
+from app.services.binance_rest import BinanceRestClient
+from typing import Any, Dict, Optional
+
+
+class AccountSnapshot:
+    """
+    In-memory copy of ``futures_account`` kept current from user-data events.
+
+    ``ACCOUNT_UPDATE`` carries absolute wallet balances and position fields, so
+    those are applied directly. Values Binance derives server-side (margins,
+    available balance, non-stablecoin totals) cannot be recomputed from events;
+    changes that affect them mark the snapshot dirty and trigger a debounced
+    REST resync instead.
+    """
+    # Assets whose wallet balance counts 1:1 towards totalWalletBalance
+    STABLE_ASSETS = {'USDT', 'USDC', 'BUSD', 'FDUSD'}
+    # Order events that change open-order margin
+    MARGIN_EXECUTION_TYPES = {'NEW', 'CANCELED', 'EXPIRED', 'AMENDMENT'}
+    _default: Optional['AccountSnapshot'] = None
+
+    def __init__(self, client: BinanceRestClient):
+        self.client = client
+        self.account: Optional[Dict[str, Any]] = None
+        self.synced_at = 0.0
+        self.updated_at = 0.0
+        self.event_time = 0
+        self.dirty = False
+        self._resync = asyncio.Event()
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def default(cls) -> 'AccountSnapshot':
+        if not cls._default:
+            cls._default = cls(BinanceRestClient.default())
+        return cls._default
+
+    async def refresh(self) -> Dict[str, Any]:
+        """Replace the snapshot with a fresh ``futures_account`` response"""
+        async with self._lock:
+            self.dirty = False
+            self._resync.clear()
+            account = await self.client.futures_account()
+            self.account = account
+            self.synced_at = self.updated_at = time.time()
+            logger.debug("Account snapshot refreshed from REST")
+            return account
+
+    async def get(self, force_refresh: bool = False) -> Dict[str, Any]:
+        if force_refresh or self.account is None:
+            return await self.refresh()
+        return self.account
+
+    async def maintain(self):
+        """Resync when events left the snapshot dirty, and at least every ACCOUNT_RESYNC_INTERVAL"""
+        while True:
+            try:
+                await asyncio.wait_for(self._resync.wait(), timeout=settings.ACCOUNT_RESYNC_INTERVAL)
+                # Debounce bursts of order events into one request
+                await asyncio.sleep(1)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing account snapshot: {e}")
+
+    def _mark_dirty(self):
+        self.dirty = True
+        self._resync.set()
+
+    def invalidate(self):
+        """Schedule a resync, e.g. after user-data events may have been missed"""
+        if self.account is not None:
+            self._mark_dirty()
+
+    def apply_account_update(self, msg: Dict[str, Any]):
+        """Apply an ``ACCOUNT_UPDATE`` event"""
+        if self.account is None:
+            return
+        update = msg.get('a', {})
+        assets = {a['asset']: a for a in self.account.get('assets', [])}
+        for balance in update.get('B', []):
+            asset = assets.get(balance['a'])
+            if asset is None:
+                self._mark_dirty()
+                continue
+            delta = float(balance['wb']) - float(asset['walletBalance'])
+            asset['walletBalance'] = balance['wb']
+            asset['crossWalletBalance'] = balance['cw']
+            if balance['a'] in self.STABLE_ASSETS:
+                total = float(self.account.get('totalWalletBalance', 0)) + delta
+                self.account['totalWalletBalance'] = f"{total:.8f}"
+            else:
+                self._mark_dirty()
+
+        positions = {(p['symbol'], p.get('positionSide', 'BOTH')): p for p in self.account.get('positions', [])}
+        for update_position in update.get('P', []):
+            position = positions.get((update_position['s'], update_position.get('ps', 'BOTH')))
+            if position is None:
+                self._mark_dirty()
+                continue
+            position['positionAmt'] = update_position['pa']
+            position['entryPrice'] = update_position['ep']
+            if 'bep' in update_position:
+                position['breakEvenPrice'] = update_position['bep']
+            position['unrealizedProfit'] = update_position['up']
+            position['isolated'] = update_position.get('mt') == 'isolated'
+            position['isolatedWallet'] = update_position.get('iw', position.get('isolatedWallet'))
+        if update.get('P'):
+            total_upnl = sum(float(p.get('unrealizedProfit', 0)) for p in self.account.get('positions', []))
+            self.account['totalUnrealizedProfit'] = f"{total_upnl:.8f}"
+            # Position margins are computed server-side
+            self._mark_dirty()
+
+        self.event_time = max(self.event_time, msg.get('E', 0))
+        self.updated_at = time.time()
+
+    def apply_order_update(self, msg: Dict[str, Any]):
+        """Apply an ``ORDER_TRADE_UPDATE`` event"""
+        if self.account is None:
+            return
+        order = msg.get('o', {})
+        if order.get('x') in self.MARGIN_EXECUTION_TYPES:
+            # Open-order initial margin changed
+            self._mark_dirty()
+        self.event_time = max(self.event_time, msg.get('E', 0))
+        self.updated_at = time.time()
+
+    def status(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            'synced_at': self.synced_at or None,
+            'updated_at': self.updated_at or None,
+            'age_seconds': round(now - self.updated_at, 3) if self.updated_at else None,
+            'stale': self.account is None or self.dirty or now - self.synced_at > settings.ACCOUNT_STALE_AFTER,
+        }
@@ -0,0 +1,57 @@
+import json
+import re
+from app.core.config import settings
+from app.services.account_state import AccountSnapshot
+from app.services.binance_rest import BinanceRestClient
+from app.services.positions import PositionBook
+from typing import Any, Dict, List, Optional
+
+DEFAULT_ACCOUNT = 'default'
+_NAME = re.compile(r'^[A-Za-z0-9_-]{1,32}$')
+
+
+class Account:
+    """
+    One Binance account: its REST credentials, live account and position
+    state, and the webhook its notifications go to. The account configured by
+    the top-level settings is named ``default`` and owns the ``default()``
+    instances, so code without an account in hand keeps working on it.
+    """
+
+    def __init__(self, name: str, client: BinanceRestClient, snapshot: AccountSnapshot,
+                 positions: PositionBook, webhook_url: Optional[str] = None):
+        self.name = name
+        self.client = client
+        self.snapshot = snapshot
+        self.positions = positions
+        self.webhook_url = webhook_url
+
+    @property
+    def is_default(self) -> bool:
+        return self.name == DEFAULT_ACCOUNT
+
+    @classmethod
+    def default(cls) -> 'Account':
+        return cls(DEFAULT_ACCOUNT, BinanceRestClient.default(), AccountSnapshot.default(), PositionBook.default())
+
+    @classmethod
+    def from_config(cls, entry: Dict[str, Any]) -> 'Account':
+        name = str(entry.get('name', ''))
+        if not _NAME.match(name) or name == DEFAULT_ACCOUNT:
+            raise ValueError(f"Invalid account name {name!r} (letters, digits, '_' and '-', not '{DEFAULT_ACCOUNT}')")
+        if not entry.get('api_key') or not entry.get('api_secret'):
+            raise ValueError(f"Account {name} needs api_key and api_secret")
+        client = BinanceRestClient(entry['api_key'], entry['api_secret'])
+        return cls(name, client, AccountSnapshot(client), PositionBook(client), entry.get('discord_webhook_url'))
+
+    @classmethod
+    def configured(cls) -> List['Account']:
+        """The default account followed by every ACCOUNTS entry"""
+        accounts = [cls.default()]
+        entries = json.loads(settings.ACCOUNTS) if settings.ACCOUNTS.strip() else []
+        for entry in entries:
+            account = cls.from_config(entry)
+            if any(a.name == account.name for a in accounts):
+                raise ValueError(f"Duplicate account name {account.name}")
+            accounts.append(account)
+        return accounts
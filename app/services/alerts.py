@@ -0,0 +1,429 @@
+"""
+User-defined alerts evaluated on every trade.
+
+Three kinds are supported, each firing once and then staying listed as
+triggered until it is updated (which re-arms it) or deleted:
+
+* ``price``: the trade price is at or beyond ``threshold`` (``above``/``below``)
+* ``move``:  the price moved ``threshold`` percent up (``above``) or down
+             (``below``) from the low/high of the last ``window`` seconds
+* ``rsi``:   RSI(14) on ``interval``, with the trade as the current bar's
+             close, is at or beyond ``threshold``
+
+Armed alerts are kept per symbol in ladders sorted by threshold. A trade
+bisects each ladder once and pops only the alerts it crossed, so the per-tick
+cost grows with the number of alert groups (two price ladders, one pair per
+move window and RSI interval), not with the number of alerts.
+"""
+import asyncio
+import bisect
+import json
+import math
+import os
+import time
+from datetime import datetime, timezone
+from loguru import logger
+from app.core.config import settings
+from app.services.discord_notifier import DiscordNotifier
+from app.services.indicators import IndicatorEngine
+from app.services.rolling import MonotonicWindow
+from app.services.symbols import normalize
+from app.services.technical_analysis import TechnicalAnalyzer
+from typing import Any, Dict, List, Optional, Tuple
+
+KINDS = ('price', 'move', 'rsi')
+DIRECTIONS = ('above', 'below')
+
+
+class Alert:
+    __slots__ = (
+        'id', 'symbol', 'kind', 'direction', 'threshold', 'window', 'interval', 'note',
+        'created_at', 'triggered_at', 'triggered_value',
+    )
+
+    def __init__(self, alert_id: int, symbol: str, kind: str, direction: str, threshold: float,
+                 window: Optional[int] = None, interval: Optional[str] = None, note: Optional[str] = None,
+                 created_at: Optional[float] = None):
+        self.id = alert_id
+        self.symbol = symbol
+        self.kind = kind
+        self.direction = direction
+        self.threshold = threshold
+        self.window = window
+        self.interval = interval
+        self.note = note
+        self.created_at = created_at or time.time()
+        self.triggered_at: Optional[float] = None
+        self.triggered_value: Optional[float] = None
+
+    @classmethod
+    def validated(cls, alert_id: int, symbol: str, kind: str, direction: str, threshold: float,
+                  window: Optional[int] = None, interval: Optional[str] = None, note: Optional[str] = None,
+                  created_at: Optional[float] = None) -> 'Alert':
+        """Build an alert, raising ValueError for an invalid definition"""
+        if not symbol:
+            raise ValueError("symbol is required")
+        symbol = normalize(symbol)
+        if kind not in KINDS:
+            raise ValueError(f"kind must be one of {', '.join(KINDS)}")
+        if direction not in DIRECTIONS:
+            raise ValueError(f"direction must be one of {', '.join(DIRECTIONS)}")
+        threshold = float(threshold)
+        if not math.isfinite(threshold) or threshold <= 0:
+            raise ValueError("threshold must be a positive number")
+        if kind == 'move':
+            if not window or window <= 0:
+                raise ValueError("move alerts need a window in seconds")
+            window = int(window)
+        else:
+            window = None
+        if kind == 'rsi':
+            interval = interval or TechnicalAnalyzer.INTERVAL
+            if interval not in TechnicalAnalyzer.TIMEFRAMES:
+                raise ValueError(f"interval must be one of {', '.join(TechnicalAnalyzer.TIMEFRAMES)}")
+            if threshold >= 100:
+                raise ValueError("RSI threshold must be below 100")
+        else:
+            interval = None
+        return cls(alert_id, symbol, kind, direction, threshold, window, interval, note, created_at)
+
+    def describe(self, value: float) -> str:
+        if self.kind == 'price':
+            return f"Price is {self.direction} ${self.threshold:,.8g} (last ${value:,.8g})"
+        if self.kind == 'move':
+            way = 'up' if self.direction == 'above' else 'down'
+            return f"Moved {way} {value:.2f}% within {self.window}s (threshold {self.threshold:g}%)"
+        return f"RSI ({self.interval}) is {self.direction} {self.threshold:g} (now {value:.1f})"
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'symbol': self.symbol,
+            'kind': self.kind,
+            'direction': self.direction,
+            'threshold': self.threshold,
+            'window': self.window,
+            'interval': self.interval,
+            'note': self.note,
+            'created_at': self.created_at,
+            'triggered_at': self.triggered_at,
+            'triggered_value': self.triggered_value,
+        }
+
+
+class _Ladder:
+    """Armed alerts sorted by threshold, as (threshold, id)"""
+    __slots__ = ('keys',)
+
+    def __init__(self):
+        self.keys: List[Tuple[float, int]] = []
+
+    def __bool__(self) -> bool:
+        return bool(self.keys)
+
+    def add(self, alert: Alert):
+        bisect.insort(self.keys, (alert.threshold, alert.id))
+
+    def remove(self, alert: Alert):
+        key = (alert.threshold, alert.id)
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            del self.keys[i]
+
+    def pop_at_most(self, value: float) -> List[int]:
+        i = bisect.bisect_right(self.keys, (value, math.inf))
+        if not i:
+            return []
+        crossed = self.keys[:i]
+        del self.keys[:i]
+        return [alert_id for _, alert_id in crossed]
+
+    def pop_at_least(self, value: float) -> List[int]:
+        i = bisect.bisect_left(self.keys, (value, -math.inf))
+        if i == len(self.keys):
+            return []
+        crossed = self.keys[i:]
+        del self.keys[i:]
+        return [alert_id for _, alert_id in crossed]
+
+
+class _MoveGroup:
+    """Move alerts of one symbol sharing a window, and that window's low/high"""
+    __slots__ = ('extremes', 'up', 'down')
+
+    def __init__(self, window: int):
+        self.extremes = MonotonicWindow(window * 1000)
+        self.up = _Ladder()
+        self.down = _Ladder()
+
+
+class _SymbolAlerts:
+    __slots__ = ('above', 'below', 'moves', 'rsi')
+
+    def __init__(self):
+        self.above = _Ladder()
+        self.below = _Ladder()
+        self.moves: Dict[int, _MoveGroup] = {}
+        self.rsi: Dict[str, Tuple[_Ladder, _Ladder]] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.above or self.below or self.moves or self.rsi)
+
+    def ladder(self, alert: Alert, create: bool = True) -> Optional[_Ladder]:
+        above = alert.direction == 'above'
+        if alert.kind == 'price':
+            return self.above if above else self.below
+        if alert.kind == 'move':
+            group = self.moves.get(alert.window)
+            if group is None:
+                if not create:
+                    return None
+                group = self.moves[alert.window] = _MoveGroup(alert.window)
+            return group.up if above else group.down
+        pair = self.rsi.get(alert.interval)
+        if pair is None:
+            if not create:
+                return None
+            pair = self.rsi[alert.interval] = (_Ladder(), _Ladder())
+        return pair[0] if above else pair[1]
+
+    def prune(self):
+        for window in [w for w, g in self.moves.items() if not (g.up or g.down)]:
+            del self.moves[window]
+        for interval in [i for i, (a, b) in self.rsi.items() if not (a or b)]:
+            del self.rsi[interval]
+
+
+class AlertEngine:
+    """In-memory alert store and per-trade evaluator, persisted to DATA_DIR/alerts.json"""
+    SAVE_DELAY = 1.0
+
+    _alerts: Dict[int, Alert] = {}
+    _books: Dict[str, _SymbolAlerts] = {}
+    _next_id = 1
+    _save_task: Optional[asyncio.Task] = None
+    _dirty = False
+    fired = 0
+
+    @classmethod
+    def _path(cls) -> str:
+        return os.path.join(settings.DATA_DIR, 'alerts.json')
+
+    @classmethod
+    def _arm(cls, alert: Alert):
+        book = cls._books.get(alert.symbol)
+        if book is None:
+            book = cls._books[alert.symbol] = _SymbolAlerts()
+        book.ladder(alert).add(alert)
+
+    @classmethod
+    def _disarm(cls, alert: Alert):
+        book = cls._books.get(alert.symbol)
+        if book is None:
+            return
+        ladder = book.ladder(alert, create=False)
+        if ladder is not None:
+            ladder.remove(alert)
+        book.prune()
+        if not book:
+            del cls._books[alert.symbol]
+
+    @classmethod
+    def create(cls, symbol: str, kind: str, direction: str, threshold: float, window: Optional[int] = None,
+               interval: Optional[str] = None, note: Optional[str] = None) -> Alert:
+        if len(cls._alerts) >= settings.ALERT_LIMIT:
+            raise ValueError(f"Alert limit of {settings.ALERT_LIMIT} reached")
+        alert = Alert.validated(cls._next_id, symbol, kind, direction, threshold, window, interval, note)
+        cls._next_id += 1
+        cls._alerts[alert.id] = alert
+        cls._arm(alert)
+        cls._save_soon()
+        return alert
+
+    @classmethod
+    def update(cls, alert_id: int, **changes: Any) -> Optional[Alert]:
+        """Replace fields of an alert and re-arm it; None if it does not exist"""
+        current = cls._alerts.get(alert_id)
+        if current is None:
+            return None
+        fields = {k: getattr(current, k) for k in ('symbol', 'kind', 'direction', 'threshold', 'window', 'interval', 'note')}
+        fields.update({k: v for k, v in changes.items() if v is not None})
+        alert = Alert.validated(alert_id, created_at=current.created_at, **fields)
+        if current.triggered_at is None:
+            cls._disarm(current)
+        cls._alerts[alert_id] = alert
+        cls._arm(alert)
+        cls._save_soon()
+        return alert
+
+    @classmethod
+    def delete(cls, alert_id: int) -> bool:
+        alert = cls._alerts.pop(alert_id, None)
+        if alert is None:
+            return False
+        if alert.triggered_at is None:
+            cls._disarm(alert)
+        cls._save_soon()
+        return True
+
+    @classmethod
+    def get(cls, alert_id: int) -> Optional[Alert]:
+        return cls._alerts.get(alert_id)
+
+    @classmethod
+    def query(cls, symbol: Optional[str] = None, triggered: Optional[bool] = None) -> List[Alert]:
+        return [
+            a for a in cls._alerts.values()
+            if (symbol is None or a.symbol == symbol.upper())
+            and (triggered is None or (a.triggered_at is not None) == triggered)
+        ]
+
+    @classmethod
+    def symbols(cls) -> List[str]:
+        """Symbols with armed alerts, which need a trade stream"""
+        return sorted(cls._books)
+
+    @classmethod
+    def rsi_timeframes(cls) -> List[Tuple[str, str]]:
+        """(symbol, interval) pairs with armed RSI alerts, which need live indicators"""
+        return [(symbol, interval) for symbol, book in cls._books.items() for interval in book.rsi]
+
+    @classmethod
+    def on_trade(cls, symbol: str, price: float, trade_time: int):
+        """Evaluate a symbol's armed alerts against one trade"""
+        book = cls._books.get(symbol)
+        if book is None:
+            return
+        fired: List[Tuple[List[int], float]] = []
+        if book.above:
+            fired.append((book.above.pop_at_most(price), price))
+        if book.below:
+            fired.append((book.below.pop_at_least(price), price))
+        for group in book.moves.values():
+            group.extremes.push(trade_time, price)
+            if group.up:
+                rise = (price / group.extremes.min - 1.0) * 100.0
+                fired.append((group.up.pop_at_most(rise), rise))
+            if group.down:
+                drop = (1.0 - price / group.extremes.max) * 100.0
+                fired.append((group.down.pop_at_most(drop), drop))
+        for interval, (above, below) in book.rsi.items():
+            rsi = IndicatorEngine.live_rsi(symbol, interval, price)
+            if rsi is None:
+                continue
+            if above:
+                fired.append((above.pop_at_most(rsi), rsi))
+            if below:
+                fired.append((below.pop_at_least(rsi), rsi))
+        if any(ids for ids, _ in fired):
+            cls._fire(fired)
+            book.prune()
+            if not book:
+                del cls._books[symbol]
+
+    @classmethod
+    def _fire(cls, fired: List[Tuple[List[int], float]]):
+        now = time.time()
+        for ids, value in fired:
+            for alert_id in ids:
+                alert = cls._alerts.get(alert_id)
+                if alert is None:
+                    continue
+                alert.triggered_at = now
+                alert.triggered_value = value
+                cls.fired += 1
+                logger.info(f"Alert {alert.id} triggered: {alert.symbol} {alert.describe(value)}")
+                DiscordNotifier.enqueue(cls._build_embed(alert, value))
+        cls._save_soon()
+
+    @staticmethod
+    def _build_embed(alert: Alert, value: float) -> Dict[str, Any]:
+        fields = [{"name": "Alert", "value": f"#{alert.id} ({alert.kind})", "inline": True}]
+        if alert.note:
+            fields.append({"name": "Note", "value": alert.note[:1000], "inline": False})
+        return {
+            "title": f"🔔 {alert.symbol} Alert",
+            "description": alert.describe(value),
+            "color": 0xffa500,
+            "fields": fields,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "footer": DiscordNotifier.FOOTER,
+        }
+
+    @classmethod
+    def load(cls):
+        """Restore saved alerts; triggered ones stay triggered"""
+        try:
+            with open(cls._path()) as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.error(f"Error loading alerts: {e}")
+            return
+        cls._alerts.clear()
+        cls._books.clear()
+        for row in saved:
+            try:
+                alert = Alert.validated(
+                    row['id'], row['symbol'], row['kind'], row['direction'], row['threshold'],
+                    row.get('window'), row.get('interval'), row.get('note'), row.get('created_at'),
+                )
+            except (KeyError, ValueError) as e:
+                logger.error(f"Skipping saved alert {row}: {e}")
+                continue
+            alert.triggered_at = row.get('triggered_at')
+            alert.triggered_value = row.get('triggered_value')
+            cls._alerts[alert.id] = alert
+            if alert.triggered_at is None:
+                cls._arm(alert)
+        cls._next_id = max(cls._alerts, default=0) + 1
+        logger.info(f"Loaded {len(cls._alerts)} alerts")
+
+    @classmethod
+    def _write(cls, rows: List[Dict[str, Any]]):
+        os.makedirs(settings.DATA_DIR, exist_ok=True)
+        path = cls._path()
+        with open(path + '.tmp', 'w') as f:
+            json.dump(rows, f)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def _save_soon(cls):
+        """Write the store shortly, once per burst of changes"""
+        cls._dirty = True
+        if cls._save_task and not cls._save_task.done():
+            return
+        try:
+            cls._save_task = asyncio.get_running_loop().create_task(cls._save())
+        except RuntimeError:
+            cls._dirty = False
+            cls._write([a.as_dict() for a in cls._alerts.values()])
+
+    @classmethod
+    async def _save(cls):
+        while cls._dirty:
+            await asyncio.sleep(cls.SAVE_DELAY)
+            cls._dirty = False
+            try:
+                await asyncio.to_thread(cls._write, [a.as_dict() for a in cls._alerts.values()])
+            except Exception as e:
+                logger.error(f"Error saving alerts: {e}")
+
+    @classmethod
+    async def stop(cls):
+        """Write changes still waiting for the save delay"""
+        if cls._save_task and not cls._save_task.done():
+            cls._save_task.cancel()
+        if cls._dirty:
+            cls._dirty = False
+            await asyncio.to_thread(cls._write, [a.as_dict() for a in cls._alerts.values()])
+
+    @classmethod
+    def status(cls) -> Dict[str, Any]:
+        return {
+            'alerts': len(cls._alerts),
+            'armed': sum(1 for a in cls._alerts.values() if a.triggered_at is None),
+            'symbols': len(cls._books),
+            'fired': cls.fired,
+        }
@@ -0,0 +1,300 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from loguru import logger
+from app.core.config import settings
+from app.services.accounts import Account
+from app.services.discord_notifier import DiscordNotifier
+from app.services.technical_analysis import TechnicalAnalyzer
+from app.services.trade_analyzer import TradeAnalyzer
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+
+class TTLCache:
+    """Small LRU cache whose entries expire after ``ttl`` seconds"""
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._items: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._items.get(key)
+        if item is None or item[0] < time.monotonic():
+            self._items.pop(key, None)
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key: Hashable, value: Any):
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+
+class TradeAnalysisPipeline:
+    """
+    LLM analysis of fills, run after the fill notification has been queued.
+
+    Fills are queued (bounded, dropped when full) and handled by a pool of
+    workers; at most ANALYSIS_CONCURRENCY completions are in flight and each
+    is cut off after ANALYSIS_TIMEOUT seconds. Results are cached under a
+    normalized key (symbol, side, price bucket, coarse indicator state) so
+    repeated scale-in fills reuse the same analysis; a fill whose key is
+    already being analyzed waits for that completion instead of starting one.
+
+    With ANALYSIS_BATCH_WINDOW > 0, fills arriving within the window are
+    analyzed together in one JSON-structured completion instead.
+    """
+    _queue: Optional[asyncio.Queue] = None
+    _semaphore: Optional[asyncio.Semaphore] = None
+    _workers: list = []
+    # Batch analyses started by the batch worker, referenced until they finish
+    _batches: Set[asyncio.Task] = set()
+    _cache: Optional[TTLCache] = None
+    # Cache key -> result (None if it failed) of the completion running for it
+    _inflight: Dict[Hashable, asyncio.Future] = {}
+    dropped = 0
+    shared = 0
+    timeouts = 0
+    # Fill event time to analysis queued for Discord, and completion tokens per analyzed trade
+    _latency_sum = 0.0
+    _latency_count = 0
+    last_latency: Optional[float] = None
+    _tokens_sum = 0
+    _tokens_trades = 0
+
+    @classmethod
+    async def start(cls):
+        if cls._workers or not settings.ANALYSIS_ENABLED:
+            return
+        cls._queue = asyncio.Queue(maxsize=settings.ANALYSIS_QUEUE_SIZE)
+        cls._semaphore = asyncio.Semaphore(settings.ANALYSIS_CONCURRENCY)
+        cls._cache = TTLCache(settings.ANALYSIS_CACHE_TTL)
+        if settings.ANALYSIS_BATCH_WINDOW > 0:
+            # One collector; batches run concurrently up to the semaphore limit
+            cls._workers = [asyncio.create_task(cls._batch_worker())]
+        else:
+            cls._workers = [asyncio.create_task(cls._worker()) for _ in range(settings.ANALYSIS_CONCURRENCY)]
+
+    @classmethod
+    async def warm_up(cls):
+        """Load the LLM client off the event loop, so the first fill does not pay for the import"""
+        if not cls._workers:
+            return
+        try:
+            await asyncio.to_thread(TradeAnalyzer.preload)
+        except Exception as e:
+            logger.error(f"Error loading the analysis client: {e}")
+
+    @classmethod
+    async def stop(cls):
+        tasks = [*cls._workers, *cls._batches]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        cls._workers = []
+
+    @classmethod
+    def submit(cls, msg: Dict[Any, Any], account: Optional[Account] = None):
+        """Queue a fill of ``account`` (the default one if omitted) for analysis; never waits"""
+        if cls._queue is None:
+            return
+        try:
+            cls._queue.put_nowait((msg, account))
+        except asyncio.QueueFull:
+            cls.dropped += 1
+            logger.warning(f"Analysis queue full, skipping order {msg.get('o', {}).get('i')}")
+
+    @staticmethod
+    def cache_key(order: Dict[Any, Any], indicators: Optional[Dict[str, Any]]) -> Hashable:
+        price = float(order.get('ap') or 0) or float(order.get('p') or 0)
+        step = math.log1p(settings.ANALYSIS_PRICE_BUCKET_PCT / 100)
+        price_bucket = round(math.log(price) / step) if price > 0 else 0
+        indicators = indicators or {}
+        rsi = indicators.get('rsi')
+        macd, macd_signal = indicators.get('macd'), indicators.get('macd_signal')
+        ema_20, ema_50 = indicators.get('ema_20'), indicators.get('ema_50')
+        return (
+            order.get('s'),
+            order.get('S'),
+            price_bucket,
+            int(rsi // 10) if rsi is not None else None,
+            macd > macd_signal if macd is not None and macd_signal is not None else None,
+            ema_20 > ema_50 if ema_20 is not None and ema_50 is not None else None,
+        )
+
+    @classmethod
+    async def _worker(cls):
+        while True:
+            msg, account = await cls._queue.get()
+            try:
+                await cls._analyze(msg, account)
+            except Exception as e:
+                logger.error(f"Error analyzing trade: {e}")
+
+    @classmethod
+    async def _batch_worker(cls):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await cls._queue.get()]
+            deadline = loop.time() + settings.ANALYSIS_BATCH_WINDOW
+            while len(items) < settings.ANALYSIS_BATCH_MAX:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(cls._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+            task = asyncio.create_task(cls._analyze_batch(items))
+            cls._batches.add(task)
+            task.add_done_callback(cls._batches.discard)
+
+    @classmethod
+    def _deliver(cls, msg: Dict[Any, Any], analysis: str, account: Optional[Account]):
+        latency = time.time() - msg.get('T', 0) / 1000
+        cls.last_latency = latency
+        cls._latency_sum += latency
+        cls._latency_count += 1
+        webhook_url = account.webhook_url if account else None
+        DiscordNotifier.enqueue(cls._build_embed(msg.get('o', {}), analysis), webhook_url=webhook_url)
+
+    @classmethod
+    def _record_tokens(cls, tokens: Optional[int], trades: int):
+        if tokens:
+            cls._tokens_sum += tokens
+            cls._tokens_trades += trades
+
+    @classmethod
+    def _claim(cls, key: Hashable):
+        cls._inflight[key] = asyncio.get_running_loop().create_future()
+
+    @classmethod
+    def _release(cls, key: Hashable, result: Optional[Dict[str, Any]]):
+        future = cls._inflight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    @classmethod
+    async def _shared_result(cls, key: Hashable) -> Optional[Dict[str, Any]]:
+        """Wait for the completion already running for ``key``"""
+        cls.shared += 1
+        return await asyncio.shield(cls._inflight[key])
+
+    @classmethod
+    async def _analyze(cls, msg: Dict[Any, Any], account: Optional[Account]):
+        order = msg.get('o', {})
+        market_data = await TechnicalAnalyzer.get_market_data(order.get('s'), {}, account)
+        key = cls.cache_key(order, market_data.get('indicators'))
+        result = cls._cache.get(key)
+        if result is None and key in cls._inflight:
+            result = await cls._shared_result(key)
+            if result is None:
+                logger.warning(f"No analysis for order {order.get('i')}: the one it was sharing failed")
+                return
+        elif result is None:
+            cls._claim(key)
+            try:
+                async with cls._semaphore:
+                    try:
+                        result = await asyncio.wait_for(
+                            TradeAnalyzer.analyze_trade_async(order, market_data), timeout=settings.ANALYSIS_TIMEOUT
+                        )
+                    except asyncio.TimeoutError:
+                        cls.timeouts += 1
+                        logger.warning(f"Trade analysis timed out for order {order.get('i')}")
+                        return
+                cls._record_tokens(result.get('tokens'), 1)
+                cls._cache.set(key, result)
+            finally:
+                cls._release(key, result)
+        else:
+            logger.debug(f"Reusing cached analysis for order {order.get('i')}")
+        cls._deliver(msg, result['analysis'], account)
+
+    @classmethod
+    async def _analyze_batch(cls, items: List[Tuple[Dict[Any, Any], Optional[Account]]]):
+        try:
+            orders = [msg.get('o', {}) for msg, _ in items]
+            market_data = await asyncio.gather(*(
+                TechnicalAnalyzer.get_market_data(msg.get('o', {}).get('s'), {}, account) for msg, account in items
+            ))
+            keys = [cls.cache_key(o, m.get('indicators')) for o, m in zip(orders, market_data)]
+            # One cache lookup per fill, kept so hit/miss counts stay per fill
+            cached = [cls._cache.get(key) for key in keys]
+            results: Dict[Hashable, Optional[Dict[str, Any]]] = {}
+
+            # One prompt entry per distinct key that is neither cached nor being analyzed already
+            pending: Dict[Hashable, int] = {}
+            waiting: List[Hashable] = []
+            for i, key in enumerate(keys):
+                if cached[i] is None and key not in pending and key not in waiting:
+                    if key in cls._inflight:
+                        waiting.append(key)
+                    else:
+                        pending[key] = i
+            if pending:
+                for key in pending:
+                    cls._claim(key)
+                try:
+                    trades = [(orders[i], market_data[i]) for i in pending.values()]
+                    async with cls._semaphore:
+                        try:
+                            analyses, tokens = await asyncio.wait_for(
+                                TradeAnalyzer.analyze_trades_batch(trades), timeout=settings.ANALYSIS_TIMEOUT
+                            )
+                        except asyncio.TimeoutError:
+                            cls.timeouts += 1
+                            logger.warning(f"Batch analysis of {len(trades)} trades timed out")
+                            return
+                    cls._record_tokens(tokens, len(trades))
+                    for key, analysis in zip(pending, analyses):
+                        if analysis:
+                            results[key] = {"analysis": analysis}
+                            cls._cache.set(key, results[key])
+                    logger.info(f"Analyzed {len(trades)} trades in one completion ({tokens} tokens)")
+                finally:
+                    for key in pending:
+                        cls._release(key, results.get(key))
+            for key in waiting:
+                results[key] = await cls._shared_result(key)
+
+            for (msg, account), key, result in zip(items, keys, cached):
+                result = result or results.get(key)
+                if result is None:
+                    logger.warning(f"No analysis returned for order {msg.get('o', {}).get('i')}")
+                    continue
+                cls._deliver(msg, result['analysis'], account)
+        except Exception as e:
+            logger.error(f"Error analyzing trade batch: {e}")
+
+    @staticmethod
+    def _build_embed(order: Dict[Any, Any], analysis: str) -> Dict[str, Any]:
+        return {
+            "title": f"🧠 Analysis: {order.get('s')} {order.get('S')}",
+            "description": analysis[:4000],
+            "color": 0x9b59b6,
+            "footer": {"text": f"B2D Trading Assistant · order {order.get('i')}"},
+        }
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "queue_depth": cls._queue.qsize() if cls._queue else 0,
+            "dropped": cls.dropped,
+            "timeouts": cls.timeouts,
+            "cache_hits": cls._cache.hits if cls._cache else 0,
+            "cache_misses": cls._cache.misses if cls._cache else 0,
+            "shared": cls.shared,
+            "batch_window": settings.ANALYSIS_BATCH_WINDOW,
+            "last_latency_seconds": cls.last_latency,
+            "avg_latency_seconds": cls._latency_sum / cls._latency_count if cls._latency_count else None,
+            "tokens_per_trade": cls._tokens_sum / cls._tokens_trades if cls._tokens_trades else None,
+        }
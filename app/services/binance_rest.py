@@ -0,0 +1,165 @@
+import aiohttp
+import asyncio
+import hashlib
+import hmac
+import time
+import urllib.parse
+from loguru import logger
+from app.core import metrics
+from app.core.config import settings
+from typing import Any, Dict, List, Optional
+
+
+class BinanceAPIError(Exception):
+    """Non-2xx response from the Binance REST API"""
+
+    def __init__(self, status: int, code: Optional[int], message: str):
+        super().__init__(f"Binance API error {status} (code {code}): {message}")
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+class BinanceRestClient:
+    """
+    Async Binance USD-M futures REST client.
+
+    All instances share one pooled ``aiohttp`` session and one view of the
+    IP-wide request weight; each instance carries its own API credentials.
+    """
+    BASE_URL = settings.BINANCE_REST_BASE_URL
+    # Request weight allowed per minute for USD-M futures, and the share of it
+    # we are willing to use before delaying requests until the next minute
+    WEIGHT_LIMIT = 2400
+    WEIGHT_HEADROOM = 0.9
+
+    _session: Optional[aiohttp.ClientSession] = None
+    _default: Optional['BinanceRestClient'] = None
+    _used_weight = 0
+    _weight_minute = 0
+    _backoff_until = 0.0
+
+    def __init__(self, api_key: str, api_secret: str):
+        self.api_key = api_key
+        self.api_secret = api_secret
+
+    @classmethod
+    def default(cls) -> 'BinanceRestClient':
+        """Client for the account configured in settings"""
+        if not cls._default:
+            cls._default = cls(settings.BINANCE_API_KEY, settings.BINANCE_API_SECRET)
+        return cls._default
+
+    @classmethod
+    def _get_session(cls) -> aiohttp.ClientSession:
+        if cls._session is None or cls._session.closed:
+            cls._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=settings.BINANCE_REST_POOL_SIZE, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=settings.BINANCE_REST_TIMEOUT),
+            )
+        return cls._session
+
+    @classmethod
+    async def close(cls):
+        if cls._session and not cls._session.closed:
+            await cls._session.close()
+        cls._session = None
+
+    @classmethod
+    def used_weight(cls) -> int:
+        """Request weight used in the current minute, as last reported by Binance"""
+        return cls._used_weight if cls._weight_minute == int(time.time() // 60) else 0
+
+    @classmethod
+    async def _wait_for_weight(cls, weight: int):
+        """Delay a request that would exceed the weight budget or hit an active ban"""
+        now = time.time()
+        if cls._backoff_until > now:
+            await asyncio.sleep(cls._backoff_until - now)
+            now = time.time()
+        if cls.used_weight() + weight > cls.WEIGHT_LIMIT * cls.WEIGHT_HEADROOM:
+            delay = 60 - now % 60
+            logger.warning(f"Binance request weight at {cls._used_weight}/{cls.WEIGHT_LIMIT}, waiting {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    @classmethod
+    def _track_weight(cls, response: aiohttp.ClientResponse):
+        used = response.headers.get('X-MBX-USED-WEIGHT-1M')
+        if used is not None:
+            cls._used_weight = int(used)
+            cls._weight_minute = int(time.time() // 60)
+        if response.status in (418, 429):
+            retry_after = float(response.headers.get('Retry-After', 60))
+            cls._backoff_until = time.time() + retry_after
+            logger.error(f"Binance rate limit hit ({response.status}), backing off {retry_after:.0f}s")
+
+    def _sign(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        params = dict(params, timestamp=int(time.time() * 1000), recvWindow=5000)
+        query = urllib.parse.urlencode(params)
+        params['signature'] = hmac.new(self.api_secret.encode(), query.encode(), hashlib.sha256).hexdigest()
+        return params
+
+    async def request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                      signed: bool = False, weight: int = 1) -> Any:
+        """Send a request, signing it when needed, and return the decoded JSON body"""
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+        await self._wait_for_weight(weight)
+        # Signed after any wait, so the timestamp is within recvWindow when Binance receives it
+        if signed:
+            params = self._sign(params)
+        started = time.perf_counter()
+        async with self._get_session().request(
+            method,
+            f"{self.BASE_URL}{path}",
+            params=params,
+            headers={"X-MBX-APIKEY": self.api_key},
+        ) as response:
+            metrics.REST_REQUEST_SECONDS.observe(time.perf_counter() - started, path)
+            self._track_weight(response)
+            if response.status >= 400:
+                metrics.REST_ERRORS.inc(str(response.status))
+                try:
+                    body = await response.json(content_type=None)
+                    raise BinanceAPIError(response.status, body.get('code'), body.get('msg', ''))
+                except (ValueError, AttributeError):
+                    raise BinanceAPIError(response.status, None, await response.text())
+            return await response.json(content_type=None)
+
+    async def futures_klines(self, symbol: str, interval: str, limit: int = 500,
+                             startTime: Optional[int] = None, endTime: Optional[int] = None) -> List[List[Any]]:
+        weight = 1 if limit < 100 else 2 if limit < 500 else 5 if limit <= 1000 else 10
+        return await self.request('GET', '/fapi/v1/klines', {
+            'symbol': symbol, 'interval': interval, 'limit': limit,
+            'startTime': startTime, 'endTime': endTime,
+        }, weight=weight)
+
+    async def futures_exchange_info(self) -> Dict[str, Any]:
+        return await self.request('GET', '/fapi/v1/exchangeInfo')
+
+    async def futures_account(self) -> Dict[str, Any]:
+        return await self.request('GET', '/fapi/v2/account', signed=True, weight=5)
+
+    async def futures_position_information(self, symbol: Optional[str] = None) -> List[Dict[str, Any]]:
+        return await self.request('GET', '/fapi/v2/positionRisk', {'symbol': symbol}, signed=True, weight=5)
+
+    async def futures_account_trades(self, symbol: str, startTime: Optional[int] = None,
+                                     endTime: Optional[int] = None, fromId: Optional[int] = None,
+                                     limit: int = 500) -> List[Dict[str, Any]]:
+        # Binance rejects fromId together with a time range
+        return await self.request('GET', '/fapi/v1/userTrades', {
+            'symbol': symbol, 'startTime': startTime, 'endTime': endTime, 'fromId': fromId, 'limit': limit,
+        }, signed=True, weight=5)
+
+    async def new_listen_key(self) -> str:
+        data = await self.request('POST', '/fapi/v1/listenKey')
+        return data['listenKey']
+
+    async def keepalive_listen_key(self):
+        await self.request('PUT', '/fapi/v1/listenKey')
+
+    async def delete_listen_key(self):
+        await self.request('DELETE', '/fapi/v1/listenKey')
+
+
+metrics.CallbackMetric('b2d_binance_rest_used_weight', 'Request weight used in the current minute', 'gauge',
+                       BinanceRestClient.used_weight)
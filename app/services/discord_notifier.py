@@ -1,58 +1,254 @@
-from discord_webhook import DiscordWebhook, DiscordEmbed
+from app.core import metrics
 from app.core.config import settings
+from app.services.positions import Position, PositionBook
 from app.services.technical_analysis import TechnicalAnalyzer
-from typing import Dict, Any
-from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, timezone
+import aiohttp
 import asyncio
+import json
+import time
 from loguru import logger
 
 class DiscordNotifier:
-    @staticmethod
-    async def send_trade_notification(msg: Dict[Any, Any]):
+    """
+    Background Discord webhook dispatcher.
+
+    Embeds are queued (bounded) and a single worker hands them to one sender
+    task per webhook URL, which posts them over a shared persistent HTTP
+    session, packing up to ten embeds per webhook call.
+    Partial fills of the same order are merged for a short window before their
+    notification is queued. 429 responses are retried after ``Retry-After``,
+    and an exhausted rate limit bucket delays the next post until it resets;
+    Discord limits each webhook separately, so buckets are kept per URL.
+    """
+    MAX_EMBEDS = 10
+    # Discord caps the combined size of all embeds in a message at 6000 characters
+    MAX_EMBED_CHARS = 5500
+    FOOTER = {"text": "B2D Trading Assistant"}
+    # A fill's ACCOUNT_UPDATE usually arrives just after it; wait this long so the position field is current
+    POSITION_SETTLE_DELAY = 0.1
+
+    _queue: Optional[asyncio.Queue] = None
+    _session: Optional[aiohttp.ClientSession] = None
+    _worker_task: Optional[asyncio.Task] = None
+    # Webhook url -> embeds waiting for its sender, and the sender task while it runs
+    _outbox: Dict[str, List[Dict[str, Any]]] = {}
+    _senders: Dict[str, asyncio.Task] = {}
+    # (webhook url, symbol, order id) -> (merged event, number of fills merged, position book)
+    _pending_fills: Dict[Tuple[str, str, Any], Tuple[Dict[Any, Any], int, Optional[PositionBook]]] = {}
+    _pending_timers: Dict[Tuple[str, str, Any], asyncio.TimerHandle] = {}
+    # Webhook url -> time its rate limit bucket resets
+    _bucket_reset_at: Dict[str, float] = {}
+    dropped = 0
+    sent = 0
+
+    @classmethod
+    async def start(cls):
+        if cls._worker_task:
+            return
+        cls._queue = asyncio.Queue(maxsize=settings.DISCORD_QUEUE_SIZE)
+        cls._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        cls._worker_task = asyncio.create_task(cls._worker())
+
+    @classmethod
+    async def stop(cls):
+        """Queue merged fills still waiting for their window, send what is queued, then close"""
+        if not cls._worker_task:
+            return
+        for key in list(cls._pending_timers):
+            cls._flush_fill(key)
+        try:
+            await asyncio.wait_for(cls._queue.join(), timeout=5)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {cls._queue.qsize()} queued Discord notifications on shutdown")
+        cls._worker_task.cancel()
+        for task in list(cls._senders.values()):
+            task.cancel()
+        await cls._session.close()
+        cls._worker_task = None
+
+    @classmethod
+    def queue_depth(cls) -> int:
+        return cls._queue.qsize() if cls._queue else 0
+
+    @classmethod
+    def enqueue(cls, embed: Dict[str, Any], webhook_url: Optional[str] = None):
+        """Queue an embed for delivery without waiting for Discord"""
+        if cls._queue is None:
+            logger.debug("Discord notifier not started, dropping notification")
+            return
+        try:
+            cls._queue.put_nowait((webhook_url or settings.DISCORD_WEBHOOK_URL, embed))
+        except asyncio.QueueFull:
+            cls.dropped += 1
+            logger.error("Discord queue full, dropping notification")
+
+    @classmethod
+    def send_trade_notification(cls, msg: Dict[Any, Any], webhook_url: Optional[str] = None,
+                                positions: Optional[PositionBook] = None):
         """
-        Send a detailed trade notification to Discord including technical analysis
+        Queue a detailed trade notification, merging partial fills of the same order.
+        With ``positions``, the resulting position is read from the book when sent.
         """
         try:
+            url = webhook_url or settings.DISCORD_WEBHOOK_URL
             order = msg.get('o', {})
-            
-            # Create webhook
-            webhook = DiscordWebhook(url=settings.DISCORD_WEBHOOK_URL)
-            
-            # Create embed
-            side = "LONG" if order.get('S') == "BUY" else "SHORT"
-            color = "00ff00" if side == "LONG" else "ff0000"
-            
-            embed = DiscordEmbed(
-                title=f"🚨 New {side} Position: {order.get('s')}",
-                color=color
-            )
-            
-            # Add trade details
-            embed.add_embed_field(name="Symbol", value=order.get('s'), inline=True)
-            embed.add_embed_field(name="Side", value=side, inline=True)
-            embed.add_embed_field(name="Type", value=order.get('o'), inline=True)
-            embed.add_embed_field(name="Price", value=f"${order.get('p')}", inline=True)
-            embed.add_embed_field(name="Quantity", value=order.get('q'), inline=True)
-            embed.add_embed_field(name="Leverage", value=f"{order.get('L')}x", inline=True)
-            
-            if order.get('pP'):  # PNL data
-                embed.add_embed_field(name="Realized PNL", value=f"${order.get('pP')}", inline=True)
-            
-            # Add timestamp
-            embed.set_timestamp(datetime.fromtimestamp(msg.get('T', 0) / 1000))
-            
-            # Add footer
-            embed.set_footer(text="B2D Trading Assistant")
-            
-            # Add webhook
-            webhook.add_embed(embed)
-            
-            # Send webhook (in a non-blocking way)
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, webhook.execute)
-            
-            logger.info(f"Discord notification sent for {order.get('s')}")
-            
+            key = (url, order.get('s'), order.get('i'))
+            merged, fills, _ = cls._pending_fills.get(key, (None, 0, None))
+            if merged is not None:
+                merged_order = merged['o']
+                msg = {**msg, 'o': {**order, 'rp': str(float(merged_order.get('rp') or 0) + float(order.get('rp') or 0))}}
+            cls._pending_fills[key] = (msg, fills + 1, positions)
+
+            loop = asyncio.get_running_loop()
+            if order.get('X') == 'FILLED':
+                if positions is None:
+                    cls._flush_fill(key)
+                else:
+                    timer = cls._pending_timers.pop(key, None)
+                    if timer:
+                        timer.cancel()
+                    cls._pending_timers[key] = loop.call_later(cls.POSITION_SETTLE_DELAY, cls._flush_fill, key)
+            elif key not in cls._pending_timers:
+                cls._pending_timers[key] = loop.call_later(settings.DISCORD_COALESCE_WINDOW, cls._flush_fill, key)
         except Exception as e:
-            logger.error(f"Error sending Discord notification: {e}")
-            logger.error(f"Message content: {msg}") 
\ No newline at end of file
+            logger.error(f"Error queueing Discord notification: {e}")
+            logger.error(f"Message content: {msg}")
+
+    @classmethod
+    def _flush_fill(cls, key: Tuple[str, str, Any]):
+        timer = cls._pending_timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        pending = cls._pending_fills.pop(key, None)
+        if pending:
+            msg, fills, positions = pending
+            cls.enqueue(cls._build_trade_embed(msg, fills, positions), webhook_url=key[0])
+
+    @staticmethod
+    def _position_field(position: Optional[Position]) -> Dict[str, Any]:
+        if position is None:
+            return {"name": "Position", "value": "Flat", "inline": False}
+        lines = [
+            f"Size: {position.amount:g} @ ${position.entry_price:g}",
+            f"uPnL: ${position.unrealized_pnl:,.2f}",
+        ]
+        distance = position.liquidation_distance
+        if distance is not None and not position.liquidation_stale:
+            lines.append(f"Liquidation: ${position.liquidation_price:g} ({distance:.1%} away)")
+        return {"name": "Position", "value": "\n".join(lines), "inline": False}
+
+    @classmethod
+    def _build_trade_embed(cls, msg: Dict[Any, Any], fills: int = 1,
+                          positions: Optional[PositionBook] = None) -> Dict[str, Any]:
+        order = msg.get('o', {})
+        side = "LONG" if order.get('S') == "BUY" else "SHORT"
+        price = order.get('ap') if float(order.get('ap') or 0) else order.get('p')
+
+        fields = [
+            {"name": "Symbol", "value": order.get('s'), "inline": True},
+            {"name": "Side", "value": side, "inline": True},
+            {"name": "Type", "value": order.get('o'), "inline": True},
+            {"name": "Price", "value": f"${price}", "inline": True},
+            {"name": "Quantity", "value": f"{order.get('z')} / {order.get('q')}", "inline": True},
+            {"name": "Last Fill Price", "value": f"${order.get('L')}", "inline": True},
+        ]
+        if float(order.get('rp') or 0):  # PNL data
+            fields.append({"name": "Realized PNL", "value": f"${order.get('rp')}", "inline": True})
+        if fills > 1:
+            fields.append({"name": "Fills", "value": str(fills), "inline": True})
+        if positions is not None:
+            fields.append(cls._position_field(positions.get(order.get('s'))))
+
+        return {
+            "title": f"🚨 New {side} Position: {order.get('s')}",
+            "color": 0x00ff00 if side == "LONG" else 0xff0000,
+            "fields": fields,
+            "timestamp": datetime.fromtimestamp(msg.get('T', 0) / 1000, tz=timezone.utc).isoformat(),
+            "footer": cls.FOOTER,
+        }
+
+    @classmethod
+    async def _worker(cls):
+        while True:
+            items = [await cls._queue.get()]
+            # Let a burst accumulate so it can share webhook calls
+            await asyncio.sleep(settings.DISCORD_BATCH_WAIT)
+            while not cls._queue.empty():
+                items.append(cls._queue.get_nowait())
+
+            for url, embed in items:
+                cls._outbox.setdefault(url, []).append(embed)
+                if url not in cls._senders:
+                    cls._senders[url] = asyncio.create_task(cls._send(url))
+
+    @classmethod
+    async def _send(cls, url: str):
+        """Post everything queued for one webhook, so its rate limit never holds up the others"""
+        try:
+            while cls._outbox.get(url):
+                embeds = cls._outbox.pop(url)
+                for batch in cls._pack(embeds):
+                    try:
+                        await cls._post(url, batch)
+                    except Exception as e:
+                        metrics.DISCORD_ERRORS.inc('exception')
+                        logger.error(f"Error sending Discord notification: {e}")
+                for _ in embeds:
+                    cls._queue.task_done()
+        finally:
+            cls._senders.pop(url, None)
+
+    @classmethod
+    def _pack(cls, embeds: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Group embeds into messages within Discord's count and size limits"""
+        batches: List[List[Dict[str, Any]]] = []
+        size = 0
+        for embed in embeds:
+            embed_size = len(json.dumps(embed, ensure_ascii=False))
+            if not batches or len(batches[-1]) >= cls.MAX_EMBEDS or size + embed_size > cls.MAX_EMBED_CHARS:
+                batches.append([])
+                size = 0
+            batches[-1].append(embed)
+            size += embed_size
+        return batches
+
+    @classmethod
+    async def _post(cls, url: str, embeds: List[Dict[str, Any]], attempts: int = 5):
+        for _ in range(attempts):
+            wait = cls._bucket_reset_at.get(url, 0.0) - time.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            started = time.perf_counter()
+            async with cls._session.post(url, json={"embeds": embeds}) as response:
+                metrics.DISCORD_REQUEST_SECONDS.observe(time.perf_counter() - started)
+                if response.headers.get('X-RateLimit-Remaining') == '0':
+                    reset_after = float(response.headers.get('X-RateLimit-Reset-After', 1))
+                    cls._bucket_reset_at[url] = time.time() + reset_after
+
+                if response.status == 429:
+                    retry_after = response.headers.get('Retry-After')
+                    if retry_after is None:
+                        body = await response.json(content_type=None)
+                        retry_after = body.get('retry_after', 1)
+                    cls._bucket_reset_at[url] = time.time() + float(retry_after)
+                    metrics.DISCORD_ERRORS.inc('rate_limited')
+                    logger.warning(f"Discord rate limited, retrying in {float(retry_after):.2f}s")
+                    continue
+
+                if response.status >= 400:
+                    metrics.DISCORD_ERRORS.inc(str(response.status))
+                    logger.error(f"Discord webhook failed ({response.status}): {await response.text()}")
+                    return
+
+                cls.sent += len(embeds)
+                logger.info(f"Discord notification sent ({len(embeds)} embeds)")
+                return
+        logger.error(f"Giving up on {len(embeds)} Discord embeds after {attempts} rate limited attempts")
+
+
+metrics.CallbackMetric('b2d_discord_queue_depth', 'Embeds waiting to be posted', 'gauge', DiscordNotifier.queue_depth)
+metrics.CallbackMetric('b2d_discord_embeds_sent_total', 'Embeds delivered to Discord', 'counter', lambda: DiscordNotifier.sent)
+metrics.CallbackMetric('b2d_discord_dropped_total', 'Embeds dropped by a full queue', 'counter', lambda: DiscordNotifier.dropped)
@@ -0,0 +1,298 @@
+"""
+Incremental (streaming) technical indicators.
+
+Every indicator keeps O(1) state per (symbol, interval) and is advanced once per
+closed kline. The in-progress kline is never committed; reads combine the
+committed state with the current partial bar via ``peek`` so that values match
+what a full recomputation over "closed bars + current bar" would return.
+
+The formulas mirror the ``ta`` package used previously:
+
+* EMA:   ``ewm(span=n, adjust=False, min_periods=n)`` seeded with the first close
+* RSI:   Wilder smoothing, ``ewm(alpha=1/n, adjust=False)`` over up/down moves,
+         seeded with 0 for the first bar (``diff().where(...)`` turns NaN into 0)
+* MACD:  EMA(12) - EMA(26), signal EMA(9) over the defined MACD values
+* VWAP:  rolling 14-bar sum of typical price * volume / rolling volume
+
+Tolerance: fed the same kline window as ``ta`` the values agree to within
+1e-9 relative error (floating point summation order only). With a longer
+history than ``ta``'s 100-bar REST window the EMAs here are better converged;
+the residual difference is bounded by the seed weight left in ``ta``'s window,
+e.g. (1 - 2/51) ** 100 ~= 1.8% of the seed gap for EMA(50) and
+(13/14) ** 100 ~= 0.06% for RSI(14).
+"""
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Sequence, Tuple
+
+INTERVAL_MS: Dict[str, int] = {
+    '1m': 60_000,
+    '3m': 3 * 60_000,
+    '5m': 5 * 60_000,
+    '15m': 15 * 60_000,
+    '30m': 30 * 60_000,
+    '1h': 60 * 60_000,
+    '2h': 2 * 60 * 60_000,
+    '4h': 4 * 60 * 60_000,
+    '6h': 6 * 60 * 60_000,
+    '8h': 8 * 60 * 60_000,
+    '12h': 12 * 60 * 60_000,
+    '1d': 24 * 60 * 60_000,
+}
+
+
+class EMA:
+    """Exponential moving average, ``adjust=False`` semantics"""
+    __slots__ = ('window', 'alpha', 'value', 'count')
+
+    def __init__(self, window: int, alpha: Optional[float] = None):
+        self.window = window
+        self.alpha = alpha if alpha is not None else 2.0 / (window + 1)
+        self.value: Optional[float] = None
+        self.count = 0
+
+    def _next(self, x: float) -> float:
+        if self.value is None:
+            return x
+        return (1.0 - self.alpha) * self.value + self.alpha * x
+
+    def update(self, x: float):
+        self.value = self._next(x)
+        self.count += 1
+
+    def peek(self, x: float) -> Optional[float]:
+        """Value if ``x`` were the next observation, without committing it"""
+        if self.count + 1 < self.window:
+            return None
+        return self._next(x)
+
+    @property
+    def current(self) -> Optional[float]:
+        return self.value if self.count >= self.window else None
+
+
+class RSI:
+    """Relative strength index with Wilder smoothing"""
+    __slots__ = ('window', 'prev_close', 'up', 'down')
+
+    def __init__(self, window: int = 14):
+        self.window = window
+        self.prev_close: Optional[float] = None
+        self.up = EMA(window, alpha=1.0 / window)
+        self.down = EMA(window, alpha=1.0 / window)
+
+    def _moves(self, close: float) -> Tuple[float, float]:
+        if self.prev_close is None:
+            return 0.0, 0.0
+        diff = close - self.prev_close
+        return max(diff, 0.0), max(-diff, 0.0)
+
+    @staticmethod
+    def _value(up: Optional[float], down: Optional[float]) -> Optional[float]:
+        if up is None or down is None:
+            return None
+        if down == 0:
+            return 100.0
+        return 100.0 - 100.0 / (1.0 + up / down)
+
+    def update(self, close: float):
+        up, down = self._moves(close)
+        self.up.update(up)
+        self.down.update(down)
+        self.prev_close = close
+
+    def peek(self, close: float) -> Optional[float]:
+        up, down = self._moves(close)
+        return self._value(self.up.peek(up), self.down.peek(down))
+
+    @property
+    def current(self) -> Optional[float]:
+        return self._value(self.up.current, self.down.current)
+
+
+class MACD:
+    """MACD line and signal line"""
+    __slots__ = ('fast', 'slow', 'signal')
+
+    def __init__(self, window_fast: int = 12, window_slow: int = 26, window_sign: int = 9):
+        self.fast = EMA(window_fast)
+        self.slow = EMA(window_slow)
+        self.signal = EMA(window_sign)
+
+    def update(self, close: float):
+        self.fast.update(close)
+        self.slow.update(close)
+        fast, slow = self.fast.current, self.slow.current
+        if fast is not None and slow is not None:
+            self.signal.update(fast - slow)
+
+    def peek(self, close: float) -> Tuple[Optional[float], Optional[float]]:
+        fast, slow = self.fast.peek(close), self.slow.peek(close)
+        if fast is None or slow is None:
+            return None, None
+        macd = fast - slow
+        return macd, self.signal.peek(macd)
+
+    @property
+    def current(self) -> Tuple[Optional[float], Optional[float]]:
+        fast, slow = self.fast.current, self.slow.current
+        if fast is None or slow is None:
+            return None, None
+        return fast - slow, self.signal.current
+
+
+class RollingVWAP:
+    """Rolling-window volume weighted average price over typical price"""
+    __slots__ = ('window', 'bars', 'sum_pv', 'sum_volume')
+
+    def __init__(self, window: int = 14):
+        self.window = window
+        self.bars: Deque[Tuple[float, float]] = deque(maxlen=window)
+        self.sum_pv = 0.0
+        self.sum_volume = 0.0
+
+    def update(self, high: float, low: float, close: float, volume: float):
+        if len(self.bars) == self.window:
+            old_pv, old_volume = self.bars[0]
+            self.sum_pv -= old_pv
+            self.sum_volume -= old_volume
+        pv = (high + low + close) / 3.0 * volume
+        self.bars.append((pv, volume))
+        self.sum_pv += pv
+        self.sum_volume += volume
+
+    def peek(self, high: float, low: float, close: float, volume: float) -> Optional[float]:
+        if len(self.bars) + 1 < self.window:
+            return None
+        sum_pv = self.sum_pv + (high + low + close) / 3.0 * volume
+        sum_volume = self.sum_volume + volume
+        if len(self.bars) == self.window:
+            old_pv, old_volume = self.bars[0]
+            sum_pv -= old_pv
+            sum_volume -= old_volume
+        return sum_pv / sum_volume if sum_volume else None
+
+    @property
+    def current(self) -> Optional[float]:
+        if len(self.bars) < self.window or not self.sum_volume:
+            return None
+        return self.sum_pv / self.sum_volume
+
+
+class IndicatorSet:
+    """All indicators for one (symbol, interval), plus the in-progress bar"""
+
+    def __init__(self):
+        self.rsi = RSI(14)
+        self.macd = MACD()
+        self.ema_20 = EMA(20)
+        self.ema_50 = EMA(50)
+        self.vwap = RollingVWAP(14)
+        self.last_open_time: Optional[int] = None
+        self.last_volume: Optional[float] = None
+        # (open_time, high, low, close, volume) of the bar that has not closed yet
+        self.pending: Optional[Tuple[int, float, float, float, float]] = None
+        self.updated_at: Optional[float] = None
+
+    def commit(self, open_time: int, high: float, low: float, close: float, volume: float):
+        """Advance all indicators with a closed bar"""
+        if self.last_open_time is not None and open_time <= self.last_open_time:
+            return
+        self.rsi.update(close)
+        self.macd.update(close)
+        self.ema_20.update(close)
+        self.ema_50.update(close)
+        self.vwap.update(high, low, close, volume)
+        self.last_open_time = open_time
+        self.last_volume = volume
+        if self.pending and self.pending[0] <= open_time:
+            self.pending = None
+
+    def set_pending(self, open_time: int, high: float, low: float, close: float, volume: float):
+        """Record the in-progress bar, committing a previous one that never got its close event"""
+        if self.last_open_time is not None and open_time <= self.last_open_time:
+            return
+        if self.pending and self.pending[0] < open_time:
+            self.commit(*self.pending)
+        self.pending = (open_time, high, low, close, volume)
+
+    def snapshot(self) -> Dict[str, Optional[float]]:
+        """Indicator values including the in-progress bar"""
+        if self.pending:
+            _, high, low, close, volume = self.pending
+            macd, macd_signal = self.macd.peek(close)
+            return {
+                'rsi': self.rsi.peek(close),
+                'macd': macd,
+                'macd_signal': macd_signal,
+                'ema_20': self.ema_20.peek(close),
+                'ema_50': self.ema_50.peek(close),
+                'volume': volume,
+                'vwap': self.vwap.peek(high, low, close, volume),
+            }
+        macd, macd_signal = self.macd.current
+        return {
+            'rsi': self.rsi.current,
+            'macd': macd,
+            'macd_signal': macd_signal,
+            'ema_20': self.ema_20.current,
+            'ema_50': self.ema_50.current,
+            'volume': self.last_volume,
+            'vwap': self.vwap.current,
+        }
+
+
+class IndicatorEngine:
+    """Per (symbol, interval) incremental indicator state, fed by klines"""
+    _states: Dict[Tuple[str, str], IndicatorSet] = {}
+
+    @classmethod
+    def warmup(cls, symbol: str, interval: str, bars: Sequence[Sequence[float]], now_ms: int):
+        """
+        Rebuild state from OHLCV rows ``(open_time, open, high, low, close, volume)``
+        in time order. A bar whose interval has not elapsed yet is treated as the
+        in-progress bar.
+        """
+        state = IndicatorSet()
+        interval_ms = INTERVAL_MS[interval]
+        for row in bars:
+            bar = (int(row[0]), float(row[2]), float(row[3]), float(row[4]), float(row[5]))
+            if bar[0] + interval_ms <= now_ms:
+                state.commit(*bar)
+            else:
+                state.set_pending(*bar)
+        state.updated_at = now_ms / 1000
+        cls._states[(symbol.upper(), interval)] = state
+
+    @classmethod
+    def on_kline(cls, symbol: str, kline: Dict[str, Any], received_at: float):
+        """Apply a websocket ``kline`` payload (the ``k`` object)"""
+        state = cls._states.get((symbol.upper(), kline['i']))
+        if state is None:
+            # Not warmed up yet; a partial history would give wrong values
+            return
+        bar = (int(kline['t']), float(kline['h']), float(kline['l']), float(kline['c']), float(kline['v']))
+        if kline.get('x'):
+            state.commit(*bar)
+        else:
+            state.set_pending(*bar)
+        state.updated_at = received_at
+
+    @classmethod
+    def has_state(cls, symbol: str, interval: str) -> bool:
+        return (symbol.upper(), interval) in cls._states
+
+    @classmethod
+    def is_fresh(cls, symbol: str, interval: str, now: float, max_age: float) -> bool:
+        state = cls._states.get((symbol.upper(), interval))
+        return state is not None and state.updated_at is not None and now - state.updated_at <= max_age
+
+    @classmethod
+    def get_indicators(cls, symbol: str, interval: str) -> Optional[Dict[str, Optional[float]]]:
+        state = cls._states.get((symbol.upper(), interval))
+        return state.snapshot() if state else None
+
+    @classmethod
+    def live_rsi(cls, symbol: str, interval: str, price: float) -> Optional[float]:
+        """RSI with ``price`` as the close of the current bar; O(1), cheap enough per trade"""
+        state = cls._states.get((symbol, interval))
+        return state.rsi.peek(price) if state else None
@@ -0,0 +1,138 @@
+import os
+import numpy as np
+from loguru import logger
+from app.core.config import settings
+from app.services.indicators import INTERVAL_MS
+from app.services.symbols import normalize
+from typing import Any, Dict, List, Optional, Tuple
+
+# Column layout of every buffer row
+OPEN_TIME, OPEN, HIGH, LOW, CLOSE, VOLUME = range(6)
+COLUMNS = ('open_time', 'open', 'high', 'low', 'close', 'volume')
+
+
+class KlineBuffer:
+    """
+    Fixed-capacity OHLCV ring buffer for one (symbol, interval).
+
+    A bar lives in slot ``(open_time // interval_ms) % capacity``, so updates to
+    the in-progress bar overwrite it in place, gaps are visible as slots whose
+    stored open time does not match, and no head pointer has to be persisted.
+    When ``path`` is given the buffer is a memory-mapped ``.npy`` file.
+    """
+
+    def __init__(self, symbol: str, interval: str, capacity: int, path: Optional[str] = None):
+        self.symbol = symbol
+        self.interval = interval
+        self.interval_ms = INTERVAL_MS[interval]
+        self.capacity = capacity
+        self.path = path
+        self.data = self._open(path, capacity)
+        stored = self.data[:, OPEN_TIME]
+        self.latest_open_time = int(stored.max()) if stored.any() else 0
+
+    @staticmethod
+    def _open(path: Optional[str], capacity: int) -> np.ndarray:
+        shape = (capacity, len(COLUMNS))
+        if path is None:
+            return np.zeros(shape, dtype=np.float64)
+        if os.path.exists(path):
+            try:
+                data = np.lib.format.open_memmap(path, mode='r+')
+                if data.shape == shape and data.dtype == np.float64:
+                    return data
+                logger.warning(f"Discarding kline buffer {path} with shape {data.shape}")
+            except ValueError as e:
+                logger.warning(f"Discarding unreadable kline buffer {path}: {e}")
+        return np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=shape)
+
+    def upsert(self, open_time: int, open_: float, high: float, low: float, close: float, volume: float):
+        """Insert a bar or overwrite the in-progress bar with the same open time"""
+        self.data[(open_time // self.interval_ms) % self.capacity] = (open_time, open_, high, low, close, volume)
+        if open_time > self.latest_open_time:
+            self.latest_open_time = open_time
+
+    def upsert_rest(self, klines: List[List[Any]]):
+        """Insert ``futures_klines`` rows"""
+        for row in klines:
+            self.upsert(int(row[0]), float(row[1]), float(row[2]), float(row[3]), float(row[4]), float(row[5]))
+
+    def _expected_times(self, latest: int, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        times = latest - np.arange(n - 1, -1, -1, dtype=np.int64) * self.interval_ms
+        return times, (times // self.interval_ms) % self.capacity
+
+    def last(self, n: Optional[int] = None) -> np.ndarray:
+        """Up to ``n`` most recent bars in time order (a copy); missing bars are skipped"""
+        if not self.latest_open_time:
+            return np.empty((0, len(COLUMNS)), dtype=np.float64)
+        n = min(n or self.capacity, self.capacity)
+        times, slots = self._expected_times(self.latest_open_time, n)
+        rows = self.data[slots]
+        return rows[rows[:, OPEN_TIME] == times]
+
+    def backfill_start(self, now_ms: int) -> int:
+        """
+        Open time from which REST data is needed to make the window ending at
+        ``now_ms`` complete. The current bar is always refetched because a
+        persisted copy may have been written before it closed.
+        """
+        current = now_ms - now_ms % self.interval_ms
+        times, slots = self._expected_times(current, self.capacity)
+        missing = self.data[slots, OPEN_TIME] != times
+        missing[-1] = True
+        # Refetch from the newest stored bar onwards, plus anything older that is missing
+        missing[times >= self.latest_open_time] = True
+        return int(times[np.argmax(missing)])
+
+    def flush(self):
+        if isinstance(self.data, np.memmap):
+            self.data.flush()
+
+
+class KlineStore:
+    """Per (symbol, interval) kline buffers, persisted under ``DATA_DIR/klines``"""
+    _buffers: Dict[Tuple[str, str], KlineBuffer] = {}
+
+    @classmethod
+    def _path(cls, symbol: str, interval: str) -> str:
+        # Both end up in a file name
+        symbol = normalize(symbol)
+        if interval not in INTERVAL_MS:
+            raise ValueError(f"Unsupported interval {interval!r}")
+        directory = os.path.join(settings.DATA_DIR, 'klines')
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f"{symbol}_{interval}.npy")
+
+    @classmethod
+    def get_buffer(cls, symbol: str, interval: str) -> KlineBuffer:
+        symbol = symbol.upper()
+        key = (symbol, interval)
+        if key not in cls._buffers:
+            cls._buffers[key] = KlineBuffer(
+                symbol, interval, settings.KLINE_BUFFER_CAPACITY, cls._path(symbol, interval)
+            )
+        return cls._buffers[key]
+
+    @classmethod
+    def on_kline(cls, symbol: str, kline: Dict[str, Any]):
+        """Apply a websocket ``kline`` payload (the ``k`` object)"""
+        cls.get_buffer(symbol, kline['i']).upsert(
+            int(kline['t']), float(kline['o']), float(kline['h']),
+            float(kline['l']), float(kline['c']), float(kline['v'])
+        )
+
+    @classmethod
+    async def backfill(cls, client, symbol: str, interval: str, now_ms: int) -> KlineBuffer:
+        """Fetch only the bars missing from the buffer over REST"""
+        buffer = cls.get_buffer(symbol, interval)
+        start = buffer.backfill_start(now_ms)
+        limit = (now_ms - start) // buffer.interval_ms + 1
+        klines = await client.futures_klines(symbol=symbol, interval=interval, startTime=start, limit=min(limit, 1500))
+        buffer.upsert_rest(klines)
+        logger.debug(f"Backfilled {len(klines)} {interval} klines for {symbol}")
+        return buffer
+
+    @classmethod
+    def flush_all(cls):
+        for buffer in cls._buffers.values():
+            buffer.flush()
@@ -0,0 +1,205 @@
+import asyncio
+import time
+from loguru import logger
+from app.core.config import settings
+from app.services.binance_rest import BinanceRestClient
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+
+class Position:
+    """One open position, valued at the latest mark price"""
+    __slots__ = (
+        'symbol', 'side', 'amount', 'entry_price', 'break_even_price', 'leverage', 'margin_type',
+        'isolated_wallet', 'liquidation_price', 'mark_price', 'unrealized_pnl', 'liquidation_stale', 'updated_at',
+    )
+
+    def __init__(self, symbol: str, side: str):
+        self.symbol = symbol
+        self.side = side
+        self.amount = 0.0
+        self.entry_price = 0.0
+        self.break_even_price: Optional[float] = None
+        self.leverage: Optional[float] = None
+        self.margin_type: Optional[str] = None
+        self.isolated_wallet: Optional[float] = None
+        self.liquidation_price: Optional[float] = None
+        self.mark_price: Optional[float] = None
+        self.unrealized_pnl = 0.0
+        # Liquidation price is computed by Binance; it is stale after a size change until the next reconcile
+        self.liquidation_stale = False
+        self.updated_at = 0.0
+
+    def mark(self, price: float):
+        self.mark_price = price
+        self.unrealized_pnl = self.amount * (price - self.entry_price)
+
+    @property
+    def liquidation_distance(self) -> Optional[float]:
+        """Fraction the mark price can move against the position before liquidation"""
+        if not self.liquidation_price or not self.mark_price:
+            return None
+        if self.amount > 0:
+            return (self.mark_price - self.liquidation_price) / self.mark_price
+        return (self.liquidation_price - self.mark_price) / self.mark_price
+
+    def as_dict(self) -> Dict[str, Any]:
+        notional = abs(self.amount) * self.mark_price if self.mark_price else None
+        return {
+            'symbol': self.symbol,
+            'position_side': self.side,
+            'amount': self.amount,
+            'entry_price': self.entry_price,
+            'break_even_price': self.break_even_price,
+            'mark_price': self.mark_price,
+            'notional': notional,
+            'unrealized_pnl': self.unrealized_pnl,
+            'leverage': self.leverage,
+            'margin_type': self.margin_type,
+            'isolated_wallet': self.isolated_wallet,
+            'liquidation_price': self.liquidation_price,
+            'liquidation_distance': self.liquidation_distance,
+            'liquidation_stale': self.liquidation_stale,
+            'updated_at': self.updated_at,
+        }
+
+
+class PositionBook:
+    """
+    Open positions kept in memory from ``ACCOUNT_UPDATE`` events and valued
+    continuously from the mark price stream.
+
+    Amount and entry price come from events as they happen. Leverage and
+    liquidation price are only known server-side, so a size change (or a
+    position we have not seen before) marks the book dirty and triggers a
+    debounced ``positionRisk`` reconcile, as ``AccountSnapshot`` does.
+    """
+    _default: Optional['PositionBook'] = None
+
+    def __init__(self, client: BinanceRestClient):
+        self.client = client
+        self.positions: Dict[Tuple[str, str], Position] = {}
+        self.synced_at = 0.0
+        self.dirty = False
+        # Called with the set of symbols holding a position whenever it changes
+        self.on_symbols_changed: Optional[Callable[[Set[str]], None]] = None
+        self._symbols: Set[str] = set()
+        self._resync = asyncio.Event()
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def default(cls) -> 'PositionBook':
+        if not cls._default:
+            cls._default = cls(BinanceRestClient.default())
+        return cls._default
+
+    def _notify(self):
+        symbols = {symbol for symbol, _ in self.positions}
+        if symbols != self._symbols:
+            self._symbols = symbols
+            if self.on_symbols_changed:
+                self.on_symbols_changed(symbols)
+
+    def _mark_dirty(self):
+        self.dirty = True
+        self._resync.set()
+
+    def invalidate(self):
+        """Schedule a reconcile, e.g. after user-data events may have been missed"""
+        self._mark_dirty()
+
+    async def reconcile(self):
+        """Replace the book with ``positionRisk``, keeping mark prices already streamed"""
+        async with self._lock:
+            self.dirty = False
+            self._resync.clear()
+            rows = await self.client.futures_position_information()
+            positions: Dict[Tuple[str, str], Position] = {}
+            now = time.time()
+            for row in rows:
+                amount = float(row['positionAmt'])
+                if amount == 0:
+                    continue
+                key = (row['symbol'], row.get('positionSide', 'BOTH'))
+                position = Position(*key)
+                position.amount = amount
+                position.entry_price = float(row['entryPrice'])
+                position.break_even_price = float(row['breakEvenPrice']) if row.get('breakEvenPrice') else None
+                position.leverage = float(row['leverage'])
+                position.margin_type = row.get('marginType')
+                position.isolated_wallet = float(row.get('isolatedWallet') or 0)
+                position.liquidation_price = float(row['liquidationPrice'])
+                previous = self.positions.get(key)
+                mark_price = previous.mark_price if previous and previous.mark_price else float(row['markPrice'])
+                position.mark(mark_price)
+                position.updated_at = now
+                positions[key] = position
+            self.positions = positions
+            self.synced_at = now
+            self._notify()
+            logger.debug(f"Position book reconciled ({len(positions)} open)")
+
+    async def maintain(self):
+        """Reconcile when events left the book dirty, and at least every ACCOUNT_RESYNC_INTERVAL"""
+        while True:
+            try:
+                await asyncio.wait_for(self._resync.wait(), timeout=settings.ACCOUNT_RESYNC_INTERVAL)
+                # Debounce bursts of fills into one request
+                await asyncio.sleep(1)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"Error reconciling positions: {e}")
+
+    def apply_account_update(self, msg: Dict[str, Any]):
+        """Apply the position part of an ``ACCOUNT_UPDATE`` event"""
+        now = time.time()
+        for update in msg.get('a', {}).get('P', []):
+            key = (update['s'], update.get('ps', 'BOTH'))
+            amount = float(update['pa'])
+            if amount == 0:
+                self.positions.pop(key, None)
+                continue
+            position = self.positions.get(key)
+            if position is None:
+                position = self.positions[key] = Position(*key)
+                self._mark_dirty()
+            if amount != position.amount:
+                position.liquidation_stale = True
+                self._mark_dirty()
+            position.amount = amount
+            position.entry_price = float(update['ep'])
+            if 'bep' in update:
+                position.break_even_price = float(update['bep'])
+            position.margin_type = update.get('mt', position.margin_type)
+            if 'iw' in update:
+                position.isolated_wallet = float(update['iw'])
+            if position.mark_price:
+                position.mark(position.mark_price)
+            else:
+                position.unrealized_pnl = float(update['up'])
+            position.updated_at = now
+        self._notify()
+
+    def on_mark_price(self, symbol: str, price: float):
+        for side in ('BOTH', 'LONG', 'SHORT'):
+            position = self.positions.get((symbol, side))
+            if position is not None:
+                position.mark(price)
+
+    def get(self, symbol: str) -> Optional[Position]:
+        """The symbol's open position (one-way mode), or its larger side in hedge mode"""
+        candidates = [p for (s, _), p in self.positions.items() if s == symbol]
+        return max(candidates, key=lambda p: abs(p.amount)) if candidates else None
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [p.as_dict() for _, p in sorted(self.positions.items())]
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'open': len(self.positions),
+            'synced_at': self.synced_at or None,
+            'dirty': self.dirty,
+            'total_unrealized_pnl': sum(p.unrealized_pnl for p in self.positions.values()),
+        }
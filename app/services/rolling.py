@@ -0,0 +1,117 @@
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+
+class MonotonicWindow:
+    """
+    Minimum and maximum of the values pushed within the last ``span`` (in the
+    unit of the timestamps), in O(1) amortized time per push. Each deque only
+    keeps values that can still become the extreme once older ones expire.
+    """
+    __slots__ = ('span', '_min', '_max')
+
+    def __init__(self, span: float):
+        self.span = span
+        self._min: Deque[Tuple[float, float]] = deque()
+        self._max: Deque[Tuple[float, float]] = deque()
+
+    def push(self, ts: float, value: float):
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((ts, value))
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((ts, value))
+        self.expire(ts)
+
+    def expire(self, now: float):
+        cutoff = now - self.span
+        while self._min and self._min[0][0] < cutoff:
+            self._min.popleft()
+        while self._max and self._max[0][0] < cutoff:
+            self._max.popleft()
+
+    @property
+    def min(self) -> Optional[float]:
+        return self._min[0][1] if self._min else None
+
+    @property
+    def max(self) -> Optional[float]:
+        return self._max[0][1] if self._max else None
+
+
+class RollingStats:
+    """
+    Open, high, low, last, VWAP, trade count and volume of the trades in the
+    last ``span`` ms, in O(1) amortized time per trade.
+
+    Sums and the open are kept in ``BUCKETS`` time buckets, so a trade leaves
+    the window within ``span / BUCKETS`` of its age passing ``span``; high and
+    low come from monotonic deques trimmed to the same trades. Nothing is
+    rescanned on read.
+    """
+    BUCKETS = 180
+    __slots__ = ('span', 'resolution', 'extremes', '_buckets', 'volume', 'notional', 'count', 'last')
+
+    def __init__(self, span: int):
+        self.span = span
+        self.resolution = max(span // self.BUCKETS, 1)
+        self.extremes = MonotonicWindow(span + self.resolution)
+        # [bucket start, first price, volume, price * volume, trades]
+        self._buckets: Deque[list] = deque()
+        self.volume = 0.0
+        self.notional = 0.0
+        self.count = 0
+        self.last: Optional[float] = None
+
+    def push(self, ts: int, price: float, quantity: float):
+        self.extremes.push(ts, price)
+        start = ts - ts % self.resolution
+        if self._buckets and start <= self._buckets[-1][0]:
+            # Same bucket, or a late trade that is added to the newest one
+            bucket = self._buckets[-1]
+            bucket[2] += quantity
+            bucket[3] += price * quantity
+            bucket[4] += 1
+        else:
+            self._buckets.append([start, price, quantity, price * quantity, 1])
+        self.volume += quantity
+        self.notional += price * quantity
+        self.count += 1
+        self.last = price
+        self.expire(ts)
+
+    def expire(self, now: int):
+        cutoff = now - self.span
+        while self._buckets and self._buckets[0][0] + self.resolution <= cutoff:
+            _, _, volume, notional, count = self._buckets.popleft()
+            self.volume -= volume
+            self.notional -= notional
+            self.count -= count
+        if self._buckets:
+            # Drop extremes older than the oldest bucket still counted
+            self.extremes.expire(self._buckets[0][0] + self.extremes.span)
+        else:
+            # Also clears the drift left by subtracting floats
+            self.volume = self.notional = 0.0
+            self.count = 0
+            self.extremes.expire(now)
+
+    def snapshot(self, now: int) -> Dict[str, Optional[float]]:
+        self.expire(now)
+        if not self._buckets:
+            return {
+                'open': None, 'high': None, 'low': None, 'last': self.last,
+                'change_pct': None, 'vwap': None, 'count': 0, 'volume': 0.0,
+            }
+        open_ = self._buckets[0][1]
+        return {
+            'open': open_,
+            'high': self.extremes.max,
+            'low': self.extremes.min,
+            'last': self.last,
+            'change_pct': (self.last / open_ - 1.0) * 100.0 if open_ else None,
+            'vwap': self.notional / self.volume if self.volume > 0 else None,
+            'count': self.count,
+            'volume': self.volume,
+        }
@@ -0,0 +1,183 @@
+"""
+Memory-mapped segment through which the stream leader publishes prices and
+account state to the other workers (see ``app.websocket.leader``).
+
+Layout: a header, then two slots the single writer fills alternately. Each
+publish goes to the slot readers are not pointed at, bracketed by the slot's
+sequence number (odd while it is being written), and then the header is
+switched over to it. Readers check the sequence before and after a read and
+retry on a mismatch, so nobody ever locks.
+
+A slot holds a table of prices, read in place through a numpy view, and
+named JSON sections. Each section carries a version that only changes with
+its content, so readers decode a section again only after it changed.
+"""
+import json
+import mmap
+import os
+import struct
+import time
+import numpy as np
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+MAGIC = b'B2DS'
+# magic, layout version, active slot, slot bytes, publish count, leader pid, heartbeat (unix time)
+HEADER = struct.Struct('<4sIIIQQd')
+HEADER_BYTES = 64
+# sequence, price rows, sections
+SLOT_HEADER = struct.Struct('<QII')
+PRICE_DTYPE = np.dtype([('symbol', 'S24'), ('price', '<f8'), ('previous', '<f8')])
+SECTION_DTYPE = np.dtype([('name', 'S48'), ('version', '<u8'), ('offset', '<u4'), ('length', '<u4')])
+READ_ATTEMPTS = 100
+
+
+class SharedSnapshot:
+    """One consistent view of the segment; ``valid()`` tells whether it still is"""
+
+    def __init__(self, state: 'SharedState', publishes: int, pid: int, heartbeat: float, base: int, seq: int,
+                 prices: np.ndarray, sections: np.ndarray):
+        self.state = state
+        self.publishes = publishes
+        self.pid = pid
+        self.heartbeat = heartbeat
+        self._base = base
+        self._seq = seq
+        # Zero-copy view of the slot; only meaningful while valid()
+        self.prices = prices
+        self._sections = {row['name'].decode(): row for row in sections}
+
+    def valid(self) -> bool:
+        return SLOT_HEADER.unpack_from(self.state.buf, self._base)[0] == self._seq
+
+    def age(self) -> float:
+        return time.time() - self.heartbeat
+
+    def sections(self) -> List[str]:
+        return list(self._sections)
+
+    def version(self, name: str) -> Optional[Tuple[int, int]]:
+        """Changes whenever the section's content (or the leader) changes"""
+        row = self._sections.get(name)
+        return None if row is None else (self.pid, int(row['version']))
+
+    def price_rows(self) -> List[Tuple[str, Optional[float], Optional[float]]]:
+        return [
+            (row['symbol'].decode(), None if np.isnan(row['price']) else float(row['price']),
+             None if np.isnan(row['previous']) else float(row['previous']))
+            for row in self.prices
+        ]
+
+    def section(self, name: str) -> Any:
+        row = self._sections.get(name)
+        if row is None:
+            return None
+        version = self.version(name)
+        cached = self.state._decoded.get(name)
+        if cached and cached[0] == version:
+            return cached[1]
+        start = self._base + int(row['offset'])
+        data = bytes(self.state.buf[start:start + int(row['length'])])
+        if not self.valid():
+            raise BufferError("Slot rewritten while reading")
+        doc = json.loads(data)
+        self.state._decoded[name] = (version, doc)
+        return doc
+
+
+class SharedState:
+    """Writer (the leader) or reader (the other workers) of the segment at ``path``"""
+
+    def __init__(self, path: str, size: int):
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self.size = os.fstat(fd).st_size
+            self._mmap = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+        self.buf = memoryview(self._mmap)
+        self.path = path
+        # Writer: encoded content and version per section
+        self._written: Dict[str, Tuple[bytes, int]] = {}
+        # Reader: ((leader pid, version), decoded) per section
+        self._decoded: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+
+    def publish(self, prices: Iterable[Tuple[str, Optional[float], Optional[float]]],
+                sections: Dict[str, Union[bytes, Any]]):
+        """Write a full update; sections may be given already JSON-encoded"""
+        magic, _, active, _, publishes, _, _ = HEADER.unpack_from(self.buf, 0)
+        slot = 1 - active if magic == MAGIC else 0
+        slot_bytes = (self.size - HEADER_BYTES) // 2
+        base = HEADER_BYTES + slot * slot_bytes
+
+        rows = np.array([(s.encode(), np.nan if p is None else p, np.nan if q is None else q) for s, p, q in prices],
+                        dtype=PRICE_DTYPE)
+        blobs = []
+        for name, doc in sections.items():
+            data = doc if isinstance(doc, bytes) else json.dumps(doc, default=str, separators=(',', ':')).encode()
+            previous = self._written.get(name)
+            version = previous[1] if previous and previous[0] == data else (previous[1] + 1 if previous else 1)
+            self._written[name] = (data, version)
+            blobs.append((name, version, data))
+        prices_at = SLOT_HEADER.size
+        table_at = prices_at + rows.nbytes
+        blobs_at = table_at + len(blobs) * SECTION_DTYPE.itemsize
+        end = blobs_at + sum(len(data) for _, _, data in blobs)
+        if end > slot_bytes:
+            raise ValueError(f"Shared state needs {2 * end + HEADER_BYTES} bytes, SHARED_STATE_BYTES is {self.size}")
+
+        # Even unless a previous leader died mid-write
+        seq = SLOT_HEADER.unpack_from(self.buf, base)[0]
+        seq += seq % 2
+        SLOT_HEADER.pack_into(self.buf, base, seq + 1, len(rows), len(blobs))
+        np.ndarray(len(rows), PRICE_DTYPE, buffer=self.buf, offset=base + prices_at)[:] = rows
+        table = np.ndarray(len(blobs), SECTION_DTYPE, buffer=self.buf, offset=base + table_at)
+        offset = blobs_at
+        for i, (name, version, data) in enumerate(blobs):
+            table[i] = (name.encode(), version, offset, len(data))
+            self.buf[base + offset:base + offset + len(data)] = data
+            offset += len(data)
+        SLOT_HEADER.pack_into(self.buf, base, seq + 2, len(rows), len(blobs))
+        HEADER.pack_into(self.buf, 0, MAGIC, 1, slot, slot_bytes, publishes + 1, os.getpid(), time.time())
+
+    def read(self) -> Optional[SharedSnapshot]:
+        """The latest complete publish, or None before the first one"""
+        for _ in range(READ_ATTEMPTS):
+            magic, _, slot, slot_bytes, publishes, pid, heartbeat = HEADER.unpack_from(self.buf, 0)
+            if magic != MAGIC:
+                return None
+            base = HEADER_BYTES + slot * slot_bytes
+            seq, price_count, section_count = SLOT_HEADER.unpack_from(self.buf, base)
+            if seq % 2:
+                continue
+            prices_at = base + SLOT_HEADER.size
+            prices = np.ndarray(price_count, PRICE_DTYPE, buffer=self.buf, offset=prices_at)
+            sections = np.ndarray(section_count, SECTION_DTYPE, buffer=self.buf,
+                                  offset=prices_at + prices.nbytes).copy()
+            snapshot = SharedSnapshot(self, publishes, pid, heartbeat, base, seq, prices, sections)
+            if snapshot.valid():
+                return snapshot
+        return None
+
+    def section(self, name: str) -> Any:
+        """Decoded section of the latest publish, or None"""
+        for _ in range(READ_ATTEMPTS):
+            snapshot = self.read()
+            if snapshot is None:
+                return None
+            try:
+                return snapshot.section(name)
+            except BufferError:
+                continue
+        return None
+
+    def prices(self) -> List[Tuple[str, Optional[float], Optional[float]]]:
+        for _ in range(READ_ATTEMPTS):
+            snapshot = self.read()
+            if snapshot is None:
+                return []
+            rows = snapshot.price_rows()
+            if snapshot.valid():
+                return rows
+        return []
@@ -0,0 +1,54 @@
+import asyncio
+import re
+import time
+from loguru import logger
+from app.services.binance_rest import BinanceRestClient
+from typing import Iterable, List, Optional, Set
+
+# USD-M futures symbols are upper-case letters and digits, e.g. ETHUSDT or 1000PEPEUSDT
+SYMBOL_PATTERN = re.compile(r'^[A-Z0-9]{2,20}$')
+
+
+def normalize(symbol: str) -> str:
+    """Upper-cased symbol; ValueError unless it is well-formed (it also names files and streams)"""
+    normalized = str(symbol).strip().upper()
+    if not SYMBOL_PATTERN.match(normalized):
+        raise ValueError(f"Invalid symbol {symbol!r}")
+    return normalized
+
+
+class ExchangeSymbols:
+    """Symbols currently trading on USD-M futures, from exchangeInfo"""
+    # Seconds before the listing is fetched again
+    TTL = 3600
+    _symbols: Set[str] = set()
+    _loaded_at = 0.0
+    _lock: Optional[asyncio.Lock] = None
+
+    @classmethod
+    async def listed(cls) -> Set[str]:
+        if time.time() - cls._loaded_at > cls.TTL:
+            if cls._lock is None:
+                cls._lock = asyncio.Lock()
+            async with cls._lock:
+                if time.time() - cls._loaded_at > cls.TTL:
+                    info = await BinanceRestClient.default().futures_exchange_info()
+                    cls._symbols = {s['symbol'] for s in info.get('symbols', []) if s.get('status') == 'TRADING'}
+                    cls._loaded_at = time.time()
+                    logger.debug(f"Loaded {len(cls._symbols)} listed symbols")
+        return cls._symbols
+
+    @classmethod
+    async def validate(cls, symbols: Iterable[str], limit: Optional[int] = None) -> List[str]:
+        """
+        Normalized symbols without duplicates, in the given order. ValueError if
+        any is malformed or not listed, or if there are more than ``limit``
+        """
+        selected = list(dict.fromkeys(normalize(s) for s in symbols if str(s).strip()))
+        if limit is not None and len(selected) > limit:
+            raise ValueError(f"At most {limit} symbols per request")
+        listed = await cls.listed()
+        unknown = [s for s in selected if s not in listed]
+        if unknown:
+            raise ValueError(f"Unknown symbols: {', '.join(unknown)}")
+        return selected
@@ -1,97 +1,105 @@
-import pandas as pd
-import numpy as np
-from ta.momentum import RSIIndicator
-from ta.trend import MACD, EMAIndicator
-from ta.volume import VolumeWeightedAveragePrice
-from binance.client import Client
-from app.core.config import settings
-from typing import Dict, Any
+from app.services.accounts import Account
+from app.services.binance_rest import BinanceRestClient
+from app.services.indicators import IndicatorEngine
+from app.services.kline_store import KlineStore
+from app.services.timeframes import BASE_INTERVAL, TIMEFRAMES
+from typing import Dict, Any, Iterable, Optional
+import asyncio
+import time
 
 class TechnicalAnalyzer:
-    _client = None
+    # Primary timeframe, reported as ``indicators``; ``timeframes`` has all of them
+    INTERVAL = '1h'
+    # The only kline stream subscribed per symbol
+    KLINE_INTERVAL = BASE_INTERVAL
+    TIMEFRAMES = tuple(dict.fromkeys(TIMEFRAMES + (INTERVAL,)))
+    # Indicator state older than this (no kline event seen) is rebuilt from REST
+    MAX_INDICATOR_AGE = 60
     
     @classmethod
-    def _get_client(cls):
-        if not cls._client:
-            cls._client = Client(settings.BINANCE_API_KEY, settings.BINANCE_API_SECRET)
-        return cls._client
+    async def _warmup(cls, client: BinanceRestClient, symbol: str, interval: str, now_ms: int):
+        buffer = await KlineStore.backfill(client, symbol, interval, now_ms)
+        IndicatorEngine.warmup(symbol, interval, buffer.last(), now_ms)
     
     @classmethod
-    async def get_market_data(cls, symbol: str, position_data: Dict[Any, Any]) -> Dict[str, Any]:
+    async def ensure_indicators(cls, symbol: str, timeframes: Optional[Iterable[str]] = None):
         """
-        Get market data including technical indicators and position information
+        Indicators are kept current from the kline stream; only rebuild them
+        (from the kline store, backfilling just the missing bars over REST)
+        for timeframes of this symbol that have no live state yet
+        """
+        now = time.time()
+        stale = [
+            tf for tf in (timeframes or cls.TIMEFRAMES)
+            if not IndicatorEngine.is_fresh(symbol, tf, now, cls.MAX_INDICATOR_AGE)
+        ]
+        if stale:
+            client = BinanceRestClient.default()
+            await asyncio.gather(*(cls._warmup(client, symbol, tf, int(now * 1000)) for tf in stale))
+    
+    @classmethod
+    def get_timeframes(cls, symbol: str, timeframes: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        return {tf: IndicatorEngine.get_indicators(symbol, tf) for tf in (timeframes or cls.TIMEFRAMES)}
+    
+    @classmethod
+    async def get_market_data(cls, symbol: str, position_data: Dict[Any, Any],
+                              account: Optional[Account] = None) -> Dict[str, Any]:
+        """
+        Get market data including technical indicators and the account's position information
         """
         try:
-            client = cls._get_client()
-            
-            # Get klines data for technical analysis
-            klines = client.futures_klines(symbol=symbol, interval='1h', limit=100)
-            df = pd.DataFrame(klines, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 
-                                             'close_time', 'quote_volume', 'trades', 'taker_buy_base', 
-                                             'taker_buy_quote', 'ignore'])
-            
-            df['close'] = pd.to_numeric(df['close'])
-            df['volume'] = pd.to_numeric(df['volume'])
-            
-            # Calculate indicators
-            rsi = RSIIndicator(close=df['close'], window=14)
-            macd = MACD(close=df['close'])
-            ema20 = EMAIndicator(close=df['close'], window=20)
-            ema50 = EMAIndicator(close=df['close'], window=50)
-            vwap = VolumeWeightedAveragePrice(high=pd.to_numeric(df['high']), 
-                                             low=pd.to_numeric(df['low']), 
-                                             close=df['close'], 
-                                             volume=df['volume'])
-            
-            # Get position information
-            position_info = client.futures_position_information(symbol=symbol)
-            position = next((p for p in position_info if float(p['positionAmt']) != 0), None)
+            await cls.ensure_indicators(symbol)
+            timeframes = cls.get_timeframes(symbol)
             
+            # Position information from the in-memory book; no REST call per trade
+            account = account or Account.default()
+            position = account.positions.get(symbol)
             if not position:
-                position = {
-                    'leverage': '1',
-                    'liquidationPrice': '0',
-                    'marginType': 'isolated',
-                    'initialMargin': '0',
-                    'maintMargin': '0',
-                    'unrealizedProfit': '0'
+                return {
+                    'leverage': None,
+                    'liquidation_price': None,
+                    'liquidation_distance': None,
+                    'margin_type': None,
+                    'mark_price': None,
+                    'initial_margin': 0,
+                    'maintenance_margin': 0,
+                    'unrealized_pnl': 0,
+                    'indicators': timeframes[cls.INTERVAL],
+                    'timeframes': timeframes
                 }
             
+            # Margins are only tracked by the account snapshot
+            snapshot = account.snapshot.account or {}
+            margins = next((
+                p for p in snapshot.get('positions', [])
+                if p['symbol'] == symbol and p.get('positionSide', 'BOTH') == position.side
+            ), {})
             return {
-                'leverage': float(position['leverage']),
-                'liquidation_price': float(position['liquidationPrice']),
-                'margin_type': position['marginType'],
-                'initial_margin': float(position['initialMargin']),
-                'maintenance_margin': float(position['maintMargin']),
-                'unrealized_pnl': float(position['unrealizedProfit']),
-                'indicators': {
-                    'rsi': rsi.rsi().iloc[-1],
-                    'macd': macd.macd().iloc[-1],
-                    'macd_signal': macd.macd_signal().iloc[-1],
-                    'ema_20': ema20.ema_indicator().iloc[-1],
-                    'ema_50': ema50.ema_indicator().iloc[-1],
-                    'volume': df['volume'].iloc[-1],
-                    'vwap': vwap.volume_weighted_average_price().iloc[-1]
-                }
+                'leverage': position.leverage,
+                'liquidation_price': position.liquidation_price,
+                'liquidation_distance': position.liquidation_distance,
+                'margin_type': position.margin_type,
+                'mark_price': position.mark_price,
+                'initial_margin': float(margins.get('initialMargin', 0)),
+                'maintenance_margin': float(margins.get('maintMargin', 0)),
+                'unrealized_pnl': position.unrealized_pnl,
+                'indicators': timeframes[cls.INTERVAL],
+                'timeframes': timeframes
             }
             
         except Exception as e:
             from loguru import logger
             logger.error(f"Error getting market data: {e}")
+            # Same shape as above, with nothing known rather than a made-up flat position
             return {
-                'leverage': 1,
-                'liquidation_price': 0,
-                'margin_type': 'isolated',
-                'initial_margin': 0,
-                'maintenance_margin': 0,
-                'unrealized_pnl': 0,
-                'indicators': {
-                    'rsi': 0,
-                    'macd': 0,
-                    'macd_signal': 0,
-                    'ema_20': 0,
-                    'ema_50': 0,
-                    'volume': 0,
-                    'vwap': 0
-                }
-            } 
\ No newline at end of file
+                'leverage': None,
+                'liquidation_price': None,
+                'liquidation_distance': None,
+                'margin_type': None,
+                'mark_price': None,
+                'initial_margin': None,
+                'maintenance_margin': None,
+                'unrealized_pnl': None,
+                'indicators': None,
+                'timeframes': dict.fromkeys(cls.TIMEFRAMES)
+            }
\ No newline at end of file
@@ -0,0 +1,38 @@
+import time
+from app.core.config import settings
+from app.services.indicators import INTERVAL_MS
+from app.services.rolling import RollingStats
+from typing import Any, Dict, Optional, Tuple
+
+# Trailing windows statistics are kept for, e.g. 3m,15m,1h
+WINDOWS: Tuple[str, ...] = tuple(w.strip() for w in settings.TICK_STATS_WINDOWS.split(',') if w.strip())
+
+
+class TickStats:
+    """
+    Per-symbol rolling statistics over each of WINDOWS, fed with every
+    aggTrade by the market stream readers, before the market queue conflates
+    a symbol's backlog down to its latest trade.
+    """
+    _stats: Dict[str, Tuple[RollingStats, ...]] = {}
+
+    @classmethod
+    def on_trade(cls, symbol: str, price: float, quantity: float, trade_time: int):
+        stats = cls._stats.get(symbol)
+        if stats is None:
+            stats = cls._stats[symbol] = tuple(RollingStats(INTERVAL_MS[w]) for w in WINDOWS)
+        for window in stats:
+            window.push(trade_time, price, quantity)
+
+    @classmethod
+    def get(cls, symbol: str, now_ms: Optional[int] = None) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Statistics per window, or None before the symbol's first trade"""
+        stats = cls._stats.get(symbol.upper())
+        if stats is None:
+            return None
+        now_ms = now_ms or int(time.time() * 1000)
+        return {w: window.snapshot(now_ms) for w, window in zip(WINDOWS, stats)}
+
+    @classmethod
+    def remove(cls, symbol: str):
+        cls._stats.pop(symbol.upper(), None)
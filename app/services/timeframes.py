@@ -0,0 +1,116 @@
+from app.core.config import settings
+from app.services.indicators import INTERVAL_MS
+from app.services.kline_store import CLOSE, HIGH, LOW, OPEN, OPEN_TIME, VOLUME, KlineStore
+from typing import Any, Dict, List, Optional, Tuple
+
+BASE_INTERVAL = '1m'
+BASE_MS = INTERVAL_MS[BASE_INTERVAL]
+# Every timeframe indicators are kept for, including the streamed 1m base
+TIMEFRAMES: Tuple[str, ...] = tuple(tf.strip() for tf in settings.INDICATOR_TIMEFRAMES.split(',') if tf.strip())
+
+
+class _Bucket:
+    """One higher-timeframe bar built from the closed 1m bars seen so far"""
+    __slots__ = ('open_time', 'open', 'high', 'low', 'close', 'volume', 'next_minute', 'complete')
+
+    def __init__(self, open_time: int, complete: bool):
+        self.open_time = open_time
+        self.open: Optional[float] = None
+        self.high = float('-inf')
+        self.low = float('inf')
+        self.close = 0.0
+        self.volume = 0.0
+        # Open time of the next 1m bar expected to close into this bucket
+        self.next_minute = open_time
+        self.complete = complete
+
+    def fold(self, open_: float, high: float, low: float, close: float, volume: float):
+        if self.open is None:
+            self.open = open_
+        self.high = max(self.high, high)
+        self.low = min(self.low, low)
+        self.close = close
+        self.volume += volume
+        self.next_minute += BASE_MS
+
+    def merged(self, open_: float, high: float, low: float, close: float, volume: float) -> Tuple[float, ...]:
+        """OHLCV of the closed minutes plus the in-progress 1m bar"""
+        if self.open is None:
+            return open_, high, low, close, volume
+        return self.open, max(self.high, high), min(self.low, low), close, self.volume + volume
+
+
+class TimeframeAggregator:
+    """
+    Rolls the 1m kline stream up into higher timeframes incrementally.
+
+    Each 1m update yields one ``kline``-shaped payload per higher timeframe
+    (closed minutes of the bucket merged with the current minute), so the kline
+    store and indicator engine treat them exactly like stream klines. A bucket
+    is only published once every minute in it is accounted for, either seen
+    live or found in the 1m kline buffer; until then the REST-backed state for
+    that timeframe is left alone.
+    """
+    _timeframes: Tuple[str, ...] = tuple(tf for tf in TIMEFRAMES if tf != BASE_INTERVAL)
+    _buckets: Dict[Tuple[str, str], _Bucket] = {}
+
+    @staticmethod
+    def _seed(symbol: str, bucket: _Bucket, upto: int):
+        """Fill the bucket with stored 1m bars in ``[open_time, upto)`` if none are missing"""
+        expected = (upto - bucket.open_time) // BASE_MS
+        if expected <= 0:
+            bucket.complete = True
+            return
+        buffer = KlineStore.get_buffer(symbol, BASE_INTERVAL)
+        if buffer.latest_open_time < upto - BASE_MS:
+            return
+        rows = buffer.last((buffer.latest_open_time - bucket.open_time) // BASE_MS + 1)
+        rows = rows[(rows[:, OPEN_TIME] >= bucket.open_time) & (rows[:, OPEN_TIME] < upto)]
+        if len(rows) != expected:
+            return
+        for row in rows:
+            bucket.fold(row[OPEN], row[HIGH], row[LOW], row[CLOSE], row[VOLUME])
+        bucket.complete = True
+
+    @classmethod
+    def on_kline(cls, symbol: str, kline: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Higher-timeframe kline payloads implied by a 1m ``kline`` payload (the ``k`` object)"""
+        if kline['i'] != BASE_INTERVAL:
+            return []
+        symbol = symbol.upper()
+        t = int(kline['t'])
+        closed = bool(kline.get('x'))
+        bar = (float(kline['o']), float(kline['h']), float(kline['l']), float(kline['c']), float(kline['v']))
+        out = []
+        for tf in cls._timeframes:
+            tf_ms = INTERVAL_MS[tf]
+            bucket_open = t - t % tf_ms
+            key = (symbol, tf)
+            bucket = cls._buckets.get(key)
+            new = bucket is None or bucket_open > bucket.open_time
+            if new:
+                bucket = cls._buckets[key] = _Bucket(bucket_open, complete=t == bucket_open)
+            elif bucket_open < bucket.open_time:
+                continue
+            if bucket.complete and t > bucket.next_minute:
+                # A minute closed without us seeing its final update
+                bucket = cls._buckets[key] = _Bucket(bucket_open, complete=False)
+                new = True
+            if not bucket.complete:
+                # Retry from the 1m buffer only when it can have changed (e.g. after a warmup)
+                if new or closed:
+                    cls._seed(symbol, bucket, t)
+                if not bucket.complete:
+                    continue
+            if t < bucket.next_minute:
+                # Late update for a minute already folded in
+                continue
+            o, h, l, c, v = bucket.merged(*bar)
+            if closed:
+                bucket.fold(*bar)
+            out.append({
+                't': bucket_open, 'T': bucket_open + tf_ms - 1, 's': symbol, 'i': tf,
+                'o': o, 'h': h, 'l': l, 'c': c, 'v': v,
+                'x': closed and t + BASE_MS == bucket_open + tf_ms,
+            })
+        return out
@@ -1,17 +1,33 @@
-from openai import OpenAI
 from loguru import logger
+from app.core import metrics
 from app.core.config import settings
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+import json
 
 class TradeAnalyzer:
     _client = None
+    _async_client = None
+    SYSTEM_PROMPT = "You are an expert crypto futures trading advisor. Analyze the trade and provide specific advice on stop loss and take profit levels based on current market conditions."
+    BATCH_INSTRUCTIONS = 'You will receive several trades, each labelled with an id. Analyze each one independently and respond with a JSON object of the form {"analyses": [{"id": <trade id>, "analysis": "<advice>"}]} containing exactly one entry per trade.'
+    
+    @staticmethod
+    def preload():
+        """Import the OpenAI SDK, which is slow to import and only used once a trade is analyzed"""
+        import openai
+        return openai
     
     @classmethod
     def _get_client(cls):
         if not cls._client:
-            cls._client = OpenAI(api_key=settings.OPENAI_API_KEY)
+            cls._client = cls.preload().OpenAI(api_key=settings.OPENAI_API_KEY)
         return cls._client
     
+    @classmethod
+    def _get_async_client(cls):
+        if not cls._async_client:
+            cls._async_client = cls.preload().AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        return cls._async_client
+    
     @classmethod
     def analyze_trade(cls, trade_data: Dict[Any, Any]) -> Dict[str, Any]:
         """
@@ -23,9 +39,9 @@ class TradeAnalyzer:
             
             # Get analysis from OpenAI
             response = cls._get_client().chat.completions.create(
-                model="gpt-4-turbo-preview",
+                model=settings.OPENAI_MODEL,
                 messages=[
-                    {"role": "system", "content": "You are an expert crypto futures trading advisor. Analyze the trade and provide specific advice on stop loss and take profit levels based on current market conditions."},
+                    {"role": "system", "content": cls.SYSTEM_PROMPT},
                     {"role": "user", "content": prompt}
                 ]
             )
@@ -46,22 +62,93 @@ class TradeAnalyzer:
                 "trade_id": trade_data.get("i")
             }
     
-    @staticmethod
-    def _format_trade_prompt(trade_data: Dict[Any, Any]) -> str:
+    @classmethod
+    async def analyze_trade_async(cls, trade_data: Dict[Any, Any], market_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
-        Format trade data into a prompt for the LLM.
+        Async variant of ``analyze_trade`` for use on the event loop; errors propagate to the caller.
+        """
+        prompt = cls._format_trade_prompt(trade_data, market_data)
+        with metrics.OPENAI_REQUEST_SECONDS.time('single'):
+            response = await cls._get_async_client().chat.completions.create(
+                model=settings.OPENAI_MODEL,
+                messages=[
+                    {"role": "system", "content": cls.SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ]
+            )
+        if response.usage:
+            metrics.OPENAI_TOKENS.inc('single', amount=response.usage.total_tokens)
+        return {
+            "trade_id": trade_data.get("i"),
+            "symbol": trade_data.get("s"),
+            "analysis": response.choices[0].message.content,
+            "timestamp": trade_data.get("T"),
+            "tokens": response.usage.total_tokens if response.usage else None
+        }
+    
+    @classmethod
+    async def analyze_trades_batch(cls, trades: List[Tuple[Dict[Any, Any], Optional[Dict[str, Any]]]]) -> Tuple[List[Optional[str]], Optional[int]]:
+        """
+        Analyze several (trade_data, market_data) pairs with one completion.
+        Returns the analysis per trade, in input order (None where the model
+        left a trade out), and the total tokens used.
+        """
+        sections = [
+            f"Trade id {i}:\n{cls._format_trade_details(trade_data, market_data)}"
+            for i, (trade_data, market_data) in enumerate(trades)
+        ]
+        with metrics.OPENAI_REQUEST_SECONDS.time('batch'):
+            response = await cls._get_async_client().chat.completions.create(
+                model=settings.OPENAI_MODEL,
+                response_format={"type": "json_object"},
+                messages=[
+                    {"role": "system", "content": f"{cls.SYSTEM_PROMPT} {cls.BATCH_INSTRUCTIONS}"},
+                    {"role": "user", "content": "Please analyze these futures trades:\n\n" + "\n\n".join(sections) + cls.ADVICE}
+                ]
+            )
+        if response.usage:
+            metrics.OPENAI_TOKENS.inc('batch', amount=response.usage.total_tokens)
+        analyses: List[Optional[str]] = [None] * len(trades)
+        try:
+            for entry in json.loads(response.choices[0].message.content).get('analyses', []):
+                i = int(entry.get('id', -1))
+                if 0 <= i < len(trades):
+                    analyses[i] = str(entry.get('analysis', ''))
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.error(f"Could not parse batch analysis response: {e}")
+        return analyses, response.usage.total_tokens if response.usage else None
+    
+    @staticmethod
+    def _format_market_context(market_data: Optional[Dict[str, Any]]) -> str:
+        indicators = (market_data or {}).get('indicators') or {}
+        lines = [f"{name.upper()}: {value:.6g}" for name, value in indicators.items() if value is not None]
+        if not lines:
+            return ""
+        return "Current 1h indicators:\n        " + "\n        ".join(lines) + "\n"
+    
+    ADVICE = """
+        Provide specific advice on:
+        1. Recommended stop loss levels and reasoning
+        2. Target take profit levels and reasoning
+        3. Key technical levels to watch
+        4. Risk management suggestions
         """
+    
+    @classmethod
+    def _format_trade_details(cls, trade_data: Dict[Any, Any], market_data: Optional[Dict[str, Any]] = None) -> str:
         return f"""
-        Please analyze this futures trade:
-        
         Symbol: {trade_data.get('s')}
         Side: {trade_data.get('S')}
         Position Size: {trade_data.get('q')}
         Entry Price: {trade_data.get('p')}
         
-        Provide specific advice on:
-        1. Recommended stop loss levels and reasoning
-        2. Target take profit levels and reasoning
-        3. Key technical levels to watch
-        4. Risk management suggestions
-        """ 
\ No newline at end of file
+        {cls._format_market_context(market_data)}"""
+    
+    @classmethod
+    def _format_trade_prompt(cls, trade_data: Dict[Any, Any], market_data: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Format trade data into a prompt for the LLM.
+        """
+        return f"""
+        Please analyze this futures trade:
+        {cls._format_trade_details(trade_data, market_data)}{cls.ADVICE}""" 
\ No newline at end of file
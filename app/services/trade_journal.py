@@ -0,0 +1,240 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+from app.core.config import settings
+from app.services.accounts import DEFAULT_ACCOUNT
+from typing import Any, Dict, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trade_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    dedupe_key TEXT NOT NULL UNIQUE,
+    account TEXT NOT NULL DEFAULT 'default',
+    symbol TEXT NOT NULL,
+    order_id INTEGER NOT NULL,
+    client_order_id TEXT,
+    trade_id INTEGER NOT NULL,
+    side TEXT,
+    order_type TEXT,
+    execution_type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    price REAL,
+    avg_price REAL,
+    quantity REAL,
+    filled_quantity REAL,
+    last_price REAL,
+    last_quantity REAL,
+    realized_pnl REAL,
+    commission REAL,
+    commission_asset TEXT,
+    position_side TEXT,
+    is_maker INTEGER,
+    event_time INTEGER NOT NULL,
+    trade_time INTEGER NOT NULL,
+    raw TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_trade_events_symbol_time ON trade_events (symbol, trade_time);
+CREATE INDEX IF NOT EXISTS ix_trade_events_order ON trade_events (order_id);
+CREATE INDEX IF NOT EXISTS ix_trade_events_time ON trade_events (trade_time);
+"""
+
+COLUMNS = (
+    'dedupe_key', 'account', 'symbol', 'order_id', 'client_order_id', 'trade_id', 'side', 'order_type',
+    'execution_type', 'status', 'price', 'avg_price', 'quantity', 'filled_quantity', 'last_price',
+    'last_quantity', 'realized_pnl', 'commission', 'commission_asset', 'position_side', 'is_maker',
+    'event_time', 'trade_time', 'raw',
+)
+
+INSERT = (
+    f"INSERT OR IGNORE INTO trade_events ({', '.join(COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in COLUMNS)})"
+)
+
+
+def _float(value: Any) -> Optional[float]:
+    return float(value) if value not in (None, '') else None
+
+
+def _row(msg: Dict[str, Any], account: str = DEFAULT_ACCOUNT) -> Tuple:
+    """Flatten an ``ORDER_TRADE_UPDATE`` event of ``account`` into a ``trade_events`` row"""
+    order = msg.get('o', {})
+    symbol = order.get('s')
+    trade_id = int(order.get('t') or 0)
+    if trade_id:
+        dedupe_key = f"T:{symbol}:{trade_id}"
+    else:
+        dedupe_key = f"E:{symbol}:{order.get('i')}:{order.get('x')}:{order.get('X')}:{msg.get('E')}"
+    if account != DEFAULT_ACCOUNT:
+        # Both sides of a trade between two of our accounts share its trade id
+        dedupe_key = f"{account}:{dedupe_key}"
+    return (
+        dedupe_key, account, symbol, int(order.get('i') or 0), order.get('c'), trade_id, order.get('S'), order.get('o'),
+        order.get('x'), order.get('X'), _float(order.get('p')), _float(order.get('ap')),
+        _float(order.get('q')), _float(order.get('z')), _float(order.get('L')), _float(order.get('l')),
+        _float(order.get('rp')), _float(order.get('n')), order.get('N'), order.get('ps'),
+        int(bool(order.get('m'))), int(msg.get('E') or 0), int(order.get('T') or msg.get('T') or 0),
+        json.dumps(msg, separators=(',', ':')),
+    )
+
+
+class TradeJournal:
+    """
+    Append-only SQLite (WAL) journal of every ``ORDER_TRADE_UPDATE``.
+
+    Events are queued on the event loop and written in batches by a single
+    writer thread; queries run on worker threads with their own connections,
+    which WAL allows to proceed while a write is in progress.
+    """
+    BATCH_SIZE = 500
+    BATCH_WAIT = 0.05
+
+    _queue: Optional[asyncio.Queue] = None
+    _writer_task: Optional[asyncio.Task] = None
+    _write_executor: Optional[ThreadPoolExecutor] = None
+    _write_conn: Optional[sqlite3.Connection] = None
+    _local = threading.local()
+
+    @classmethod
+    def _path(cls) -> str:
+        os.makedirs(settings.DATA_DIR, exist_ok=True)
+        return os.path.join(settings.DATA_DIR, 'trades.sqlite3')
+
+    @classmethod
+    def _connect(cls) -> sqlite3.Connection:
+        conn = sqlite3.connect(cls._path(), check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @classmethod
+    async def start(cls):
+        if cls._writer_task:
+            return
+        cls._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='trade-journal')
+        loop = asyncio.get_running_loop()
+        cls._write_conn = await loop.run_in_executor(cls._write_executor, cls._connect)
+        await loop.run_in_executor(cls._write_executor, cls._write_conn.executescript, SCHEMA)
+        await loop.run_in_executor(cls._write_executor, cls._migrate)
+        cls._queue = asyncio.Queue()
+        cls._writer_task = asyncio.create_task(cls._writer(cls._queue))
+        logger.info("Trade journal started")
+
+    @classmethod
+    async def stop(cls):
+        """Flush queued events and close the writer"""
+        if not cls._writer_task:
+            return
+        # The writer drains everything up to the None marker, including a batch it is holding, then exits
+        queue, cls._queue = cls._queue, None
+        queue.put_nowait(None)
+        try:
+            await cls._writer_task
+        except Exception as e:
+            logger.error(f"Trade journal writer failed: {e}")
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(cls._write_executor, cls._write_conn.close)
+        cls._write_executor.shutdown()
+        cls._writer_task = None
+
+    @classmethod
+    def _migrate(cls):
+        """Add columns introduced after a journal was created"""
+        columns = {row[1] for row in cls._write_conn.execute('PRAGMA table_info(trade_events)')}
+        if 'account' not in columns:
+            with cls._write_conn:
+                cls._write_conn.execute("ALTER TABLE trade_events ADD COLUMN account TEXT NOT NULL DEFAULT 'default'")
+
+    @classmethod
+    def record(cls, msg: Dict[str, Any], account: str = DEFAULT_ACCOUNT):
+        """Queue an ``ORDER_TRADE_UPDATE`` event of ``account`` for writing"""
+        if cls._queue is None:
+            return
+        try:
+            cls._queue.put_nowait(_row(msg, account))
+        except Exception as e:
+            logger.error(f"Error journaling trade event: {e}")
+
+    @classmethod
+    def _write_batch(cls, batch: List[Tuple]):
+        with cls._write_conn:
+            cls._write_conn.executemany(INSERT, batch)
+
+    @classmethod
+    async def _writer(cls, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            batch = [await queue.get()]
+            if batch[0] is not None:
+                # Give a burst of partial fills a moment to arrive so they share a transaction
+                await asyncio.sleep(cls.BATCH_WAIT)
+            while len(batch) < cls.BATCH_SIZE and not queue.empty():
+                batch.append(queue.get_nowait())
+            # Nothing is queued after the stop marker, so it can only be last
+            if batch[-1] is None:
+                stopping = True
+                batch.pop()
+            if not batch:
+                continue
+            try:
+                await loop.run_in_executor(cls._write_executor, cls._write_batch, batch)
+            except Exception as e:
+                logger.error(f"Error writing {len(batch)} trade events: {e}")
+
+    @classmethod
+    def _read_conn(cls) -> sqlite3.Connection:
+        conn = getattr(cls._local, 'conn', None)
+        if conn is None:
+            conn = cls._connect()
+            conn.row_factory = sqlite3.Row
+            cls._local.conn = conn
+        return conn
+
+    @classmethod
+    def _query(cls, sql: str, params: List[Any]) -> List[Dict[str, Any]]:
+        return [dict(row) for row in cls._read_conn().execute(sql, params).fetchall()]
+
+    @classmethod
+    async def recent_symbols(cls, since_ms: int, account: str = DEFAULT_ACCOUNT) -> List[str]:
+        rows = await asyncio.to_thread(
+            cls._query, 'SELECT DISTINCT symbol FROM trade_events WHERE trade_time >= ? AND account = ?',
+            [since_ms, account]
+        )
+        return [row['symbol'] for row in rows]
+
+    @classmethod
+    async def query(cls, account: Optional[str] = None, symbol: Optional[str] = None, order_id: Optional[int] = None,
+                    start_time: Optional[int] = None, end_time: Optional[int] = None,
+                    fills_only: bool = True, before_id: Optional[int] = None,
+                    limit: int = 50) -> List[Dict[str, Any]]:
+        """Most recent events first; page with ``before_id`` set to the last ``id`` returned"""
+        clauses, params = [], []
+        if account:
+            clauses.append('account = ?')
+            params.append(account)
+        if symbol:
+            clauses.append('symbol = ?')
+            params.append(symbol.upper())
+        if order_id is not None:
+            clauses.append('order_id = ?')
+            params.append(order_id)
+        if start_time is not None:
+            clauses.append('trade_time >= ?')
+            params.append(start_time)
+        if end_time is not None:
+            clauses.append('trade_time < ?')
+            params.append(end_time)
+        if fills_only:
+            clauses.append("execution_type = 'TRADE'")
+        if before_id is not None:
+            clauses.append('id < ?')
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        columns = ', '.join(('id',) + COLUMNS[1:-1])
+        sql = f"SELECT {columns} FROM trade_events {where} ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        return await asyncio.to_thread(cls._query, sql, params)
@@ -1,209 +1,635 @@
 import websockets
 import json
-import hmac
-import hashlib
 import time
-import urllib.parse
 from loguru import logger
+from app.core import metrics
 from app.core.config import settings
+from app.services.accounts import DEFAULT_ACCOUNT, Account
+from app.services.alerts import AlertEngine
+from app.services.analysis_pipeline import TradeAnalysisPipeline
+from app.services.binance_rest import BinanceAPIError
 from app.services.discord_notifier import DiscordNotifier
+from app.services.indicators import IndicatorEngine
+from app.services.kline_store import OPEN_TIME, KlineStore
+from app.services.trade_journal import TradeJournal
+from app.services.technical_analysis import TechnicalAnalyzer
+from app.services.tick_stats import WINDOWS, TickStats
+from app.services.timeframes import TimeframeAggregator
+from app.websocket.capture import StreamCapture
+from app.websocket.fanout import LiveFeed
+from app.websocket.market_streams import MarketStreams
+from app.websocket.pipeline import ConflatingQueue, LosslessQueue, StreamQueue
+from app.websocket.reconnect import Backoff, ReconnectStats, SeenSet, missed_trade_events
 import asyncio
-import aiohttp
-from typing import Optional, Dict
-from datetime import datetime
-from discord_webhook import DiscordWebhook, DiscordEmbed
+from typing import Any, Awaitable, Callable, Iterable, List, Optional, Dict, Set, Tuple
+from datetime import datetime, timezone
+
+class UserStream:
+    """
+    User data stream of one account: its listen key and keepalive, the
+    websocket reader feeding a lossless queue, backfill of fills missed while
+    disconnected, and the handler applying events to the account's state and
+    notifier target. Market data is shared through ``BinanceWebsocketClient``.
+    """
+    WS_URL = f"{settings.BINANCE_WS_BASE_URL}/ws"
+    
+    def __init__(self, account: Account):
+        self.account = account
+        # Queue, capture and metrics name; the default account keeps the original 'user'
+        self.name = 'user' if account.is_default else f"user-{account.name}"
+        self.ws: Optional[websockets.WebSocketClientProtocol] = None
+        self.listen_key: Optional[str] = None
+        self.running = False
+        # Raw frames between the socket reader and the handler
+        self.queue: Optional[LosslessQueue] = None
+        # Gap detection
+        self.last_event_time = 0
+        self.seen_trades = SeenSet()
+        self.traded_symbols: Set[str] = set()
+        self.rotate_listen_key = False
+        self.reconnect_stats = ReconnectStats()
+    
+    async def start(self):
+        """Connect as soon as the listen key is in; account state loads alongside in the background"""
+        self.running = True
+        self.queue = LosslessQueue(self.name, settings.USER_STREAM_QUEUE_SIZE)
+        asyncio.create_task(BinanceWebsocketClient._consume(self.queue, self.handle_message))
+        self.account.positions.on_symbols_changed = BinanceWebsocketClient._on_position_symbols
+        asyncio.create_task(self._load_state())
+        await self._get_listen_key()
+        asyncio.create_task(self._connect_websocket())
+        asyncio.create_task(self._keepalive_listen_key())
+        logger.info(f"User data stream started for account {self.account.name}")
+    
+    async def _load_state(self):
+        """Build the account snapshot and position book, and the symbols to backfill after a reconnect"""
+        since = int((time.time() - 7 * 86400) * 1000)
+        symbols, snapshot, positions = await asyncio.gather(
+            TradeJournal.recent_symbols(since, self.account.name),
+            self.account.snapshot.refresh(),
+            self.account.positions.reconcile(),
+            return_exceptions=True,
+        )
+        if isinstance(symbols, BaseException):
+            logger.error(f"Error reading {self.account.name} traded symbols: {symbols}")
+        else:
+            self.traded_symbols.update(symbols)
+        if isinstance(snapshot, BaseException):
+            logger.error(f"Error loading {self.account.name} account snapshot: {snapshot}")
+        if isinstance(positions, BaseException):
+            logger.error(f"Error loading {self.account.name} positions: {positions}")
+        # Events keep them current from here, with a resync when that fails
+        asyncio.create_task(self.account.snapshot.maintain())
+        asyncio.create_task(self.account.positions.maintain())
+    
+    async def stop(self):
+        self.running = False
+        if self.ws:
+            await self.ws.close()
+        if self.listen_key:
+            await self._delete_listen_key()
+    
+    async def _get_listen_key(self):
+        """Get listen key for user data stream"""
+        self.listen_key = await self.account.client.new_listen_key()
+        logger.info(f"Got new listen key for account {self.account.name}")
+    
+    async def _keepalive_listen_key(self):
+        """Keep listen key alive"""
+        while self.running:
+            try:
+                if self.listen_key:
+                    try:
+                        await self.account.client.keepalive_listen_key()
+                        logger.debug(f"Listen key keepalive success ({self.account.name})")
+                    except BinanceAPIError as e:
+                        logger.error(f"Listen key keepalive failed ({self.account.name}): {e}")
+                        await self._get_listen_key()
+            except Exception as e:
+                logger.error(f"Error in keepalive: {e}")
+            
+            await asyncio.sleep(30 * 60)  # Every 30 minutes
+    
+    async def _delete_listen_key(self):
+        """Delete listen key"""
+        if self.listen_key:
+            try:
+                await self.account.client.delete_listen_key()
+                logger.info(f"Listen key deleted ({self.account.name})")
+            except BinanceAPIError as e:
+                logger.error(f"Failed to delete listen key ({self.account.name}): {e}")
+    
+    async def _refresh_listen_key(self):
+        """Make sure the listen key is still valid before reconnecting, replacing it when asked to rotate"""
+        if self.rotate_listen_key:
+            self.rotate_listen_key = False
+            await self._delete_listen_key()
+            await self._get_listen_key()
+            return
+        try:
+            await self.account.client.keepalive_listen_key()
+        except BinanceAPIError as e:
+            logger.warning(f"Listen key no longer valid ({e}), getting a new one")
+            await self._get_listen_key()
+    
+    def _rotate_user_stream(self, websocket):
+        logger.info(f"Rotating {self.account.name} user data stream before Binance's 24h limit")
+        self.rotate_listen_key = True
+        asyncio.create_task(websocket.close())
+    
+    async def _connect_websocket(self):
+        """Maintain WebSocket connection, backfilling missed fills after each reconnect"""
+        backoff = Backoff()
+        # Resuming from another worker's stream (see initialize) backfills like a reconnect
+        disconnected_at: Optional[float] = time.monotonic() if self.last_event_time else None
+        while self.running:
+            try:
+                if disconnected_at is not None:
+                    await self._refresh_listen_key()
+                async with websockets.connect(f"{self.WS_URL}/{self.listen_key}") as websocket:
+                    self.ws = websocket
+                    connected_at = time.monotonic()
+                    logger.info(f"WebSocket connected ({self.account.name})")
+                    if not self.last_event_time:
+                        self.last_event_time = int(time.time() * 1000)
+                    if disconnected_at is not None:
+                        self.reconnect_stats.reconnects += 1
+                        self.reconnect_stats.last_reconnect_seconds = connected_at - disconnected_at
+                        # Live frames wait in the socket until the backfill is queued
+                        await self._backfill_user_stream()
+                        disconnected_at = None
+                    rotation = asyncio.get_running_loop().call_later(
+                        settings.USER_STREAM_MAX_AGE, self._rotate_user_stream, websocket
+                    )
+                    
+                    # Reader stage: only move raw frames; a full queue pauses reading
+                    try:
+                        while self.running:
+                            try:
+                                message = await websocket.recv()
+                                StreamCapture.record(self.name, message, time.time())
+                                await self.queue.put(message)
+                            except websockets.ConnectionClosed:
+                                break
+                    finally:
+                        rotation.cancel()
+                    self.ws = None
+                    if time.monotonic() - connected_at > 30:
+                        backoff.reset()
+                            
+            except Exception as e:
+                self.ws = None
+                logger.error(f"WebSocket connection error ({self.account.name}): {e}")
+            if self.running:
+                disconnected_at = disconnected_at or time.monotonic()
+                await asyncio.sleep(backoff.next_delay())  # Wait before reconnecting
+    
+    async def _backfill_user_stream(self):
+        """Queue fills missed since the last user-data event, ahead of any live frame"""
+        started = time.perf_counter()
+        snapshot = self.account.snapshot.account or {}
+        symbols = self.traded_symbols | {
+            p['symbol'] for p in snapshot.get('positions', []) if float(p.get('positionAmt', 0)) != 0
+        }
+        events = await missed_trade_events(
+            self.account.client, sorted(symbols),
+            # Small overlap for clock skew; duplicates are dropped by trade id
+            self.last_event_time - 1000, self.seen_trades
+        )
+        for event in events:
+            await self.queue.put(json.dumps(event))
+        # Balance and position events from the gap are not replayable
+        self.account.snapshot.invalidate()
+        self.account.positions.invalidate()
+        self.reconnect_stats.last_backfill_seconds = time.perf_counter() - started
+        self.reconnect_stats.backfilled_events += len(events)
+        logger.info(f"Backfilled {len(events)} missed fills across {len(symbols)} symbols "
+                    f"for account {self.account.name} in {self.reconnect_stats.last_backfill_seconds:.2f}s")
+    
+    def status(self) -> Dict[str, Any]:
+        return {
+            'connected': self.ws is not None,
+            'listen_key': self.listen_key is not None,
+            'stream': self.name,
+        }
+    
+    def readiness(self) -> Dict[str, bool]:
+        name = self.account.name
+        return {
+            f"{name}_stream": self.ws is not None,
+            f"{name}_snapshot": self.account.snapshot.account is not None,
+            f"{name}_positions": self.account.positions.synced_at > 0,
+        }
+    
+    def snapshot_status(self) -> Dict[str, Any]:
+        """Snapshot freshness; events are missed while the user stream is down"""
+        status = self.account.snapshot.status()
+        status['stale'] = status['stale'] or self.ws is None
+        return status
+    
+    @staticmethod
+    def account_summary(snapshot: Optional[Dict[str, Any]], status: Dict[str, Any]) -> Dict[str, Any]:
+        """Balance summary published on the live ``account`` topic"""
+        snapshot = snapshot or {}
+        return {
+            'totalWalletBalance': snapshot.get('totalWalletBalance'),
+            'totalUnrealizedProfit': snapshot.get('totalUnrealizedProfit'),
+            'totalMarginBalance': snapshot.get('totalMarginBalance'),
+            'availableBalance': snapshot.get('availableBalance'),
+            'assets': [a for a in snapshot.get('assets', []) if float(a.get('walletBalance', 0)) != 0],
+            'snapshot': status,
+        }
+    
+    def live_account(self) -> Dict[str, Any]:
+        return self.account_summary(self.account.snapshot.account, self.snapshot_status())
+    
+    def live_positions(self) -> Dict[str, Any]:
+        """Position book as served by /api/positions and the live ``positions`` topic"""
+        book = self.account.positions
+        return {'positions': book.snapshot(), 'book': {**book.status(), 'stale': self.ws is None}}
+    
+    @staticmethod
+    def _live_fill(order: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'symbol': order.get('s'),
+            'side': order.get('S'),
+            'position_side': order.get('ps'),
+            'order_id': order.get('i'),
+            'trade_id': order.get('t'),
+            'status': order.get('X'),
+            'price': float(order.get('L', 0)),
+            'quantity': float(order.get('l', 0)),
+            'filled_quantity': float(order.get('z', 0)),
+            'realized_pnl': float(order.get('rp', 0)),
+            'commission': float(order.get('n', 0)),
+            'commission_asset': order.get('N'),
+            'time': order.get('T'),
+        }
+    
+    async def handle_message(self, msg: dict):
+        """Handle incoming WebSocket messages"""
+        try:
+            self.last_event_time = max(self.last_event_time, msg.get('E', 0))
+            if msg.get('e') == 'listenKeyExpired':
+                logger.warning(f"Listen key expired ({self.account.name}), reconnecting with a new one")
+                self.rotate_listen_key = True
+                if self.ws:
+                    await self.ws.close()
+            elif msg.get('e') == 'ACCOUNT_UPDATE':
+                self.account.snapshot.apply_account_update(msg)
+                self.account.positions.apply_account_update(msg)
+                if LiveFeed.active('account'):
+                    LiveFeed.publish('account', self.account.name, self.live_account())
+                if LiveFeed.active('positions'):
+                    LiveFeed.publish('positions', self.account.name, self.live_positions())
+            elif msg.get('e') == 'ORDER_TRADE_UPDATE':
+                order = msg.get('o', {})
+                if order.get('x') == 'TRADE':
+                    trade_key = (order.get('s'), order.get('t'))
+                    if trade_key in self.seen_trades:
+                        # Already replayed by a backfill
+                        return
+                    self.seen_trades.add(trade_key)
+                    self.traded_symbols.add(order.get('s'))
+                    LiveFeed.publish('fills', self.account.name, self._live_fill(order))
+                    if BinanceWebsocketClient.on_fill is not None:
+                        BinanceWebsocketClient.on_fill()
+                self.account.snapshot.apply_order_update(msg)
+                TradeJournal.record(msg, self.account.name)
+                status = order.get('X')  # Order status
+                
+                if status in ['FILLED', 'PARTIALLY_FILLED']:
+                    DiscordNotifier.send_trade_notification(
+                        msg, webhook_url=self.account.webhook_url, positions=self.account.positions
+                    )
+                    logger.info(f"Trade notification queued for order: {order.get('i')} ({self.account.name})")
+                    TradeAnalysisPipeline.submit(msg, self.account)
+                    # A new subscription waits for the stream lock and request pacing; not on this handler
+                    BinanceWebsocketClient.ensure_kline_stream_later(order.get('s', ''))
+            
+        except Exception as e:
+            logger.error(f"Error processing message: {e}")
+            logger.error(f"Message content: {msg}")
 
 class BinanceWebsocketClient:
+    """
+    One user data stream per configured account, fanning in to a single
+    market data layer (streams, klines, indicators, tick stats and alerts)
+    shared by all of them.
+    """
     _instance = None
-    _ws: Optional[websockets.WebSocketClientProtocol] = None
-    _market_ws: Optional[websockets.WebSocketClientProtocol] = None
-    _listen_key = None
     _running = False
-    _current_prices: Dict[str, float] = {
-        'ETHUSDT': None,
-        'XTZUSDT': None
-    }
-    _previous_prices: Dict[str, float] = {
-        'ETHUSDT': None,
-        'XTZUSDT': None
-    }
-    BASE_URL = "https://fapi.binance.com"
-    WS_URL = "wss://fstream.binance.com/ws"
+    # Account name -> user data stream
+    _streams: Dict[str, UserStream] = {}
+    _market_queue: Optional[ConflatingQueue] = None
+    # markPrice@1s streams subscribed for symbols with an open position in any account
+    _mark_streams: Set[str] = set()
+    # Kline subscriptions started from handlers, referenced until they finish
+    _subscriptions: Set[asyncio.Task] = set()
+    # Called for each new fill before it is journaled or notified (the stream leader publishes its resume point)
+    on_fill: Optional[Callable[[], None]] = None
+    # Startup timeline (monotonic): initialize called and returned, ready, first frame handled per stream
+    _started_at = 0.0
+    _initialized_at = 0.0
+    _ready_at = 0.0
+    _first_message: Dict[str, float] = {}
+    # Discord allows 25 fields per embed
+    PRICE_FIELDS_PER_EMBED = 25
+    # Set while replaying captures, which have no REST warmup: a kline without indicator state
+    # builds it from the closed bars stored so far, once there are enough for the slowest (EMA 50)
+    warm_from_store = False
+    STORE_WARMUP_BARS = 50
+    
+    @classmethod
+    def user_streams(cls) -> List[UserStream]:
+        """Every account's user stream, the default account first"""
+        if not cls._streams:
+            cls._streams = {account.name: UserStream(account) for account in Account.configured()}
+        return list(cls._streams.values())
+    
+    @classmethod
+    def user_stream(cls, account: Optional[str] = None) -> Optional[UserStream]:
+        cls.user_streams()
+        return cls._streams.get(account or DEFAULT_ACCOUNT)
     
     @classmethod
-    async def initialize(cls):
+    async def initialize(cls, resume: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        ``resume`` maps account names to the ``last_event_time`` and recent
+        ``trades`` (symbol, trade id) of a previous owner of the streams, whose
+        missed fills are then backfilled on connect
+        """
         if not cls._instance:
             cls._instance = cls()
             cls._running = True
+            cls._started_at = time.monotonic()
+            for stream in cls.user_streams():
+                previous = (resume or {}).get(stream.account.name)
+                if previous:
+                    stream.last_event_time = previous['last_event_time']
+                    for trade in previous.get('trades', []):
+                        stream.seen_trades.add(tuple(trade))
             
-            # Get listen key first
-            await cls._get_listen_key()
-            
-            # Start WebSocket connections
-            asyncio.create_task(cls._connect_websocket())
-            asyncio.create_task(cls._connect_market_websocket())
+            # Local services; none of them waits on the network
+            AlertEngine.load()
+            StreamCapture.start()
+            await asyncio.gather(TradeJournal.start(), DiscordNotifier.start(), TradeAnalysisPipeline.start())
             
-            # Start listen key keepalive
-            asyncio.create_task(cls._keepalive_listen_key())
+            # The shared market connections and every account's user stream come up concurrently.
+            # Saved alerts need their symbols' trades, so they go in the first connection URL.
+            cls._market_queue = ConflatingQueue('market', settings.MARKET_STREAM_QUEUE_SIZE)
+            asyncio.create_task(cls._consume(cls._market_queue, cls._handle_market_message))
+            await asyncio.gather(
+                MarketStreams.start(
+                    cls._market_queue,
+                    [*(s.strip() for s in settings.MARKET_SYMBOLS.split(',')), *AlertEngine.symbols()],
+                    TechnicalAnalyzer.KLINE_INTERVAL,
+                ),
+                *(stream.start() for stream in cls.user_streams()),
+            )
             
-            # Start price notification task
+            # RSI alerts need live indicators; REST warmups run behind the connections
+            asyncio.create_task(cls._warm_alert_indicators())
             asyncio.create_task(cls._send_periodic_price_updates())
+            asyncio.create_task(cls._wait_until_ready())
             
-            logger.info("Binance WebSocket client initialized")
+            cls._initialized_at = time.monotonic()
+            logger.info(f"Binance WebSocket client initialized ({len(cls._streams)} accounts) "
+                        f"in {cls._initialized_at - cls._started_at:.2f}s")
+    
+    @classmethod
+    def status(cls) -> Dict[str, Any]:
+        stream = cls.user_stream()
+        return {
+            "status": "running",
+            "websocket_connected": stream.ws is not None,
+            "listen_key": stream.listen_key is not None,
+            "is_running": cls._running,
+            "accounts": {
+                s.account.name: {**s.status(), "positions": s.account.positions.status()}
+                for s in cls.user_streams()
+            },
+            "market": MarketStreams.status(),
+            "streams": cls.stream_stats(),
+            "discord_queue_depth": DiscordNotifier.queue_depth(),
+            "discord_dropped": DiscordNotifier.dropped,
+            "analysis": TradeAnalysisPipeline.stats(),
+            "capture": StreamCapture.status(),
+            "alerts": AlertEngine.status(),
+            "startup": cls.startup_stats(),
+        }
+    
+    @classmethod
+    def readiness(cls) -> Dict[str, bool]:
+        """Checks that must all pass before the service has everything it needs to act on events"""
+        checks = {'market_streams': MarketStreams.connected()}
+        for stream in cls.user_streams():
+            checks.update(stream.readiness())
+        return checks
+    
+    @classmethod
+    async def _wait_until_ready(cls):
+        while cls._running and not all(cls.readiness().values()):
+            await asyncio.sleep(0.05)
+        if not cls._running:
+            return
+        cls._ready_at = time.monotonic()
+        logger.info(f"Ready {cls._ready_at - cls._started_at:.2f}s after startup")
+        # Rarely used dependencies are imported now rather than on the first fill
+        await TradeAnalysisPipeline.warm_up()
+    
+    @classmethod
+    def startup_stats(cls) -> Dict[str, Any]:
+        """Seconds from initialize() to each startup milestone, None until reached"""
+        def since_start(at: float) -> Optional[float]:
+            return round(at - cls._started_at, 3) if at else None
+        return {
+            'initialize_seconds': since_start(cls._initialized_at),
+            'ready_seconds': since_start(cls._ready_at),
+            'first_message_seconds': {name: since_start(at) for name, at in cls._first_message.items()},
+        }
     
     @classmethod
     async def cleanup(cls):
         cls._running = False
-        if cls._ws:
-            await cls._ws.close()
-        if cls._market_ws:
-            await cls._market_ws.close()
-        if cls._listen_key:
-            await cls._delete_listen_key()
+        for stream in cls._streams.values():
+            await stream.stop()
+        await MarketStreams.stop()
+        KlineStore.flush_all()
+        await TradeJournal.stop()
+        await StreamCapture.stop()
+        await AlertEngine.stop()
+        await TradeAnalysisPipeline.stop()
+        await DiscordNotifier.stop()
         logger.info("Binance WebSocket connections closed")
     
     @classmethod
-    async def _get_listen_key(cls):
-        """Get listen key for user data stream"""
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{cls.BASE_URL}/fapi/v1/listenKey",
-                headers={"X-MBX-APIKEY": settings.BINANCE_API_KEY}
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    cls._listen_key = data["listenKey"]
-                    logger.info("Got new listen key")
-                else:
-                    raise Exception(f"Failed to get listen key: {await response.text()}")
+    def replay_handlers(cls) -> Dict[str, Callable[[dict], Awaitable[Any]]]:
+        """Capture stream name -> handler, for replaying captured frames"""
+        handlers = {stream.name: stream.handle_message for stream in cls.user_streams()}
+        handlers['market'] = cls._replay_market_message
+        return handlers
     
     @classmethod
-    async def _keepalive_listen_key(cls):
-        """Keep listen key alive"""
-        while cls._running:
-            try:
-                if cls._listen_key:
-                    async with aiohttp.ClientSession() as session:
-                        async with session.put(
-                            f"{cls.BASE_URL}/fapi/v1/listenKey",
-                            headers={"X-MBX-APIKEY": settings.BINANCE_API_KEY}
-                        ) as response:
-                            if response.status == 200:
-                                logger.debug("Listen key keepalive success")
-                            else:
-                                logger.error(f"Listen key keepalive failed: {await response.text()}")
-                                await cls._get_listen_key()
-            except Exception as e:
-                logger.error(f"Error in keepalive: {e}")
-            
-            await asyncio.sleep(30 * 60)  # Every 30 minutes
+    def _on_trade(cls, symbol: str, price: float, quantity: float, trade_time: int):
+        """Every trade, called by the market readers ahead of the conflating queue"""
+        TickStats.on_trade(symbol, price, quantity, trade_time)
+        AlertEngine.on_trade(symbol, price, trade_time)
     
     @classmethod
-    async def _delete_listen_key(cls):
-        """Delete listen key"""
-        if cls._listen_key:
-            async with aiohttp.ClientSession() as session:
-                async with session.delete(
-                    f"{cls.BASE_URL}/fapi/v1/listenKey",
-                    headers={"X-MBX-APIKEY": settings.BINANCE_API_KEY}
-                ) as response:
-                    if response.status == 200:
-                        logger.info("Listen key deleted")
-                    else:
-                        logger.error(f"Failed to delete listen key: {await response.text()}")
+    async def _replay_market_message(cls, msg: dict):
+        """Replayed frames skip the readers, so trades take both paths here"""
+        data = msg.get('data', msg)
+        if data.get('e') == 'aggTrade':
+            cls._on_trade(data.get('s', '').upper(), float(data.get('p', 0)), float(data.get('q', 0)), data.get('T', 0))
+        await cls._handle_market_message(msg)
     
     @classmethod
-    async def _connect_websocket(cls):
-        """Maintain WebSocket connection"""
+    async def _consume(cls, queue: StreamQueue, handler: Callable[[dict], Awaitable[Any]]):
+        """Processing stage: decode queued frames and run the handler"""
+        labels = (queue.name,)
+        first = True
         while cls._running:
+            message = await queue.get()
+            if first:
+                first = False
+                cls._first_message[queue.name] = time.monotonic()
             try:
-                async with websockets.connect(f"{cls.WS_URL}/{cls._listen_key}") as websocket:
-                    cls._ws = websocket
-                    logger.info("WebSocket connected")
-                    
-                    while cls._running:
-                        try:
-                            message = await websocket.recv()
-                            await cls._handle_message(json.loads(message))
-                        except websockets.ConnectionClosed:
-                            break
-                        except Exception as e:
-                            logger.error(f"Error handling message: {e}")
-                            
+                started = time.perf_counter()
+                msg = json.loads(message)
+                decoded = time.perf_counter()
+                await handler(msg)
+                metrics.STREAM_DECODE_SECONDS.observe(decoded - started, *labels)
+                metrics.STREAM_HANDLER_SECONDS.observe(time.perf_counter() - decoded, *labels)
+                metrics.STREAM_MESSAGES.inc(*labels)
             except Exception as e:
-                logger.error(f"WebSocket connection error: {e}")
-                await asyncio.sleep(5)  # Wait before reconnecting
+                logger.error(f"Error handling {queue.name} message: {e}")
+            finally:
+                queue.task_done()
     
     @classmethod
-    async def _handle_message(cls, msg: dict):
-        """Handle incoming WebSocket messages"""
+    def queues(cls) -> List[StreamQueue]:
+        queues = [stream.queue for stream in cls._streams.values()] + [cls._market_queue]
+        return [queue for queue in queues if queue is not None]
+    
+    @classmethod
+    def stream_stats(cls) -> Dict[str, Any]:
+        """Queue depth and drop counters per stream"""
+        stats = {queue.name: queue.stats() for queue in cls.queues()}
+        for stream in cls._streams.values():
+            if stream.name in stats:
+                stats[stream.name]['reconnect'] = stream.reconnect_stats.as_dict()
+        if 'market' in stats:
+            stats['market']['reconnect'] = MarketStreams.reconnect_stats.as_dict()
+        return stats
+    
+    @classmethod
+    async def track_symbol(cls, symbol: str, klines: bool = False):
+        """Stream a symbol's trades, and its klines when its indicators must stay live"""
+        await MarketStreams.add_symbols([symbol])
+        if klines:
+            await cls.ensure_kline_stream(symbol)
+    
+    @classmethod
+    async def ensure_kline_stream(cls, symbol: str):
+        """Subscribe to klines for a symbol so its indicators stay current"""
+        stream = f"{symbol.lower()}@kline_{TechnicalAnalyzer.KLINE_INTERVAL}"
+        # Nothing to subscribe on while replaying a capture
+        if symbol and cls._running and not MarketStreams.has_stream(stream):
+            await MarketStreams.add_streams([stream])
+            logger.info(f"Subscribed to {symbol} klines")
+    
+    @classmethod
+    def ensure_kline_stream_later(cls, symbol: str):
+        """``ensure_kline_stream`` in the background, for handlers that must not wait on it"""
+        task = asyncio.create_task(cls._ensure_kline_stream_logged(symbol))
+        cls._subscriptions.add(task)
+        task.add_done_callback(cls._subscriptions.discard)
+    
+    @classmethod
+    async def _ensure_kline_stream_logged(cls, symbol: str):
         try:
-            if msg.get('e') == 'ORDER_TRADE_UPDATE':
-                order = msg.get('o', {})
-                status = order.get('X')  # Order status
-                
-                if status in ['FILLED', 'PARTIALLY_FILLED']:
-                    await DiscordNotifier.send_trade_notification(msg)
-                    logger.info(f"Trade notification sent for order: {order.get('i')}")
-            
+            await cls.ensure_kline_stream(symbol)
         except Exception as e:
-            logger.error(f"Error processing message: {e}")
-            logger.error(f"Message content: {msg}")
-    
+            logger.error(f"Error subscribing to {symbol} klines: {e}")
+
     @classmethod
-    async def _connect_market_websocket(cls):
-        """Maintain market data WebSocket connection"""
-        while cls._running:
+    async def _warm_alert_indicators(cls):
+        for symbol, interval in AlertEngine.rsi_timeframes():
             try:
-                # Connect to multiple streams
-                streams = ["ethusdt@aggTrade", "xtzusdt@aggTrade"]
-                stream_path = "/".join(streams)
-                async with websockets.connect(f"{cls.WS_URL}/{stream_path}") as websocket:
-                    cls._market_ws = websocket
-                    logger.info("Market WebSocket connected")
-                    
-                    # Subscribe to streams
-                    subscribe_msg = {
-                        "method": "SUBSCRIBE",
-                        "params": streams,
-                        "id": 1
-                    }
-                    await websocket.send(json.dumps(subscribe_msg))
-                    
-                    while cls._running:
-                        try:
-                            message = await websocket.recv()
-                            await cls._handle_market_message(json.loads(message))
-                        except websockets.ConnectionClosed:
-                            break
-                        except Exception as e:
-                            logger.error(f"Error handling market message: {e}")
-                            
+                await TechnicalAnalyzer.ensure_indicators(symbol, [interval])
             except Exception as e:
-                logger.error(f"Market WebSocket connection error: {e}")
-                await asyncio.sleep(5)  # Wait before reconnecting
-
+                logger.error(f"Error warming up {symbol} {interval} indicators for alerts: {e}")
+    
+    @classmethod
+    def _on_position_symbols(cls, symbols: Set[str]):
+        # Another account may still hold a position in a symbol this one closed
+        if cls._running:
+            asyncio.create_task(cls._sync_mark_price_streams())
+    
+    @classmethod
+    async def _sync_mark_price_streams(cls):
+        """Stream mark prices only for symbols with an open position in some account"""
+        wanted = {
+            f"{symbol.lower()}@markPrice@1s"
+            for stream in cls._streams.values() for symbol, _ in stream.account.positions.positions
+        }
+        added, removed = wanted - cls._mark_streams, cls._mark_streams - wanted
+        cls._mark_streams = wanted
+        if added:
+            await MarketStreams.add_streams(sorted(added))
+        if removed:
+            await MarketStreams.remove_streams(sorted(removed))
+    
     @classmethod
     async def _handle_market_message(cls, msg: dict):
         """Handle market data messages"""
         try:
+            if 'stream' in msg:
+                # Combined stream envelope
+                msg = msg['data']
             if msg.get('e') == 'aggTrade':
-                symbol = msg.get('s', '').upper()  # Get symbol from message
-                if symbol in cls._current_prices:
-                    # Store previous price before updating
-                    cls._previous_prices[symbol] = cls._current_prices[symbol]
-                    cls._current_prices[symbol] = float(msg.get('p', 0))
+                symbol, price = msg.get('s', '').upper(), float(msg.get('p', 0))
+                MarketStreams.universe.update_price(symbol, price)
+                if LiveFeed.active('prices'):
+                    LiveFeed.publish('prices', symbol, {'symbol': symbol, 'price': price, 'time': msg.get('T')})
+            elif msg.get('e') == 'markPriceUpdate':
+                live = LiveFeed.active('positions')
+                for stream in cls._streams.values():
+                    stream.account.positions.on_mark_price(msg['s'], float(msg['p']))
+                    if live and stream.account.positions.get(msg['s']) is not None:
+                        LiveFeed.publish('positions', stream.account.name, stream.live_positions())
+            elif msg.get('e') == 'kline':
+                symbol = msg.get('s', '')
+                received_at = time.time()
+                # Higher timeframes are rolled up from the 1m stream
+                for kline in [msg['k'], *TimeframeAggregator.on_kline(symbol, msg['k'])]:
+                    KlineStore.on_kline(symbol, kline)
+                    if cls.warm_from_store:
+                        cls._warm_from_store(symbol, kline)
+                    IndicatorEngine.on_kline(symbol, kline, received_at)
         except Exception as e:
             logger.error(f"Error processing market message: {e}")
             logger.error(f"Message content: {msg}")
+        if 'error' in msg:
+            logger.error(f"Market stream request failed: {msg}")
 
     @classmethod
-    def _get_price_emoji(cls, symbol: str) -> str:
+    def _warm_from_store(cls, symbol: str, kline: Dict[str, Any]):
+        interval, open_time = kline['i'], int(kline['t'])
+        if IndicatorEngine.has_state(symbol, interval):
+            return
+        bars = KlineStore.get_buffer(symbol, interval).last()
+        # Everything before this kline; it is applied as usual right after
+        bars = bars[bars[:, OPEN_TIME] < open_time]
+        if len(bars) >= cls.STORE_WARMUP_BARS:
+            IndicatorEngine.warmup(symbol, interval, bars, open_time)
+            logger.info(f"Warmed up {symbol} {interval} indicators from {len(bars)} stored klines")
+
+    @staticmethod
+    def _get_price_emoji(current: Optional[float], previous: Optional[float]) -> str:
         """Get emoji based on price movement"""
-        current = cls._current_prices[symbol]
-        previous = cls._previous_prices[symbol]
-        
-        if previous is None or current is None:
+        if not previous or current is None:
             return "💰"  # Default emoji if no comparison possible
         
         if current > previous:
@@ -218,50 +644,94 @@ class BinanceWebsocketClient:
         """Send price updates every three minutes"""
         while cls._running:
             try:
+                fields = []
+                now_ms = int(time.time() * 1000)
+                
+                # Add price details for each symbol
+                for symbol, price, _ in MarketStreams.universe.items():
+                    if price is not None:
+                        windows = TickStats.get(symbol, now_ms) or {}
+                        # Direction over the first (shortest) rolling window, not since the previous tick
+                        emoji = cls._get_price_emoji(price, windows.get(WINDOWS[0], {}).get('open'))
+                        value_text = f"${price:,.4f}"
+                        
+                        # Add the move over each rolling window
+                        changes = [
+                            f"{w} {stats['change_pct']:+.2f}%"
+                            for w, stats in windows.items() if stats['change_pct'] is not None
+                        ]
+                        if changes:
+                            value_text += f"\n({' | '.join(changes)})"
+                        
+                        fields.append({
+                            "name": f"{emoji} {symbol}",
+                            "value": value_text,
+                            "inline": True
+                        })
+                
                 # Only send if we have at least one price
-                if any(price is not None for price in cls._current_prices.values()):
-                    # Create webhook
-                    webhook = DiscordWebhook(url=settings.DISCORD_WEBHOOK_URL)
-                    
-                    # Create embed
-                    embed = DiscordEmbed(
-                        title="💰 Price Updates",
-                        color="0000ff"
-                    )
-                    
-                    # Add price details for each symbol
-                    for symbol, price in cls._current_prices.items():
-                        if price is not None:
-                            emoji = cls._get_price_emoji(symbol)
-                            value_text = f"${price:,.4f}"
-                            
-                            # Add percentage change if previous price exists
-                            if cls._previous_prices[symbol] is not None:
-                                pct_change = ((price - cls._previous_prices[symbol]) / cls._previous_prices[symbol]) * 100
-                                value_text += f"\n({pct_change:+.2f}%)"
-                            
-                            embed.add_embed_field(
-                                name=f"{emoji} {symbol}",
-                                value=value_text,
-                                inline=True
-                            )
-                    
-                    # Add timestamp
-                    embed.set_timestamp(datetime.now())
-                    
-                    # Add footer
-                    embed.set_footer(text="B2D Trading Assistant")
-                    
-                    # Add webhook
-                    webhook.add_embed(embed)
-                    
-                    # Send webhook
-                    loop = asyncio.get_event_loop()
-                    await loop.run_in_executor(None, webhook.execute)
-                    
-                    logger.debug("Sent price updates")
+                for i in range(0, len(fields), cls.PRICE_FIELDS_PER_EMBED):
+                    DiscordNotifier.enqueue({
+                        "title": "💰 Price Updates",
+                        "color": 0x0000ff,
+                        "fields": fields[i:i + cls.PRICE_FIELDS_PER_EMBED],
+                        "timestamp": datetime.now(timezone.utc).isoformat(),
+                        "footer": DiscordNotifier.FOOTER,
+                    })
+                
+                if fields:
+                    logger.debug("Queued price updates")
                 
             except Exception as e:
                 logger.error(f"Error sending price update: {e}")
             
-            await asyncio.sleep(180)  # Wait for 3 minutes 
\ No newline at end of file
+            await asyncio.sleep(180)  # Wait for 3 minutes 
+
+def _stream_stat(field: str) -> Callable[[], Dict[tuple, float]]:
+    def read():
+        return {
+            (queue.name,): getattr(queue, field)() if field == 'depth' else getattr(queue, field)
+            for queue in BinanceWebsocketClient.queues()
+        }
+    return read
+
+
+metrics.CallbackMetric('b2d_stream_queue_depth', 'Frames waiting in the stream queue', 'gauge',
+                       _stream_stat('depth'), ['stream'])
+metrics.CallbackMetric('b2d_stream_dropped_total', 'Frames dropped by a full stream queue', 'counter',
+                       _stream_stat('dropped'), ['stream'])
+metrics.CallbackMetric('b2d_stream_conflated_total', 'Market frames replaced by a newer frame', 'counter',
+                       _stream_stat('conflated'), ['stream'])
+
+
+def _live_prices() -> Iterable[Tuple[str, Dict[str, Any]]]:
+    return [
+        (symbol, {'symbol': symbol, 'price': price, 'time': None})
+        for symbol, price, _ in MarketStreams.universe.items() if price is not None
+    ]
+
+
+def _live_accounts(payload: Callable[[UserStream], Dict[str, Any]]) -> Callable[[], Iterable[Tuple[str, Dict[str, Any]]]]:
+    def read():
+        return [(stream.account.name, payload(stream)) for stream in BinanceWebsocketClient.user_streams()]
+    return read
+
+
+MarketStreams.on_trade = BinanceWebsocketClient._on_trade
+
+# Current values sent to a client when it subscribes
+LiveFeed.snapshots['prices'] = _live_prices
+LiveFeed.snapshots['positions'] = _live_accounts(UserStream.live_positions)
+LiveFeed.snapshots['account'] = _live_accounts(UserStream.live_account)
+
+metrics.CallbackMetric('b2d_live_clients', 'Connected live feed clients', 'gauge', lambda: {
+    (transport,): sum(1 for c in LiveFeed.clients() if c.transport == transport) for transport in ('websocket', 'sse')
+}, ['transport'])
+metrics.CallbackMetric('b2d_live_dropped_total', 'Live feed messages dropped by a full client buffer', 'counter',
+                       lambda: LiveFeed.dropped + sum(c.queue.dropped for c in LiveFeed.clients()))
+metrics.CallbackMetric('b2d_live_conflated_total', 'Live feed messages replaced by a newer value', 'counter',
+                       lambda: LiveFeed.conflated + sum(c.queue.conflated for c in LiveFeed.clients()))
+metrics.CallbackMetric('b2d_reconnects_total', 'Websocket reconnects', 'counter', lambda: {
+    **{(s.name,): s.reconnect_stats.reconnects for s in BinanceWebsocketClient._streams.values()},
+    ('market',): MarketStreams.reconnect_stats.reconnects,
+}, ['stream'])
@@ -0,0 +1,419 @@
+"""
+Capture of raw websocket frames, and replay of captures through the stream handlers.
+
+Each stream is written to its own append-only log under CAPTURE_DIR/<stream>/.
+Frames are buffered with their receive time and sealed into zlib-compressed
+chunks, written on a background thread. A file is rotated by size or age, and
+each file has a fixed-width ``.idx`` index of its chunks (receive time range,
+offset), so a reader can seek to a point in time without decompressing what
+comes before it.
+
+File layout:
+    MAGIC, then per chunk: CHUNK_HEADER + zlib(RECORD_HEADER + frame, ...)
+
+Replay runs against a scratch DATA_DIR with notifications, journaling,
+analyses and alerts switched off, unless side effects are asked for (--send):
+    python -m app.websocket.capture data/capture --speed 10
+    python -m app.websocket.capture data/capture --streams market --speed max --start 2024-05-01T12:00
+"""
+import argparse
+import asyncio
+import bisect
+import glob
+import heapq
+import json
+import os
+import shutil
+import struct
+import tempfile
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from loguru import logger
+from app.core.config import settings
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+MAGIC = b'B2DCAP1\n'
+SUFFIX = '.b2dcap'
+# Compressed size, records, first and last receive time (microseconds)
+CHUNK_HEADER = struct.Struct('<IIqq')
+# First and last receive time (microseconds), chunk offset, records
+INDEX_ENTRY = struct.Struct('<qqQI')
+# Receive time (microseconds), frame size
+RECORD_HEADER = struct.Struct('<qI')
+
+
+class CaptureWriter:
+    """Chunked, compressed, append-only frame log for one stream"""
+
+    def __init__(self, directory: str, name: str, chunk_bytes: int, max_file_bytes: int,
+                 rotate_seconds: float, level: int = 6):
+        self.directory = os.path.join(directory, name)
+        self.name = name
+        self.chunk_bytes = chunk_bytes
+        self.max_file_bytes = max_file_bytes
+        self.rotate_seconds = rotate_seconds
+        self.level = level
+        self.frames = 0
+        self.chunks = 0
+        self.files = 0
+        self.bytes_written = 0
+        self._buffer = bytearray()
+        self._count = 0
+        self._first = 0
+        self._last = 0
+        # Compression and file I/O stay off the event loop, in chunk order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'capture-{name}')
+        self._file: Optional[BinaryIO] = None
+        self._index: Optional[BinaryIO] = None
+        self._opened_at = 0.0
+
+    def append(self, frame: Union[str, bytes], received_at: float):
+        data = frame.encode() if isinstance(frame, str) else frame
+        ts = int(received_at * 1_000_000)
+        if not self._count:
+            self._first = ts
+        self._last = ts
+        self._buffer += RECORD_HEADER.pack(ts, len(data))
+        self._buffer += data
+        self._count += 1
+        self.frames += 1
+        if len(self._buffer) >= self.chunk_bytes:
+            self.seal()
+
+    def seal(self) -> Optional[Future]:
+        """Hand the buffered frames to the writer thread as one chunk"""
+        if not self._count:
+            return None
+        chunk = (bytes(self._buffer), self._count, self._first, self._last)
+        self._buffer = bytearray()
+        self._count = 0
+        return self._executor.submit(self._write_chunk, *chunk)
+
+    def close(self):
+        """Write what is buffered and close the files; blocks until done"""
+        self.seal()
+        self._executor.submit(self._close_file)
+        self._executor.shutdown(wait=True)
+
+    def _rotate(self):
+        self._close_file()
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, f"{self.name}-{int(time.time() * 1000)}-{self.files:04d}")
+        self._file = open(base + SUFFIX, 'ab')
+        self._index = open(base + '.idx', 'ab')
+        self._file.write(MAGIC)
+        self._opened_at = time.time()
+        self.files += 1
+        logger.info(f"Capturing {self.name} stream to {base}{SUFFIX}")
+
+    def _close_file(self):
+        for f in (self._file, self._index):
+            if f:
+                f.close()
+        self._file = self._index = None
+
+    def _write_chunk(self, raw: bytes, count: int, first: int, last: int):
+        try:
+            compressed = zlib.compress(raw, self.level)
+            if (self._file is None
+                    or self._file.tell() + len(compressed) > self.max_file_bytes
+                    or time.time() - self._opened_at > self.rotate_seconds):
+                self._rotate()
+            offset = self._file.tell()
+            self._file.write(CHUNK_HEADER.pack(len(compressed), count, first, last))
+            self._file.write(compressed)
+            self._file.flush()
+            # The index only ever points at complete chunks
+            self._index.write(INDEX_ENTRY.pack(first, last, offset, count))
+            self._index.flush()
+            self.chunks += 1
+            self.bytes_written += CHUNK_HEADER.size + len(compressed)
+        except Exception as e:
+            logger.error(f"Error writing {self.name} capture chunk: {e}")
+
+
+class CaptureReader:
+    """Reads one stream's capture files in receive order"""
+
+    def __init__(self, directory: str, name: str):
+        self.name = name
+        self.paths = sorted(glob.glob(os.path.join(directory, name, f"{name}-*{SUFFIX}")))
+
+    @staticmethod
+    def _scan(path: str) -> List[Tuple[int, int, int, int]]:
+        """Rebuild a file's index from its chunk headers"""
+        entries = []
+        with open(path, 'rb') as f:
+            offset = len(MAGIC)
+            f.seek(offset)
+            while True:
+                header = f.read(CHUNK_HEADER.size)
+                if len(header) < CHUNK_HEADER.size:
+                    break
+                size, count, first, last = CHUNK_HEADER.unpack(header)
+                entries.append((first, last, offset, count))
+                offset += CHUNK_HEADER.size + size
+                f.seek(offset)
+        return entries
+
+    @classmethod
+    def index(cls, path: str) -> List[Tuple[int, int, int, int]]:
+        """(first us, last us, offset, records) per chunk"""
+        index_path = path[:-len(SUFFIX)] + '.idx'
+        if not os.path.exists(index_path):
+            return cls._scan(path)
+        with open(index_path, 'rb') as f:
+            raw = f.read()
+        usable = len(raw) - len(raw) % INDEX_ENTRY.size
+        return [INDEX_ENTRY.unpack_from(raw, i) for i in range(0, usable, INDEX_ENTRY.size)]
+
+    def frames(self, start: Optional[float] = None, end: Optional[float] = None) -> Iterator[Tuple[float, str]]:
+        """(receive time, frame) received in [start, end), seeking to the first chunk that can contain start"""
+        start_us = int(start * 1_000_000) if start is not None else None
+        end_us = int(end * 1_000_000) if end is not None else None
+        for path in self.paths:
+            entries = self.index(path)
+            if not entries:
+                continue
+            if end_us is not None and entries[0][0] >= end_us:
+                return
+            i = bisect.bisect_left([e[1] for e in entries], start_us) if start_us is not None else 0
+            with open(path, 'rb') as f:
+                for first, last, offset, count in entries[i:]:
+                    if end_us is not None and first >= end_us:
+                        return
+                    f.seek(offset)
+                    size = CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))[0]
+                    try:
+                        raw = zlib.decompress(f.read(size))
+                    except zlib.error as e:
+                        logger.error(f"Skipping rest of {path}: {e}")
+                        break
+                    pos = 0
+                    for _ in range(count):
+                        ts, length = RECORD_HEADER.unpack_from(raw, pos)
+                        pos += RECORD_HEADER.size
+                        if (start_us is None or ts >= start_us) and (end_us is None or ts < end_us):
+                            yield ts / 1_000_000, raw[pos:pos + length].decode()
+                        pos += length
+
+
+class StreamCapture:
+    """Raw frame capture for the websocket readers, enabled with CAPTURE_ENABLED"""
+    _writers: Dict[str, CaptureWriter] = {}
+    _flush_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def directory(cls) -> str:
+        return settings.CAPTURE_DIR or os.path.join(settings.DATA_DIR, 'capture')
+
+    @classmethod
+    def start(cls):
+        if cls._flush_task or not settings.CAPTURE_ENABLED:
+            return
+        cls._flush_task = asyncio.create_task(cls._flush_loop())
+        logger.info(f"Capturing raw websocket frames to {cls.directory()}")
+
+    @classmethod
+    async def stop(cls):
+        if not cls._flush_task:
+            return
+        cls._flush_task.cancel()
+        cls._flush_task = None
+        for writer in cls._writers.values():
+            await asyncio.to_thread(writer.close)
+        cls._writers = {}
+
+    @classmethod
+    def record(cls, stream: str, frame: Union[str, bytes], received_at: float):
+        if cls._flush_task is None:
+            return
+        writer = cls._writers.get(stream)
+        if writer is None:
+            writer = cls._writers[stream] = CaptureWriter(
+                cls.directory(), stream, settings.CAPTURE_CHUNK_BYTES,
+                settings.CAPTURE_MAX_FILE_BYTES, settings.CAPTURE_ROTATE_SECONDS,
+            )
+        writer.append(frame, received_at)
+
+    @classmethod
+    async def _flush_loop(cls):
+        """Seal partial chunks so a quiet stream is still on disk within CAPTURE_FLUSH_INTERVAL"""
+        while True:
+            await asyncio.sleep(settings.CAPTURE_FLUSH_INTERVAL)
+            for writer in cls._writers.values():
+                writer.seal()
+
+    @classmethod
+    def status(cls) -> Dict[str, Any]:
+        return {
+            'enabled': cls._flush_task is not None,
+            'streams': {
+                name: {'frames': w.frames, 'chunks': w.chunks, 'files': w.files, 'bytes': w.bytes_written}
+                for name, w in cls._writers.items()
+            },
+        }
+
+
+@contextmanager
+def isolated():
+    """
+    Give the replayed handlers scratch state (DATA_DIR, kline buffers,
+    indicators, tick stats, accounts, a notifier of their own) and switch off
+    everything that reaches outside the process (Discord posts, the trade
+    journal, analyses, alerts, new subscriptions) until the block exits.
+    Notifications are still built, merged and packed; only the post is skipped.
+    """
+    from app.services.account_state import AccountSnapshot
+    from app.services.alerts import AlertEngine
+    from app.services.analysis_pipeline import TradeAnalysisPipeline
+    from app.services.discord_notifier import DiscordNotifier
+    from app.services.indicators import IndicatorEngine
+    from app.services.kline_store import KlineStore
+    from app.services.positions import PositionBook
+    from app.services.tick_stats import TickStats
+    from app.services.timeframes import TimeframeAggregator
+    from app.services.trade_journal import TradeJournal
+    from app.websocket.binance_client import BinanceWebsocketClient
+    from app.websocket.fanout import LiveFeed
+
+    def skip(*args, **kwargs):
+        return None
+
+    async def skip_async(*args, **kwargs):
+        return None
+
+    scratch = tempfile.mkdtemp(prefix='b2d-replay-')
+    replaced = [
+        (settings, 'DATA_DIR', scratch),
+        (KlineStore, '_buffers', {}),
+        (IndicatorEngine, '_states', {}),
+        (TimeframeAggregator, '_buckets', {}),
+        (TickStats, '_stats', {}),
+        (LiveFeed, 'recent', deque(maxlen=LiveFeed.RECENT)),
+        # Accounts (and their snapshot and position book) are created afresh by user_streams()
+        (BinanceWebsocketClient, '_streams', {}),
+        (AccountSnapshot, '_default', None),
+        (PositionBook, '_default', None),
+        (DiscordNotifier, '_queue', None),
+        (DiscordNotifier, '_session', None),
+        (DiscordNotifier, '_worker_task', None),
+        (DiscordNotifier, '_outbox', {}),
+        (DiscordNotifier, '_senders', {}),
+        (DiscordNotifier, '_pending_fills', {}),
+        (DiscordNotifier, '_pending_timers', {}),
+        (DiscordNotifier, '_bucket_reset_at', {}),
+        (DiscordNotifier, '_post', staticmethod(skip_async)),
+        (TradeJournal, 'record', staticmethod(skip)),
+        (TradeAnalysisPipeline, 'submit', staticmethod(skip)),
+        (AlertEngine, 'on_trade', staticmethod(skip)),
+        (BinanceWebsocketClient, 'ensure_kline_stream', staticmethod(skip_async)),
+    ]
+    # Class attributes are saved raw so classmethods are restored as such
+    saved = [(obj, name, vars(obj)[name] if isinstance(obj, type) else getattr(obj, name)) for obj, name, _ in replaced]
+    for obj, name, value in replaced:
+        setattr(obj, name, value)
+    try:
+        yield scratch
+    finally:
+        for obj, name, value in saved:
+            setattr(obj, name, value)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+async def replay(directory: str, streams: Iterable[str] = ('user', 'market'), speed: Optional[float] = 1.0,
+                 start: Optional[float] = None, end: Optional[float] = None,
+                 handlers: Optional[Dict[str, Callable[[dict], Awaitable[Any]]]] = None,
+                 side_effects: bool = False) -> int:
+    """
+    Feed captured frames through the stream handlers in receive order, keeping
+    the original spacing divided by ``speed`` (``None`` replays as fast as
+    possible). Returns the number of frames replayed. Unless ``side_effects``
+    is set, this runs ``isolated()`` from the live state and the outside world.
+
+    Indicators have no REST warmup here; each (symbol, timeframe) starts once
+    enough replayed klines are stored, so a capture should start at least
+    ``BinanceWebsocketClient.STORE_WARMUP_BARS`` bars before the part of
+    interest.
+    """
+    from app.websocket.binance_client import BinanceWebsocketClient
+    if not side_effects:
+        from app.services.discord_notifier import DiscordNotifier
+        with isolated():
+            await DiscordNotifier.start()
+            try:
+                return await replay(directory, streams, speed, start, end, handlers, side_effects=True)
+            finally:
+                await DiscordNotifier.stop()
+    if handlers is None:
+        handlers = BinanceWebsocketClient.replay_handlers()
+    def tagged(name: str) -> Iterator[Tuple[float, str, str]]:
+        # A function, so each stream keeps its own name (a nested generator would see the last one)
+        return ((ts, name, frame) for ts, frame in CaptureReader(directory, name).frames(start, end))
+
+    merged = heapq.merge(*(tagged(name) for name in streams), key=lambda item: item[0])
+
+    loop = asyncio.get_running_loop()
+    origin: Optional[Tuple[float, float]] = None
+    count = 0
+    BinanceWebsocketClient.warm_from_store = True
+    try:
+        for ts, name, frame in merged:
+            if speed:
+                if origin is None:
+                    origin = (loop.time(), ts)
+                delay = origin[0] + (ts - origin[1]) / speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await handlers[name](json.loads(frame))
+            count += 1
+            if not speed and count % 1000 == 0:
+                # Let queued notifications and other tasks make progress
+                await asyncio.sleep(0)
+    finally:
+        BinanceWebsocketClient.warm_from_store = False
+    return count
+
+
+def _timestamp(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+async def _main(args):
+    from app.services.alerts import AlertEngine
+    from app.services.discord_notifier import DiscordNotifier
+    from app.services.trade_journal import TradeJournal
+    if args.send:
+        AlertEngine.load()
+        await asyncio.gather(TradeJournal.start(), DiscordNotifier.start())
+    speed = None if args.speed == 'max' else float(args.speed)
+    started = time.perf_counter()
+    count = await replay(args.directory, args.streams.split(','), speed, _timestamp(args.start), _timestamp(args.end),
+                         side_effects=args.send)
+    elapsed = time.perf_counter() - started
+    if args.send:
+        await TradeJournal.stop()
+        await AlertEngine.stop()
+        await DiscordNotifier.stop()
+    logger.info(f"Replayed {count} frames in {elapsed:.2f}s ({count / elapsed if elapsed else 0:,.0f}/s)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay captured websocket frames through the stream handlers")
+    parser.add_argument('directory', help='capture directory (CAPTURE_DIR)')
+    parser.add_argument('--streams', default='user,market')
+    parser.add_argument('--speed', default='1', help="playback speed multiplier, or 'max'")
+    parser.add_argument('--start', help='ISO time to start from (UTC unless an offset is given)')
+    parser.add_argument('--end', help='ISO time to stop at')
+    parser.add_argument('--send', action='store_true',
+                        help='apply the replay to DATA_DIR and deliver Discord notifications, alerts and journal entries')
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,166 @@
+import itertools
+import json
+import time
+from collections import deque
+from app.core.config import settings
+from app.websocket.pipeline import ConflatingQueue
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+# Topic -> whether a newer message replaces a queued one with the same key.
+# Keys are the symbol for prices and the account name for the others.
+TOPICS: Dict[str, bool] = {
+    'prices': True,
+    'positions': True,
+    'account': True,
+    'fills': False,
+}
+
+
+def parse_topics(topics: Iterable[str]) -> Set[str]:
+    """Validate subscriptions: a whole topic (``prices``) or one key of it (``prices:ETHUSDT``)"""
+    parsed = set()
+    for topic in topics:
+        topic = topic.strip()
+        if not topic:
+            continue
+        name, _, key = topic.partition(':')
+        if name not in TOPICS:
+            raise ValueError(f"Unknown topic {name!r} (one of {', '.join(TOPICS)})")
+        if name == 'prices':
+            key = key.upper()
+        parsed.add(f"{name}:{key}" if key else name)
+    return parsed
+
+
+class LiveClient:
+    """One connected dashboard: its subscriptions and its own bounded buffer"""
+    __slots__ = ('id', 'transport', 'topics', 'queue', 'connected_at')
+
+    def __init__(self, client_id: int, transport: str, topics: Set[str]):
+        self.id = client_id
+        self.transport = transport
+        self.topics = topics
+        # Items are (topic, encoded frame)
+        self.queue = ConflatingQueue(f"live-{client_id}", settings.LIVE_CLIENT_BUFFER)
+        self.connected_at = time.time()
+
+    def wants(self, topic: str, key: str) -> bool:
+        return topic in self.topics or f"{topic}:{key}" in self.topics
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'transport': self.transport,
+            'topics': sorted(self.topics),
+            'connected_seconds': round(time.time() - self.connected_at, 1),
+            **self.queue.stats(),
+        }
+
+
+class LiveFeed:
+    """
+    Re-broadcasts data the service already receives (trade prices, fills,
+    account and position updates) to WebSocket and SSE clients.
+
+    ``publish`` is synchronous and never waits on a client: the message is
+    encoded once and put into each subscriber's own ``ConflatingQueue``, where
+    a newer price or snapshot replaces the queued one and a full buffer drops
+    its oldest item. A slow client only falls behind on its own buffer while
+    the stream consumers and the other clients carry on.
+    """
+    _clients: Dict[int, LiveClient] = {}
+    _ids = itertools.count(1)
+    # Topics at least one client subscribes to, so unwatched data is never encoded
+    _active: Set[str] = set()
+    # Topic -> current values as (key, data), sent to new subscribers
+    snapshots: Dict[str, Callable[[], Iterable[Tuple[str, Any]]]] = {}
+    published = 0
+    # Latest messages of topics that are not conflated (fills), as (seq, topic, key, data),
+    # kept whether or not anyone listens so other workers can mirror them
+    RECENT = 256
+    recent: Deque[Tuple[int, str, str, Any]] = deque(maxlen=RECENT)
+    _seq = itertools.count(1)
+    # Buffer counters of clients that have disconnected
+    dropped = 0
+    conflated = 0
+
+    @classmethod
+    def connect(cls, transport: str, topics: Set[str]) -> Optional[LiveClient]:
+        """Register a client, or None when LIVE_MAX_CLIENTS are already connected"""
+        if len(cls._clients) >= settings.LIVE_MAX_CLIENTS:
+            return None
+        client = LiveClient(next(cls._ids), transport, set())
+        cls._clients[client.id] = client
+        cls.subscribe(client, topics)
+        return client
+
+    @classmethod
+    def disconnect(cls, client: LiveClient):
+        if cls._clients.pop(client.id, None) is not None:
+            cls.dropped += client.queue.dropped
+            cls.conflated += client.queue.conflated
+            cls._refresh_active()
+
+    @classmethod
+    def subscribe(cls, client: LiveClient, topics: Set[str]):
+        added = topics - client.topics
+        client.topics |= added
+        cls._refresh_active()
+        for topic in added:
+            name, _, key = topic.partition(':')
+            provider = cls.snapshots.get(name)
+            for item_key, data in provider() if provider else ():
+                if not key or item_key == key:
+                    client.queue.put_nowait((name, cls._encode(name, item_key, data)), (name, item_key))
+
+    @classmethod
+    def unsubscribe(cls, client: LiveClient, topics: Set[str]):
+        client.topics -= topics
+        cls._refresh_active()
+
+    @classmethod
+    def _refresh_active(cls):
+        cls._active = {topic.partition(':')[0] for client in cls._clients.values() for topic in client.topics}
+
+    @classmethod
+    def active(cls, topic: str) -> bool:
+        """Whether anyone listens to a topic; lets publishers skip building the payload"""
+        return topic in cls._active
+
+    @staticmethod
+    def _encode(topic: str, key: str, data: Any) -> str:
+        return json.dumps({'topic': topic, 'key': key, 'data': data}, default=str)
+
+    @classmethod
+    def publish(cls, topic: str, key: str, data: Any):
+        if not TOPICS[topic]:
+            cls.recent.append((next(cls._seq), topic, key, data))
+        if topic not in cls._active:
+            return
+        frame = None
+        conflation_key = (topic, key) if TOPICS[topic] else None
+        for client in cls._clients.values():
+            if client.wants(topic, key):
+                if frame is None:
+                    frame = cls._encode(topic, key, data)
+                client.queue.put_nowait((topic, frame), conflation_key)
+        if frame is not None:
+            cls.published += 1
+
+    @classmethod
+    def reply(cls, client: LiveClient, data: Dict[str, Any]):
+        """Queue a control message (subscription change, error) for one client"""
+        client.queue.put_nowait(('control', json.dumps(data)))
+
+    @classmethod
+    def clients(cls) -> List[LiveClient]:
+        return list(cls._clients.values())
+
+    @classmethod
+    def status(cls) -> Dict[str, Any]:
+        return {
+            'clients': len(cls._clients),
+            'capacity': settings.LIVE_MAX_CLIENTS,
+            'published': cls.published,
+            'topics': sorted(cls._active),
+        }
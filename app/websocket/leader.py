@@ -0,0 +1,373 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import time
+import aiohttp
+from loguru import logger
+from app.core.config import settings
+from app.services.shared_state import SharedState
+from app.websocket.binance_client import BinanceWebsocketClient, UserStream
+from app.websocket.fanout import LiveFeed
+from app.websocket.market_streams import MarketStreams
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Headers that belong to one hop and are not passed between a follower, the leader and the app
+HOP_HEADERS = {'host', 'connection', 'keep-alive', 'content-length', 'transfer-encoding', 'content-encoding'}
+# A new leader backfills fills from where the previous one stopped if it published this recently (seconds)
+RESUME_WINDOW = 300
+
+
+class Leadership:
+    """
+    Multi-worker mode (WORKERS > 1). Every worker tries to take an exclusive
+    ``fcntl`` lock on DATA_DIR/leader.lock. The one holding it runs
+    ``BinanceWebsocketClient`` (so there is one set of streams and one
+    notifier) and publishes prices, positions, account snapshots and status to
+    the ``SharedState`` segment every LEADER_PUBLISH_INTERVAL.
+
+    The other workers serve those reads and their own live feed clients from
+    the segment, forward the rest of the API to the leader over a unix socket,
+    and keep retrying the lock. The kernel releases it however the leader's
+    process ends, so the next worker to retry takes over, resuming the user
+    streams from the old leader's last publish. The leader also publishes as
+    soon as it handles a fill, before notifying it, so a successor's backfill
+    skips every fill that may already have been notified; a fill whose
+    notification was still queued when the leader died is not sent at all.
+    """
+    role = 'single'
+    elected_at: Optional[float] = None
+    _lock_fd: Optional[int] = None
+    _state: Optional[SharedState] = None
+    _app = None
+    _tasks: List[asyncio.Task] = []
+    # Leader: server for forwarded requests and the in-process client calling the app
+    _forward_runner = None
+    _forward_client = None
+    # Follower: connection to the leader's socket
+    _forward_session: Optional[aiohttp.ClientSession] = None
+    # Live feed providers replaced while following
+    _live_snapshots: Dict[str, Any] = {}
+    # Section name -> (change key, encoded JSON) for large documents
+    _encoded: Dict[str, Tuple[Any, bytes]] = {}
+
+    @staticmethod
+    def state_path() -> str:
+        if settings.SHARED_STATE_PATH:
+            return settings.SHARED_STATE_PATH
+        if os.path.isdir('/dev/shm'):
+            # One segment per deployment (data directory) on the host
+            digest = hashlib.sha1(os.path.abspath(settings.DATA_DIR).encode()).hexdigest()[:8]
+            return f"/dev/shm/b2d-state-{digest}"
+        return os.path.join(settings.DATA_DIR, 'shared-state')
+
+    @staticmethod
+    def socket_path() -> str:
+        return os.path.join(settings.DATA_DIR, 'leader.sock')
+
+    @classmethod
+    def is_follower(cls) -> bool:
+        return cls.role == 'follower'
+
+    @classmethod
+    async def start(cls, app):
+        if settings.WORKERS <= 1:
+            await BinanceWebsocketClient.initialize()
+            return
+        cls._app = app
+        os.makedirs(settings.DATA_DIR, exist_ok=True)
+        cls._lock_fd = os.open(os.path.join(settings.DATA_DIR, 'leader.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        cls._state = SharedState(cls.state_path(), settings.SHARED_STATE_BYTES)
+        if cls._try_lock():
+            await cls._lead()
+        else:
+            cls._follow()
+
+    @classmethod
+    async def stop(cls):
+        for task in cls._tasks:
+            task.cancel()
+        cls._tasks = []
+        if cls.role == 'leader':
+            BinanceWebsocketClient.on_fill = None
+            # Leave the latest resume points for whoever takes over
+            try:
+                cls._state.publish(cls._prices(), cls._sections())
+            except Exception as e:
+                logger.error(f"Error publishing shared state: {e}")
+        if cls.role != 'follower':
+            await BinanceWebsocketClient.cleanup()
+        if cls._forward_runner:
+            await cls._forward_runner.cleanup()
+            await cls._forward_client.aclose()
+        if cls._forward_session:
+            await cls._forward_session.close()
+        if cls._lock_fd is not None:
+            # Closing the descriptor releases the lock
+            os.close(cls._lock_fd)
+            cls._lock_fd = None
+
+    @classmethod
+    def _try_lock(cls) -> bool:
+        try:
+            fcntl.flock(cls._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        os.ftruncate(cls._lock_fd, 0)
+        os.pwrite(cls._lock_fd, f"{os.getpid()}\n".encode(), 0)
+        return True
+
+    # -- Leader -------------------------------------------------------------
+
+    @classmethod
+    async def _lead(cls):
+        cls.role = 'leader'
+        cls.elected_at = time.time()
+        logger.info(f"Worker {os.getpid()} is the stream leader")
+        BinanceWebsocketClient.on_fill = cls._publish_fill
+        await BinanceWebsocketClient.initialize(cls._resume_points())
+        await cls._serve_forwarded()
+        cls._tasks.append(asyncio.create_task(cls._publish()))
+
+    @classmethod
+    def _resume_points(cls) -> Dict[str, Dict[str, Any]]:
+        """Where the previous leader's user streams stopped, from its last publish"""
+        snapshot = cls._state.read()
+        if snapshot is None or snapshot.age() > RESUME_WINDOW:
+            return {}
+        resume = {name: dict(point) for name, point in (cls._state.section('resume') or {}).items()}
+        # Fills it already handled, so the backfill overlap is not notified twice
+        for _, topic, account, fill in cls._state.section('fills') or []:
+            if topic == 'fills' and account in resume:
+                resume[account].setdefault('trades', []).append((fill['symbol'], fill['trade_id']))
+        if resume:
+            logger.info(f"Resuming user streams from the previous leader (pid {snapshot.pid})")
+        return resume
+
+    @classmethod
+    async def _serve_forwarded(cls):
+        """Answer requests forwarded by followers, on a unix socket, by calling the app in-process"""
+        import httpx
+        from aiohttp import web
+
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=cls._app), base_url='http://leader',
+            timeout=settings.LEADER_FORWARD_TIMEOUT,
+        )
+
+        async def forward(request: web.Request) -> web.Response:
+            response = await client.request(
+                request.method, request.path_qs, content=await request.read(),
+                headers=[(k, v) for k, v in request.headers.items() if k.lower() not in HOP_HEADERS],
+            )
+            return web.Response(status=response.status_code, body=response.content, headers=[
+                (k, v) for k, v in response.headers.multi_items() if k.lower() not in HOP_HEADERS
+            ])
+
+        server = web.Application(client_max_size=16 * 1024 * 1024)
+        server.router.add_route('*', '/{path:.*}', forward)
+        runner = web.AppRunner(server, access_log=None)
+        await runner.setup()
+        path = cls.socket_path()
+        if os.path.exists(path):
+            # Left behind by a previous leader; only the lock holder gets here
+            os.unlink(path)
+        await web.UnixSite(runner, path).start()
+        cls._forward_runner, cls._forward_client = runner, client
+
+    @classmethod
+    def _prices(cls) -> List[Tuple[str, Optional[float], Optional[float]]]:
+        return list(MarketStreams.universe.items())
+
+    @classmethod
+    def _encode_once(cls, name: str, key: Any, doc: Any) -> bytes:
+        cached = cls._encoded.get(name)
+        if cached is None or cached[0] != key:
+            cached = cls._encoded[name] = (key, json.dumps(doc, default=str, separators=(',', ':')).encode())
+        return cached[1]
+
+    @classmethod
+    def _sections(cls) -> Dict[str, Any]:
+        streams = BinanceWebsocketClient.user_streams()
+        sections: Dict[str, Any] = {
+            'status': BinanceWebsocketClient.status(),
+            'ready': {
+                'checks': BinanceWebsocketClient.readiness(),
+                'startup': BinanceWebsocketClient.startup_stats(),
+            },
+            'market': MarketStreams.status(),
+            'fills': list(LiveFeed.recent),
+            'resume': {s.account.name: {'last_event_time': s.last_event_time} for s in streams},
+        }
+        for stream in streams:
+            name, snapshot = stream.account.name, stream.account.snapshot
+            # The full account document is large and only changes with events and resyncs
+            sections[f"account:{name}"] = cls._encode_once(
+                f"account:{name}", (snapshot.updated_at, snapshot.synced_at), snapshot.account
+            )
+            sections[f"snapshot:{name}"] = stream.snapshot_status()
+            sections[f"positions:{name}"] = stream.live_positions()
+        return sections
+
+    @classmethod
+    async def _publish(cls):
+        while True:
+            try:
+                cls._state.publish(cls._prices(), cls._sections())
+            except Exception as e:
+                logger.error(f"Error publishing shared state: {e}")
+            await asyncio.sleep(settings.LEADER_PUBLISH_INTERVAL)
+
+    @classmethod
+    def _publish_fill(cls):
+        """Publish right away, so the fill just handled is in the resume point before it is notified"""
+        try:
+            cls._state.publish(cls._prices(), cls._sections())
+        except Exception as e:
+            logger.error(f"Error publishing shared state: {e}")
+
+    # -- Followers ----------------------------------------------------------
+
+    @classmethod
+    def _follow(cls):
+        cls.role = 'follower'
+        cls._live_snapshots = dict(LiveFeed.snapshots)
+        LiveFeed.snapshots.update(
+            prices=lambda: [
+                (symbol, {'symbol': symbol, 'price': price, 'time': None})
+                for symbol, price, _ in cls._state.prices() if price is not None
+            ],
+            positions=lambda: cls._shared_live('positions'),
+            account=lambda: cls._shared_live('account'),
+        )
+        cls._tasks = [asyncio.create_task(cls._mirror()), asyncio.create_task(cls._elect())]
+        logger.info(f"Worker {os.getpid()} is following the stream leader")
+
+    @classmethod
+    async def _elect(cls):
+        """Take over once the leader's lock is released, i.e. its process is gone"""
+        while not cls._try_lock():
+            await asyncio.sleep(settings.LEADER_RETRY_INTERVAL)
+        logger.warning(f"Stream leader is gone; worker {os.getpid()} is taking over")
+        for task in cls._tasks:
+            if task is not asyncio.current_task():
+                task.cancel()
+        cls._tasks = []
+        LiveFeed.snapshots.update(cls._live_snapshots)
+        # Fills mirrored so far were numbered by the old leader
+        LiveFeed.recent.clear()
+        if cls._forward_session:
+            await cls._forward_session.close()
+            cls._forward_session = None
+        await cls._lead()
+
+    @classmethod
+    def shared(cls, section: str) -> Any:
+        """A section of the leader's latest publish, or None"""
+        return cls._state.section(section)
+
+    @classmethod
+    def shared_prices(cls) -> List[Tuple[str, Optional[float], Optional[float]]]:
+        return cls._state.prices()
+
+    @classmethod
+    def _live_payload(cls, topic: str, name: str) -> Optional[Dict[str, Any]]:
+        if topic == 'positions':
+            return cls.shared(f"positions:{name}")
+        status = cls.shared(f"snapshot:{name}")
+        return None if status is None else UserStream.account_summary(cls.shared(f"account:{name}"), status)
+
+    @classmethod
+    def _shared_live(cls, topic: str) -> List[Tuple[str, Dict[str, Any]]]:
+        items = []
+        for stream in BinanceWebsocketClient.user_streams():
+            payload = cls._live_payload(topic, stream.account.name)
+            if payload is not None:
+                items.append((stream.account.name, payload))
+        return items
+
+    @classmethod
+    async def _mirror(cls):
+        """Feed this worker's live clients from the leader's publishes"""
+        prices: Dict[str, float] = {}
+        versions: Dict[Any, Any] = {}
+        leader: Optional[int] = None
+        last_fill = 0
+        names = [stream.account.name for stream in BinanceWebsocketClient.user_streams()]
+        while True:
+            await asyncio.sleep(settings.LEADER_PUBLISH_INTERVAL)
+            try:
+                snapshot = cls._state.read()
+                if snapshot is None:
+                    continue
+                fills = snapshot.section('fills') or []
+                if snapshot.pid != leader:
+                    # A new leader numbers fills from 1; on the first read, skip fills sent before we started
+                    last_fill = 0 if leader is not None else max((seq for seq, *_ in fills), default=0)
+                    leader = snapshot.pid
+                if LiveFeed.active('prices'):
+                    rows = snapshot.price_rows()
+                    if not snapshot.valid():
+                        continue
+                    for symbol, price, _ in rows:
+                        if price is not None and prices.get(symbol) != price:
+                            prices[symbol] = price
+                            LiveFeed.publish('prices', symbol, {'symbol': symbol, 'price': price, 'time': None})
+                for topic, sections in (('positions', ('positions',)), ('account', ('account', 'snapshot'))):
+                    if not LiveFeed.active(topic):
+                        continue
+                    for name in names:
+                        version = tuple(snapshot.version(f"{section}:{name}") for section in sections)
+                        if versions.get((topic, name)) != version:
+                            versions[(topic, name)] = version
+                            payload = cls._live_payload(topic, name)
+                            if payload is not None:
+                                LiveFeed.publish(topic, name, payload)
+                for seq, topic, key, data in fills:
+                    if seq > last_fill:
+                        last_fill = seq
+                        LiveFeed.publish(topic, key, data)
+            except BufferError:
+                # The leader overwrote the slot mid-read; the next round reads the new one
+                continue
+            except Exception as e:
+                logger.error(f"Error mirroring shared state: {e}")
+
+    @classmethod
+    async def forward(cls, method: str, path: str, headers: Iterable[Tuple[str, str]],
+                      body: bytes) -> Tuple[int, List[Tuple[str, str]], bytes]:
+        """Send a request to the leader; raises aiohttp.ClientError or OSError if it cannot be reached"""
+        if cls._forward_session is None:
+            cls._forward_session = aiohttp.ClientSession(
+                # A new leader replaces the socket, so connections are not reused
+                connector=aiohttp.UnixConnector(path=cls.socket_path(), force_close=True),
+                timeout=aiohttp.ClientTimeout(total=settings.LEADER_FORWARD_TIMEOUT),
+                auto_decompress=False,
+            )
+        async with cls._forward_session.request(
+            method, f"http://leader{path}", data=body,
+            headers=[(k, v) for k, v in headers if k.lower() not in HOP_HEADERS],
+        ) as response:
+            return response.status, [
+                (k, v) for k, v in response.headers.items() if k.lower() not in HOP_HEADERS
+            ], await response.read()
+
+    @classmethod
+    def leader_alive(cls) -> bool:
+        snapshot = cls._state.read() if cls._state else None
+        return snapshot is not None and snapshot.age() < settings.LEADER_STALE_AFTER
+
+    @classmethod
+    def status(cls) -> Dict[str, Any]:
+        status: Dict[str, Any] = {'role': cls.role, 'pid': os.getpid(), 'workers': settings.WORKERS}
+        if cls.elected_at:
+            status['elected_at'] = cls.elected_at
+        snapshot = cls._state.read() if cls._state else None
+        if snapshot is not None:
+            status['leader'] = {
+                'pid': snapshot.pid,
+                'publishes': snapshot.publishes,
+                'publish_age_seconds': round(snapshot.age(), 3),
+            }
+        return status
@@ -0,0 +1,304 @@
+import asyncio
+import itertools
+import json
+import time
+import numpy as np
+import websockets
+from loguru import logger
+from app.core.config import settings
+from app.services.binance_rest import BinanceRestClient
+from app.websocket.capture import StreamCapture
+from app.websocket.pipeline import ConflatingQueue, market_conflation_key, trade_fields
+from app.websocket.reconnect import Backoff, ReconnectStats, missed_kline_frames
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+class SymbolUniverse:
+    """
+    Runtime-configurable set of tracked symbols. Each symbol owns a slot in
+    flat float64 arrays holding its latest and previous trade price (NaN until
+    the first trade); freed slots are reused.
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.index: Dict[str, int] = {}
+        self.symbols: List[Optional[str]] = [None] * capacity
+        self.prices = np.full(capacity, np.nan)
+        self.previous = np.full(capacity, np.nan)
+        self._free: List[int] = list(range(capacity - 1, -1, -1))
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def _grow(self):
+        old = len(self.symbols)
+        self.symbols.extend([None] * old)
+        self.prices = np.concatenate([self.prices, np.full(old, np.nan)])
+        self.previous = np.concatenate([self.previous, np.full(old, np.nan)])
+        self._free.extend(range(2 * old - 1, old - 1, -1))
+
+    def add(self, symbol: str) -> int:
+        if symbol in self.index:
+            return self.index[symbol]
+        if not self._free:
+            self._grow()
+        i = self._free.pop()
+        self.index[symbol] = i
+        self.symbols[i] = symbol
+        self.prices[i] = self.previous[i] = np.nan
+        return i
+
+    def remove(self, symbol: str):
+        i = self.index.pop(symbol, None)
+        if i is not None:
+            self.symbols[i] = None
+            self._free.append(i)
+
+    def update_price(self, symbol: str, price: float) -> bool:
+        i = self.index.get(symbol)
+        if i is None:
+            return False
+        self.previous[i] = self.prices[i]
+        self.prices[i] = price
+        return True
+
+    def price(self, symbol: str) -> Optional[float]:
+        i = self.index.get(symbol)
+        if i is None or np.isnan(self.prices[i]):
+            return None
+        return float(self.prices[i])
+
+    def items(self) -> Iterator[Tuple[str, Optional[float], Optional[float]]]:
+        """(symbol, price, previous price) in symbol order, None where unknown"""
+        for symbol in sorted(self.index):
+            i = self.index[symbol]
+            price, previous = self.prices[i], self.previous[i]
+            yield symbol, None if np.isnan(price) else float(price), None if np.isnan(previous) else float(previous)
+
+
+class MarketShard:
+    """One combined-stream connection carrying up to ``capacity`` streams"""
+    # Binance accepts at most 10 incoming messages per second per connection
+    CONTROL_MESSAGE_INTERVAL = 0.2
+
+    def __init__(self, shard_id: int, capacity: int, queue: ConflatingQueue, stats: ReconnectStats):
+        self.shard_id = shard_id
+        self.stats = stats
+        self.capacity = capacity
+        self.queue = queue
+        self.streams: Set[str] = set()
+        self.ws: Optional[websockets.WebSocketClientProtocol] = None
+        self.task: Optional[asyncio.Task] = None
+        self._has_streams = asyncio.Event()
+        self._send_lock = asyncio.Lock()
+        self._ids = itertools.count(1)
+
+    @property
+    def free(self) -> int:
+        return self.capacity - len(self.streams)
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+        if self.ws:
+            await self.ws.close()
+
+    async def _backfill(self):
+        """Queue klines that closed while disconnected, ahead of any live frame"""
+        started = time.perf_counter()
+        frames = await missed_kline_frames(BinanceRestClient.default(), sorted(self.streams))
+        for frame in frames:
+            self.queue.put_nowait(frame, market_conflation_key(frame))
+        self.stats.last_backfill_seconds = time.perf_counter() - started
+        self.stats.backfilled_events += len(frames)
+        if frames:
+            logger.info(f"Market shard {self.shard_id} backfilled {len(frames)} klines "
+                        f"in {self.stats.last_backfill_seconds:.2f}s")
+
+    @staticmethod
+    def _tap_trade(message: str):
+        """Hand every trade to MarketStreams.on_trade before the queue may conflate it"""
+        if MarketStreams.on_trade is None:
+            return
+        try:
+            trade = trade_fields(message)
+            if trade is not None:
+                MarketStreams.on_trade(*trade)
+        except Exception as e:
+            logger.error(f"Error handling trade: {e}")
+
+    async def _run(self):
+        backoff = Backoff()
+        disconnected_at: Optional[float] = None
+        while True:
+            await self._has_streams.wait()
+            try:
+                connected = set(self.streams)
+                url = f"{settings.BINANCE_WS_BASE_URL}/stream?streams={'/'.join(sorted(connected))}"
+                async with websockets.connect(url) as websocket:
+                    self.ws = websocket
+                    connected_at = time.monotonic()
+                    logger.info(f"Market shard {self.shard_id} connected with {len(connected)} streams")
+                    if disconnected_at is not None:
+                        self.stats.reconnects += 1
+                        self.stats.last_reconnect_seconds = connected_at - disconnected_at
+                        # Live frames wait in the socket until the backfill is queued
+                        await self._backfill()
+                        disconnected_at = None
+                    # Catch up with changes made while the handshake was in flight
+                    if self.streams - connected:
+                        await self._send("SUBSCRIBE", sorted(self.streams - connected))
+                    if connected - self.streams:
+                        await self._send("UNSUBSCRIBE", sorted(connected - self.streams))
+                    while True:
+                        try:
+                            message = await websocket.recv()
+                            StreamCapture.record('market', message, time.time())
+                            self._tap_trade(message)
+                            self.queue.put_nowait(message, market_conflation_key(message))
+                        except websockets.ConnectionClosed:
+                            break
+                    self.ws = None
+                    if time.monotonic() - connected_at > 30:
+                        backoff.reset()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.ws = None
+                logger.error(f"Market shard {self.shard_id} connection error: {e}")
+            if not self.streams:
+                # Closed on purpose after the last unsubscribe
+                disconnected_at = None
+                continue
+            disconnected_at = disconnected_at or time.monotonic()
+            await asyncio.sleep(backoff.next_delay())
+
+    async def _send(self, method: str, streams: List[str]):
+        if not self.ws:
+            # Picked up from the URL on the next (re)connect
+            return
+        async with self._send_lock:
+            await self.ws.send(json.dumps({"method": method, "params": streams, "id": next(self._ids)}))
+            await asyncio.sleep(self.CONTROL_MESSAGE_INTERVAL)
+
+    async def subscribe(self, streams: List[str]):
+        self.streams.update(streams)
+        self._has_streams.set()
+        await self._send("SUBSCRIBE", streams)
+
+    async def unsubscribe(self, streams: List[str]):
+        self.streams.difference_update(streams)
+        if not self.streams:
+            self._has_streams.clear()
+            if self.ws:
+                await self.ws.close()
+            return
+        await self._send("UNSUBSCRIBE", streams)
+
+
+class MarketStreams:
+    """
+    Symbol universe and the sharded combined-stream connections serving it.
+    Every shard feeds the same conflating market queue; ``on_trade`` is called
+    with every trade as it is read, since the queue keeps only a symbol's latest.
+    """
+    universe = SymbolUniverse()
+    # (symbol, price, quantity, trade time) -> None, for consumers that need every trade
+    on_trade: Optional[Callable[[str, float, float, int], None]] = None
+    _shards: List[MarketShard] = []
+    _stream_shard: Dict[str, MarketShard] = {}
+    _queue: Optional[ConflatingQueue] = None
+    _lock: Optional[asyncio.Lock] = None
+    _kline_interval = '1h'
+    reconnect_stats = ReconnectStats()
+
+    @classmethod
+    def symbol_streams(cls, symbol: str) -> List[str]:
+        symbol = symbol.lower()
+        return [f"{symbol}@aggTrade", f"{symbol}@kline_{cls._kline_interval}"]
+
+    @classmethod
+    async def start(cls, queue: ConflatingQueue, symbols: Iterable[str], kline_interval: str):
+        cls._queue = queue
+        cls._lock = asyncio.Lock()
+        cls._kline_interval = kline_interval
+        await cls.add_symbols(symbols)
+
+    @classmethod
+    async def stop(cls):
+        for shard in cls._shards:
+            await shard.stop()
+
+    @classmethod
+    async def add_streams(cls, streams: Iterable[str]):
+        """Subscribe streams, filling existing shards before opening new connections"""
+        async with cls._lock:
+            new = [s for s in dict.fromkeys(streams) if s not in cls._stream_shard]
+            plan: Dict[MarketShard, List[str]] = {}
+            for stream in new:
+                shard = next((s for s in cls._shards if s.free - len(plan.get(s, [])) > 0), None)
+                if shard is None:
+                    shard = MarketShard(
+                        len(cls._shards), settings.MARKET_STREAMS_PER_CONNECTION, cls._queue, cls.reconnect_stats
+                    )
+                    cls._shards.append(shard)
+                    shard.start()
+                plan.setdefault(shard, []).append(stream)
+                cls._stream_shard[stream] = shard
+            for shard, shard_streams in plan.items():
+                await shard.subscribe(shard_streams)
+
+    @classmethod
+    async def remove_streams(cls, streams: Iterable[str]):
+        async with cls._lock:
+            plan: Dict[MarketShard, List[str]] = {}
+            for stream in streams:
+                shard = cls._stream_shard.pop(stream, None)
+                if shard:
+                    plan.setdefault(shard, []).append(stream)
+            for shard, shard_streams in plan.items():
+                await shard.unsubscribe(shard_streams)
+
+    @classmethod
+    async def add_symbols(cls, symbols: Iterable[str]) -> List[str]:
+        added = [s for s in dict.fromkeys(s.upper() for s in symbols if s) if s not in cls.universe]
+        for symbol in added:
+            cls.universe.add(symbol)
+        await cls.add_streams(stream for symbol in added for stream in cls.symbol_streams(symbol))
+        if added:
+            logger.info(f"Tracking {len(added)} more symbols ({len(cls.universe)} total)")
+        return added
+
+    @classmethod
+    async def remove_symbols(cls, symbols: Iterable[str]) -> List[str]:
+        removed = [s for s in dict.fromkeys(s.upper() for s in symbols) if s in cls.universe]
+        for symbol in removed:
+            cls.universe.remove(symbol)
+        await cls.remove_streams(stream for symbol in removed for stream in cls.symbol_streams(symbol))
+        return removed
+
+    @classmethod
+    def has_stream(cls, stream: str) -> bool:
+        return stream in cls._stream_shard
+
+    @classmethod
+    def connected(cls) -> bool:
+        """Every shard with streams has an open connection"""
+        return all(shard.ws is not None for shard in cls._shards if shard.streams)
+
+    @classmethod
+    def status(cls) -> Dict[str, Any]:
+        return {
+            'symbols': len(cls.universe),
+            'streams': len(cls._stream_shard),
+            'shards': [
+                {'id': s.shard_id, 'streams': len(s.streams), 'connected': s.ws is not None}
+                for s in cls._shards
+            ],
+        }
@@ -0,0 +1,146 @@
+import asyncio
+import itertools
+import re
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+_TRADE_TIME = re.compile(r'"T":(\d+)')
+
+
+class StreamQueue(ABC):
+    """Counters shared by the stream queues"""
+    policy: str
+
+    def __init__(self, name: str, maxsize: int):
+        self.name = name
+        self.maxsize = maxsize
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.max_depth = 0
+
+    @abstractmethod
+    def depth(self) -> int:
+        """Items waiting to be processed"""
+
+    def task_done(self):
+        self.processed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'policy': self.policy,
+            'depth': self.depth(),
+            'max_depth': self.max_depth,
+            'capacity': self.maxsize,
+            'received': self.received,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'conflated': self.conflated,
+        }
+
+
+class LosslessQueue(StreamQueue):
+    """
+    Bounded FIFO. A full queue makes the reader wait, which stops it reading
+    from the socket, so nothing is dropped in-process.
+    """
+    policy = 'lossless'
+
+    def __init__(self, name: str, maxsize: int):
+        super().__init__(name, maxsize)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    async def put(self, item: Any, key: Optional[Hashable] = None):
+        self.received += 1
+        await self._queue.put(item)
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    async def get(self) -> Any:
+        return await self._queue.get()
+
+
+class ConflatingQueue(StreamQueue):
+    """
+    Bounded FIFO where a newer item replaces a queued item with the same key
+    (latest value wins) and keeps its place in line. Items without a key are
+    never conflated. When full, the oldest item is dropped.
+    """
+    policy = 'conflate'
+
+    def __init__(self, name: str, maxsize: int):
+        super().__init__(name, maxsize)
+        self._items: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._ready = asyncio.Event()
+        self._unique = itertools.count()
+
+    def depth(self) -> int:
+        return len(self._items)
+
+    def put_nowait(self, item: Any, key: Optional[Hashable] = None):
+        self.received += 1
+        if key is None:
+            key = ('unique', next(self._unique))
+        if key in self._items:
+            self._items[key] = item
+            self.conflated += 1
+        else:
+            if len(self._items) >= self.maxsize:
+                self._items.popitem(last=False)
+                self.dropped += 1
+            self._items[key] = item
+            self.max_depth = max(self.max_depth, len(self._items))
+        self._ready.set()
+
+    async def put(self, item: Any, key: Optional[Hashable] = None):
+        self.put_nowait(item, key)
+
+    async def get(self) -> Any:
+        while not self._items:
+            self._ready.clear()
+            await self._ready.wait()
+        return self._items.popitem(last=False)[1]
+
+
+def _string_field(raw: str, marker: str, start: int = 0) -> str:
+    i = raw.find(marker, start)
+    if i < 0:
+        return ''
+    i += len(marker)
+    return raw[i:raw.find('"', i)]
+
+
+def market_conflation_key(raw: str) -> Optional[Hashable]:
+    """
+    Conflation key read from a raw market frame without decoding it: one slot
+    per (event, symbol), and per bar for klines so a closed bar is never
+    replaced by the next bar's updates. Frames without an event type (e.g.
+    subscription replies) are not conflated.
+    """
+    event = _string_field(raw, '"e":"')
+    if not event:
+        return None
+    symbol = _string_field(raw, '"s":"')
+    if event == 'kline':
+        k = raw.find('"k":{')
+        t = raw.find('"t":', k)
+        return event, symbol, _string_field(raw, '"i":"', k), raw[t + 4:raw.find(',', t)]
+    return event, symbol
+
+
+def trade_fields(raw: str) -> Optional[Tuple[str, float, float, int]]:
+    """
+    (symbol, price, quantity, trade time) of a raw aggTrade frame, read
+    without decoding it, or None for any other frame
+    """
+    if _string_field(raw, '"e":"') != 'aggTrade':
+        return None
+    trade_time = _TRADE_TIME.search(raw)
+    return (
+        _string_field(raw, '"s":"').upper(), float(_string_field(raw, '"p":"')),
+        float(_string_field(raw, '"q":"')), int(trade_time.group(1)) if trade_time else 0,
+    )
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import random
+import time
+from collections import OrderedDict
+from loguru import logger
+from app.services.binance_rest import BinanceRestClient
+from app.services.indicators import INTERVAL_MS
+from app.services.kline_store import KlineStore
+from typing import Any, Dict, Hashable, Iterable, List, Optional
+
+# Most trades one userTrades request returns
+TRADES_PAGE = 1000
+
+
+class Backoff:
+    """Exponential backoff with full jitter"""
+
+    def __init__(self, base: float = 0.5, cap: float = 60.0):
+        self.base = base
+        self.cap = cap
+        self.attempts = 0
+
+    def next_delay(self) -> float:
+        delay = random.uniform(0, min(self.cap, self.base * 2 ** self.attempts))
+        self.attempts += 1
+        return delay
+
+    def reset(self):
+        self.attempts = 0
+
+
+class SeenSet:
+    """Bounded insertion-ordered set used to drop replayed duplicates"""
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._items: 'OrderedDict[Hashable, None]' = OrderedDict()
+
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self._items
+
+    def add(self, item: Hashable):
+        self._items[item] = None
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+
+class ReconnectStats:
+    """Reconnect and backfill timings for one stream"""
+
+    def __init__(self):
+        self.reconnects = 0
+        self.last_reconnect_seconds: Optional[float] = None
+        self.last_backfill_seconds: Optional[float] = None
+        self.backfilled_events = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(self.__dict__)
+
+
+def trade_to_order_update(trade: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Shape a ``userTrades`` row like an ``ORDER_TRADE_UPDATE`` so it can go through
+    the normal handler. The order's final status is unknown from a single
+    trade, so every replayed fill is reported as a partial fill of a
+    ``BACKFILL`` order and merged per order by the notifier.
+    """
+    return {
+        'e': 'ORDER_TRADE_UPDATE',
+        'E': trade['time'],
+        'T': trade['time'],
+        'backfill': True,
+        'o': {
+            's': trade['symbol'],
+            'c': '',
+            'S': trade['side'],
+            'o': 'BACKFILL',
+            'q': trade['qty'],
+            'p': trade['price'],
+            'ap': trade['price'],
+            'x': 'TRADE',
+            'X': 'PARTIALLY_FILLED',
+            'i': trade['orderId'],
+            'l': trade['qty'],
+            'z': trade['qty'],
+            'L': trade['price'],
+            'N': trade.get('commissionAsset'),
+            'n': trade.get('commission'),
+            'T': trade['time'],
+            't': trade['id'],
+            'm': trade.get('maker', False),
+            'ps': trade.get('positionSide', 'BOTH'),
+            'rp': trade.get('realizedPnl', '0'),
+        },
+    }
+
+
+async def missed_trade_events(client: BinanceRestClient, symbols: Iterable[str], since_ms: int,
+                              seen: SeenSet, concurrency: int = 5) -> List[Dict[str, Any]]:
+    """Fills since ``since_ms`` not already seen live, oldest first"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(symbol: str) -> List[Dict[str, Any]]:
+        trades: List[Dict[str, Any]] = []
+        async with semaphore:
+            try:
+                page = await client.futures_account_trades(symbol=symbol, startTime=since_ms, limit=TRADES_PAGE)
+                trades.extend(page)
+                # Oldest first; a full page may have more after it
+                while len(page) == TRADES_PAGE:
+                    page = await client.futures_account_trades(
+                        symbol=symbol, fromId=page[-1]['id'] + 1, limit=TRADES_PAGE
+                    )
+                    trades.extend(page)
+            except Exception as e:
+                logger.error(f"Error backfilling {symbol} trades ({len(trades)} fetched before the error): {e}")
+        return trades
+
+    results = await asyncio.gather(*(fetch(symbol) for symbol in symbols))
+    trades = [t for rows in results for t in rows if (t['symbol'], t['id']) not in seen]
+    trades.sort(key=lambda t: (t['time'], t['id']))
+    return [trade_to_order_update(t) for t in trades]
+
+
+async def missed_kline_frames(client: BinanceRestClient, streams: Iterable[str],
+                              concurrency: int = 10) -> List[str]:
+    """
+    Raw kline frames for bars that closed since the last stored bar of each
+    ``<symbol>@kline_<interval>`` stream, oldest first per stream. Streams with
+    no stored history are skipped; they are warmed on first use.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    now_ms = int(time.time() * 1000)
+
+    async def fetch(stream: str) -> List[str]:
+        symbol, interval = stream.split('@kline_')
+        symbol = symbol.upper()
+        buffer = KlineStore.get_buffer(symbol, interval)
+        interval_ms = INTERVAL_MS[interval]
+        if not buffer.latest_open_time or now_ms < buffer.latest_open_time + interval_ms:
+            # Nothing closed during the gap; the next live update carries the whole bar
+            return []
+        async with semaphore:
+            try:
+                klines = await client.futures_klines(
+                    symbol=symbol, interval=interval, startTime=buffer.latest_open_time, limit=1000
+                )
+            except Exception as e:
+                logger.error(f"Error backfilling {stream}: {e}")
+                return []
+        return [
+            json.dumps({
+                'e': 'kline', 'E': now_ms, 's': symbol,
+                'k': {
+                    't': row[0], 'T': row[6], 's': symbol, 'i': interval,
+                    'o': row[1], 'h': row[2], 'l': row[3], 'c': row[4], 'v': row[5],
+                    'x': row[6] < now_ms,
+                },
+            })
+            for row in klines
+        ]
+
+    results = await asyncio.gather(*(fetch(s) for s in streams if '@kline_' in s))
+    return [frame for frames in results for frame in frames]
@@ -0,0 +1,79 @@
+"""
+CPU cost of the vectorized multi-symbol indicators (``app.services.batch_indicators``)
+against the per-symbol incremental ``IndicatorSet`` rebuilt over the same bars.
+
+    python -m benchmarks.indicator_benchmark --bars 500 --symbols 1,10,100,500,1000
+
+Measured with --bars 500 (numpy 2.x), CPU microseconds per symbol:
+
+    symbols   batch   incremental
+    1         49      2190
+    10        6.9     3388
+    100       5.9     3369
+    500       8.5     2857
+    1000      10.6    2841
+
+Up to ~100 symbols the batch cost is mostly fixed per-call overhead. Beyond
+that it tracks the size of the (symbol x bars) arrays. The first call for a
+new window length also builds the cached MACD signal weights (O(bars^2), a few
+milliseconds for 500 bars), which is excluded above. The incremental column
+rebuilds an ``IndicatorSet`` from scratch, which is what a cold
+``get_market_data`` does per symbol.
+"""
+import argparse
+import time
+import numpy as np
+from app.services.batch_indicators import compute
+from app.services.indicators import IndicatorSet
+
+
+def _series(symbols: int, bars: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, (symbols, bars)), axis=1))
+    spread = np.abs(rng.normal(0, 0.001, (symbols, bars)))
+    return close, close * (1 + spread), close * (1 - spread), rng.uniform(1, 100, (symbols, bars))
+
+
+def _incremental(close, high, low, volume):
+    for i in range(close.shape[0]):
+        state = IndicatorSet()
+        for t in range(close.shape[1] - 1):
+            state.commit(t, high[i, t], low[i, t], close[i, t], volume[i, t])
+        state.set_pending(close.shape[1] - 1, high[i, -1], low[i, -1], close[i, -1], volume[i, -1])
+        state.snapshot()
+
+
+def _per_symbol_us(fn, symbols: int, min_seconds: float) -> float:
+    runs = 0
+    started = time.process_time()
+    while True:
+        fn()
+        runs += 1
+        elapsed = time.process_time() - started
+        if elapsed >= min_seconds:
+            return elapsed / runs / symbols * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--bars', type=int, default=500)
+    parser.add_argument('--symbols', default='1,10,100,500,1000')
+    parser.add_argument('--min-seconds', type=float, default=1.0, help='CPU time per measurement')
+    parser.add_argument('--skip-incremental', action='store_true')
+    args = parser.parse_args()
+
+    print(f"{'symbols':>8} {'batch us/sym':>14} {'incremental us/sym':>20}")
+    for symbols in (int(s) for s in args.symbols.split(',')):
+        data = _series(symbols, args.bars)
+        compute(*data)  # build the cached weights for this window length
+        batch = _per_symbol_us(lambda: compute(*data), symbols, args.min_seconds)
+        incremental = None
+        if not args.skip_incremental:
+            sample = tuple(a[:min(symbols, 20)] for a in data)
+            incremental = _per_symbol_us(lambda: _incremental(*sample), len(sample[0]), args.min_seconds)
+        incremental_text = '-' if incremental is None else f"{incremental:.1f}"
+        print(f"{symbols:>8} {batch:>14.1f} {incremental_text:>20}")
+
+
+if __name__ == '__main__':
+    main()
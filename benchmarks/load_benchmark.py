@@ -0,0 +1,368 @@
+"""
+End-to-end load benchmark for ``BinanceWebsocketClient``.
+
+A child process serves local stand-ins for Binance (user-data and combined
+market websockets, the REST endpoints used at startup and for backfills) and
+for the Discord webhook. The service runs unmodified in this process, pointed
+at them through settings, while fills and ``aggTrade`` frames are emitted at
+fixed rates. Reported after the warmup:
+
+- frames received / processed per second on each stream queue
+- fill-to-Discord latency percentiles (fill event time to webhook receipt)
+- event-loop lag percentiles in the service process
+- resident memory
+
+Usage:
+    python -m benchmarks.load_benchmark --symbols 50 --trades-per-sec 5000 --fills-per-sec 20 --duration 30
+
+LLM analysis is disabled so the numbers cover the websocket, handler and
+Discord paths only.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import resource
+import socket
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentiles(values: List[float], points=(50, 90, 99, 99.9)) -> Dict[str, Optional[float]]:
+    ordered = sorted(values)
+    result: Dict[str, Optional[float]] = {}
+    for p in points:
+        result[f"p{p:g}"] = ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] if ordered else None
+    result['max'] = ordered[-1] if ordered else None
+    return result
+
+
+# -- Stand-in servers (child process) -----------------------------------------
+
+class FakeBinance:
+    """Local Binance futures REST + websocket endpoints and a Discord webhook sink"""
+    BASE_PRICE = 100.0
+
+    def __init__(self, symbols: List[str], trades_per_sec: float, fills_per_sec: float, latency: float = 0.0):
+        self.symbols = symbols
+        self.trades_per_sec = trades_per_sec
+        self.fills_per_sec = fills_per_sec
+        self.prices = {s: self.BASE_PRICE * (1 + i / 100) for i, s in enumerate(symbols)}
+        self.ids = itertools.count(1)
+        self.fills_sent = 0
+        self.trades_sent = 0
+        # (fill event time ms, webhook receipt ms) per trade notification
+        self.deliveries: List[List[float]] = []
+        self.webhook_posts = 0
+        # Added to every REST response and websocket handshake, standing in for the round trip to Binance
+        self.latency = latency
+
+    def app(self):
+        from aiohttp import web
+
+        @web.middleware
+        async def delay(request, handler):
+            if self.latency and not request.path.startswith('/_bench'):
+                await asyncio.sleep(self.latency)
+            return await handler(request)
+
+        app = web.Application(middlewares=[delay])
+        app.router.add_route('*', '/fapi/v1/listenKey', self.listen_key)
+        app.router.add_get('/fapi/v1/klines', self.klines)
+        app.router.add_get('/fapi/v2/account', self.account)
+        app.router.add_get('/fapi/v2/positionRisk', self.empty_list)
+        app.router.add_get('/fapi/v1/userTrades', self.empty_list)
+        app.router.add_get('/ws/{listen_key}', self.user_stream)
+        app.router.add_get('/stream', self.market_stream)
+        app.router.add_post('/webhook', self.webhook)
+        app.router.add_get('/_bench/results', self.results)
+        return app
+
+    async def listen_key(self, request):
+        from aiohttp import web
+        return web.json_response({'listenKey': 'bench'} if request.method == 'POST' else {})
+
+    async def klines(self, request):
+        from aiohttp import web
+        from app.services.indicators import INTERVAL_MS
+        interval_ms = INTERVAL_MS[request.query['interval']]
+        limit = int(request.query.get('limit', 500))
+        price = self.prices.get(request.query['symbol'], self.BASE_PRICE)
+        last_open = int(time.time() * 1000) // interval_ms * interval_ms
+        rows = []
+        for i in range(limit):
+            open_time = last_open - (limit - 1 - i) * interval_ms
+            rows.append([open_time, str(price), str(price * 1.001), str(price * 0.999), str(price), '10',
+                         open_time + interval_ms - 1, '1000', 10, '5', '500', '0'])
+        return web.json_response(rows)
+
+    async def account(self, request):
+        from aiohttp import web
+        return web.json_response({
+            'totalWalletBalance': '1000.00000000', 'totalUnrealizedProfit': '0.00000000',
+            'assets': [{'asset': 'USDT', 'walletBalance': '1000', 'crossWalletBalance': '1000'}],
+            'positions': [],
+        })
+
+    async def empty_list(self, request):
+        from aiohttp import web
+        return web.json_response([])
+
+    def _fill(self) -> str:
+        trade_id = next(self.ids)
+        symbol = random.choice(self.symbols)
+        now = int(time.time() * 1000)
+        price = f"{self.prices[symbol]:.4f}"
+        return json.dumps({
+            'e': 'ORDER_TRADE_UPDATE', 'E': now, 'T': now,
+            'o': {
+                's': symbol, 'c': f"bench{trade_id}", 'S': random.choice(('BUY', 'SELL')), 'o': 'MARKET',
+                'q': '1', 'p': '0', 'ap': price, 'x': 'TRADE', 'X': 'FILLED', 'i': trade_id,
+                'l': '1', 'z': '1', 'L': price, 'N': 'USDT', 'n': '0.01', 'T': now, 't': trade_id,
+                'm': False, 'ps': 'BOTH', 'rp': '0',
+            },
+        })
+
+    def _agg_trade(self, symbol: str) -> str:
+        price = self.prices[symbol] = self.prices[symbol] * (1 + random.uniform(-1e-4, 1e-4))
+        now = int(time.time() * 1000)
+        data = {'e': 'aggTrade', 'E': now, 's': symbol, 'a': next(self.ids), 'p': f"{price:.4f}",
+                'q': '0.5', 'T': now, 'm': False}
+        return json.dumps({'stream': f"{symbol.lower()}@aggTrade", 'data': data})
+
+    @staticmethod
+    async def _paced(rate: float, emit):
+        """Call ``emit(n)`` every tick with the number of frames due at ``rate`` per second"""
+        tick = 0.005
+        due = 0.0
+        last = time.perf_counter()
+        while True:
+            await asyncio.sleep(tick)
+            now = time.perf_counter()
+            due += rate * (now - last)
+            last = now
+            n = int(due)
+            due -= n
+            if n:
+                await emit(n)
+
+    async def user_stream(self, request):
+        from aiohttp import web
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        async def emit(n: int):
+            for _ in range(n):
+                await ws.send_str(self._fill())
+            self.fills_sent += n
+
+        sender = asyncio.create_task(self._paced(self.fills_per_sec, emit))
+        try:
+            async for _ in ws:
+                pass
+        finally:
+            sender.cancel()
+        return ws
+
+    async def market_stream(self, request):
+        from aiohttp import web, WSMsgType
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        streams = set(filter(None, request.query.get('streams', '').split('/')))
+
+        async def emit(n: int):
+            symbols = [s.split('@')[0].upper() for s in streams if s.endswith('@aggTrade')]
+            symbols = [s for s in symbols if s in self.prices]
+            if not symbols:
+                return
+            for _ in range(n):
+                await ws.send_str(self._agg_trade(random.choice(symbols)))
+            self.trades_sent += n
+
+        # The rate is shared across connections in proportion to their symbols
+        share = sum(1 for s in streams if s.endswith('@aggTrade')) / max(len(self.symbols), 1)
+        sender = asyncio.create_task(self._paced(self.trades_per_sec * share, emit))
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                request_msg = json.loads(message.data)
+                if request_msg.get('method') == 'SUBSCRIBE':
+                    streams.update(request_msg['params'])
+                elif request_msg.get('method') == 'UNSUBSCRIBE':
+                    streams.difference_update(request_msg['params'])
+                await ws.send_str(json.dumps({'result': None, 'id': request_msg.get('id')}))
+        finally:
+            sender.cancel()
+        return ws
+
+    async def webhook(self, request):
+        from aiohttp import web
+        received = time.time() * 1000
+        body = await request.json()
+        self.webhook_posts += 1
+        for embed in body.get('embeds', []):
+            if embed.get('title', '').startswith('🚨'):
+                sent = datetime.fromisoformat(embed['timestamp']).timestamp() * 1000
+                self.deliveries.append([sent, received])
+        return web.Response(status=204)
+
+    async def results(self, request):
+        from aiohttp import web
+        return web.json_response({
+            'fills_sent': self.fills_sent,
+            'trades_sent': self.trades_sent,
+            'webhook_posts': self.webhook_posts,
+            'deliveries': self.deliveries,
+        })
+
+
+def _serve(port: int, symbols: List[str], trades_per_sec: float, fills_per_sec: float, latency: float = 0.0):
+    from aiohttp import web
+    web.run_app(FakeBinance(symbols, trades_per_sec, fills_per_sec, latency).app(),
+                host='127.0.0.1', port=port, print=None, handle_signals=True)
+
+
+# -- Service under test (this process) ----------------------------------------
+
+def _rss_mb() -> Optional[float]:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return None
+
+
+async def _loop_lag(samples: List[float], interval: float = 0.01):
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append((loop.time() - started - interval) * 1000)
+
+
+async def _wait_for_port(port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+async def run(args) -> Dict[str, Any]:
+    import aiohttp
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+    from app.services.binance_rest import BinanceRestClient
+    from app.websocket.binance_client import BinanceWebsocketClient
+
+    await _wait_for_port(args.port)
+    rss_start = _rss_mb()
+    await BinanceWebsocketClient.initialize()
+    lag: List[float] = []
+    lag_task = asyncio.create_task(_loop_lag(lag))
+
+    await asyncio.sleep(args.warmup)
+    lag.clear()
+    started_ms = time.time() * 1000
+    before = BinanceWebsocketClient.stream_stats()
+    await asyncio.sleep(args.duration)
+    after = BinanceWebsocketClient.stream_stats()
+    ended_ms = time.time() * 1000
+    lag_task.cancel()
+    rss_end = _rss_mb()
+
+    # Let notifications already in flight land before collecting them
+    await asyncio.sleep(1 + args.drain)
+    await BinanceWebsocketClient.cleanup()
+    await BinanceRestClient.close()
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"http://127.0.0.1:{args.port}/_bench/results") as response:
+            served = await response.json()
+
+    latencies = [received - sent for sent, received in served['deliveries'] if started_ms <= sent < ended_ms]
+    throughput = {}
+    for name, stats in after.items():
+        previous = before.get(name, {})
+        throughput[name] = {
+            'received_per_sec': (stats['received'] - previous.get('received', 0)) / args.duration,
+            'processed_per_sec': (stats['processed'] - previous.get('processed', 0)) / args.duration,
+            'dropped': stats['dropped'] - previous.get('dropped', 0),
+            'conflated': stats['conflated'] - previous.get('conflated', 0),
+            'max_depth': stats['max_depth'],
+        }
+    return {
+        'config': {k: v for k, v in vars(args).items() if k not in ('port', 'log_level')},
+        'sent': {'fills': served['fills_sent'], 'agg_trades': served['trades_sent']},
+        'throughput': throughput,
+        'fill_to_discord_ms': {'count': len(latencies), **percentiles(latencies)},
+        'event_loop_lag_ms': {'samples': len(lag), **percentiles(lag)},
+        'memory_mb': {
+            'rss_start': rss_start,
+            'rss_end': rss_end,
+            'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        },
+        'webhook_posts': served['webhook_posts'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--symbols', type=int, default=20, help='number of symbols streamed')
+    parser.add_argument('--trades-per-sec', type=float, default=2000, help='aggTrade frames per second across all symbols')
+    parser.add_argument('--fills-per-sec', type=float, default=10, help='ORDER_TRADE_UPDATE fills per second')
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=3, help='seconds before measuring')
+    parser.add_argument('--drain', type=float, default=1, help='extra seconds to wait for queued notifications')
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+    args.port = _free_port()
+
+    symbols = [f"BENCH{i}USDT" for i in range(args.symbols)]
+    base = f"127.0.0.1:{args.port}"
+    data_dir = tempfile.mkdtemp(prefix='b2d-bench-')
+    # Must be set before the app modules (and their settings) are imported
+    os.environ.update({
+        'BINANCE_API_KEY': 'bench',
+        'BINANCE_API_SECRET': 'bench',
+        'OPENAI_API_KEY': 'bench',
+        'DISCORD_WEBHOOK_URL': f"http://{base}/webhook",
+        'BINANCE_WS_BASE_URL': f"ws://{base}",
+        'BINANCE_REST_BASE_URL': f"http://{base}",
+        'MARKET_SYMBOLS': ','.join(symbols),
+        'ANALYSIS_ENABLED': 'false',
+        'DATA_DIR': data_dir,
+    })
+
+    server = multiprocessing.get_context('spawn').Process(
+        target=_serve, args=(args.port, symbols, args.trades_per_sec, args.fills_per_sec), daemon=True
+    )
+    server.start()
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        server.terminate()
+        server.join()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Cold-start benchmark: how long a freshly started service takes to handle its
+first user-data and market frames.
+
+Each run starts a new interpreter that imports ``app.main`` and enters its
+lifespan against the stand-in Binance of ``load_benchmark``. ``--latency``
+is added to every REST response and websocket handshake there, so the
+benefit of starting connections concurrently shows up on localhost. Reported
+per milestone over the runs, in seconds since the child process began
+importing the app:
+
+- import: ``app.main`` and everything it pulls in
+- initialize: ``BinanceWebsocketClient.initialize`` returned (the server accepts requests)
+- first_user_message / first_market_message: the first frame of each stream was handled
+- ready: ``/api/ready`` would pass (every stream connected, account state loaded)
+
+Usage:
+    python -m benchmarks.startup_benchmark --runs 5 --accounts 2 --latency 0.05
+
+The stand-in user stream emits ``--fills-per-sec`` fills from the moment a
+client connects, so the first-message times include up to one fill interval.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+from benchmarks.load_benchmark import _free_port, _serve, _wait_for_port, percentiles
+
+MILESTONES = ('import', 'initialize', 'first_user_message', 'first_market_message', 'ready')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# -- One cold start (child process) -------------------------------------------
+
+def _child(args):
+    started = time.monotonic()
+    import app.main as service
+    imported = time.monotonic()
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+    print(json.dumps(asyncio.run(_measure(service, started, imported, args.timeout))))
+
+
+async def _measure(service, started: float, imported: float, timeout: float) -> Dict[str, Optional[float]]:
+    from app.websocket.binance_client import BinanceWebsocketClient
+
+    async with service.lifespan(service.app):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            stats = BinanceWebsocketClient.startup_stats()
+            if stats['ready_seconds'] is not None and {'user', 'market'} <= stats['first_message_seconds'].keys():
+                break
+            await asyncio.sleep(0.005)
+        stats = BinanceWebsocketClient.startup_stats()
+        # Milestones are relative to initialize(); shift them to the start of the process
+        offset = BinanceWebsocketClient._started_at - started
+
+    def shifted(seconds: Optional[float]) -> Optional[float]:
+        return None if seconds is None else seconds + offset
+
+    return {
+        'import': imported - started,
+        'initialize': shifted(stats['initialize_seconds']),
+        'first_user_message': shifted(stats['first_message_seconds'].get('user')),
+        'first_market_message': shifted(stats['first_message_seconds'].get('market')),
+        'ready': shifted(stats['ready_seconds']),
+    }
+
+
+# -- Driver (this process) ----------------------------------------------------
+
+def _run_once(env: Dict[str, str], args) -> Dict[str, Optional[float]]:
+    env = {**env, 'DATA_DIR': tempfile.mkdtemp(prefix='b2d-startup-')}
+    result = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.startup_benchmark', '--child',
+         '--timeout', str(args.timeout), '--log-level', args.log_level],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=args.timeout + 30,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Cold start failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=5, help='cold starts measured')
+    parser.add_argument('--symbols', type=int, default=20, help='number of symbols streamed')
+    parser.add_argument('--accounts', type=int, default=1, help='accounts, each with its own user stream')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to each REST call and handshake')
+    parser.add_argument('--trades-per-sec', type=float, default=2000, help='aggTrade frames per second across all symbols')
+    parser.add_argument('--fills-per-sec', type=float, default=200, help='ORDER_TRADE_UPDATE fills per second')
+    parser.add_argument('--timeout', type=float, default=30, help='seconds to wait for every milestone')
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        _child(args)
+        return
+
+    port = _free_port()
+    symbols = [f"BENCH{i}USDT" for i in range(args.symbols)]
+    base = f"127.0.0.1:{port}"
+    env = {
+        **os.environ,
+        'BINANCE_API_KEY': 'bench',
+        'BINANCE_API_SECRET': 'bench',
+        'ACCOUNTS': json.dumps([
+            {'name': f"bench{i}", 'api_key': 'bench', 'api_secret': 'bench'} for i in range(1, args.accounts)
+        ]),
+        'OPENAI_API_KEY': 'bench',
+        'DISCORD_WEBHOOK_URL': f"http://{base}/webhook",
+        'BINANCE_WS_BASE_URL': f"ws://{base}",
+        'BINANCE_REST_BASE_URL': f"http://{base}",
+        'MARKET_SYMBOLS': ','.join(symbols),
+        'ANALYSIS_ENABLED': 'false',
+    }
+
+    server = multiprocessing.get_context('spawn').Process(
+        target=_serve, args=(port, symbols, args.trades_per_sec, args.fills_per_sec, args.latency), daemon=True
+    )
+    server.start()
+    try:
+        asyncio.run(_wait_for_port(port))
+        runs = [_run_once(env, args) for _ in range(args.runs)]
+    finally:
+        server.terminate()
+        server.join()
+
+    report: Dict[str, Any] = {'config': {k: v for k, v in vars(args).items() if k not in ('child', 'log_level')}}
+    for milestone in MILESTONES:
+        values = [run[milestone] for run in runs if run[milestone] is not None]
+        report[f"{milestone}_seconds"] = {
+            'reached': len(values), **percentiles(values, points=(50, 90)), 'min': min(values, default=None),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
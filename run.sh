@@ -1,2 +1,8 @@
 # Run the FastAPI server
-uvicorn app.main:app --reload --host 0.0.0.0 --port 8000 
\ No newline at end of file
+WORKERS=${WORKERS:-1}
+if [ "$WORKERS" -gt 1 ]; then
+    # One worker leads the Binance streams, the others serve the API from shared memory
+    export WORKERS
+    exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --workers "$WORKERS"
+fi
+uvicorn app.main:app --reload --host 0.0.0.0 --port 8000
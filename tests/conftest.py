@@ -0,0 +1,5 @@
+import os
+
+# app.core.config builds Settings at import; the tests never reach these services
+for name in ('BINANCE_API_KEY', 'BINANCE_API_SECRET', 'OPENAI_API_KEY', 'DISCORD_WEBHOOK_URL'):
+    os.environ.setdefault(name, 'test')